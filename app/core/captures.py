@@ -0,0 +1,62 @@
+"""Naming and lookup of frames saved to ``logs/captures`` for training and calibration."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+CAPTURE_DIR = Path("logs") / "captures"
+GATE_SUFFIX = "_gate"  # frames the cascade gate cleared carry no model score
+
+
+def capture_path(
+    capture_dir: Path,
+    recipe_id: int,
+    trigger_idx: int,
+    cam_id: int,
+    score: float,
+    timestamp: str,
+    gated: bool = False,
+) -> Path:
+    """Return the per-recipe file name for one saved camera frame and that camera's score.
+
+    A frame the cascade gate cleared is named with ``GATE_SUFFIX`` instead of
+    its placeholder score, so it never labels the captures gates are fitted on.
+    """
+    label = GATE_SUFFIX if gated else f"_s{score:.3f}"
+    return capture_dir / f"recipe{recipe_id}" / f"{timestamp}_ti{trigger_idx:06d}_cam{cam_id}{label}.png"
+
+
+def list_captures(capture_dir: Path, cam_id: int, recipe_id: int | None = None) -> list[Path]:
+    """Return capture paths of one camera, newest first.
+
+    With ``recipe_id`` only that recipe's folder is searched; otherwise every
+    recipe folder and older flat captures are included.  Frames the cascade
+    gate cleared are left out, so fitting never learns from the gate's own
+    decisions.
+    """
+    pattern = f"*_cam{cam_id}_*.png"
+    if recipe_id is not None:
+        paths = (capture_dir / f"recipe{recipe_id}").glob(pattern)
+    else:
+        paths = capture_dir.rglob(pattern)
+    paths = (path for path in paths if not path.stem.endswith(GATE_SUFFIX))
+    return sorted(paths, key=lambda path: path.name, reverse=True)
+
+
+def load_captures(paths: list[Path]) -> list[np.ndarray]:
+    """Read captures unchanged (Mono8 stays 2-D), skipping unreadable files."""
+    images = (cv2.imread(str(path), cv2.IMREAD_UNCHANGED) for path in paths)
+    return [image for image in images if image is not None]
+
+
+def capture_score(path: Path) -> float | None:
+    """Return the camera's own model score recorded in a capture's file name, if present."""
+    _, _, score = path.stem.rpartition("_s")
+    try:
+        return float(score)
+    except ValueError:
+        return None
@@ -0,0 +1,141 @@
+"""Cheap first-stage gate that clears obviously OK frames before the full model runs."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from app.core.logger import jlog
+
+
+@dataclass(frozen=True, slots=True)
+class CascadeConfig:
+    """``cascade`` section of a recipe's thresholds file."""
+
+    enabled: bool = False
+    gate_dir: str = "models/gates"   # cam<N>.npz per camera, written by tools/fit_gate.py
+    clear_ok_below: float = 0.8      # gate score under which a frame is OK without the full model
+    audit_every: int = 100           # every Nth cleared frame per camera still runs the full model
+    degraded_clear_ok_below: float = 1.0  # used instead while load shedding degrades; no audits then
+
+
+@dataclass(frozen=True, slots=True)
+class CascadeStats:
+    gate_ok: int = 0
+    full_model: int = 0
+    audits: int = 0
+    audit_misses: int = 0
+
+
+class GateModel:
+    """Per-cell Gaussian model of coarse brightness and texture on OK frames.
+
+    A prepared CHW frame is reduced to a small grid of cell means and standard
+    deviations.  The gate score is the largest absolute z-score over all cells,
+    divided by the largest one seen on the OK frames the gate was fitted on, so
+    1.0 is the worst OK frame of the fit.
+    """
+
+    def __init__(self, mean: np.ndarray, std: np.ndarray, scale: float, grid: tuple[int, int]):
+        self.mean = mean.astype(np.float32)
+        self.inv_std = (1.0 / std).astype(np.float32)
+        self.scale = float(scale)
+        self.grid = grid
+
+    @staticmethod
+    def features(chw: np.ndarray, grid: tuple[int, int]) -> np.ndarray:
+        plane = chw.mean(axis=0, dtype=np.float32) if chw.ndim == 3 else chw.astype(np.float32, copy=False)
+        cell_mean = cv2.resize(plane, grid, interpolation=cv2.INTER_AREA)
+        cell_square = cv2.resize(plane * plane, grid, interpolation=cv2.INTER_AREA)
+        cell_std = np.sqrt(np.maximum(cell_square - cell_mean * cell_mean, 0.0))
+        return np.concatenate((cell_mean.ravel(), cell_std.ravel()))
+
+    @classmethod
+    def fit(cls, batch: np.ndarray, grid: tuple[int, int] = (16, 16), min_std: float = 1e-3) -> "GateModel":
+        if len(batch) < 2:
+            raise ValueError("At least two OK frames are needed to fit a gate")
+        features = np.stack([cls.features(chw, grid) for chw in batch])
+        gate = cls(features.mean(axis=0), np.maximum(features.std(axis=0), min_std), 1.0, grid)
+        gate.scale = max(float(max(gate.score(chw) for chw in batch)), 1e-6)
+        return gate
+
+    def score(self, chw: np.ndarray) -> float:
+        z = (self.features(chw, self.grid) - self.mean) * self.inv_std
+        return float(np.abs(z).max()) / self.scale
+
+    def save(self, path: str | Path) -> None:
+        np.savez(path, mean=self.mean, std=1.0 / self.inv_std, scale=self.scale, grid=np.asarray(self.grid))
+
+    @classmethod
+    def load(cls, path: str | Path) -> "GateModel":
+        with np.load(path) as data:
+            return cls(data["mean"], data["std"], float(data["scale"]), tuple(int(v) for v in data["grid"]))
+
+
+class Cascade:
+    """Decide per camera whether the gate alone clears a frame, and count each stage."""
+
+    def __init__(self, gates: dict[int, GateModel], config: CascadeConfig):
+        self._gates = gates
+        self._config = config
+        self._cleared: dict[int, int] = {}
+        self._gate_ok = 0
+        self._full_model = 0
+        self._audits = 0
+        self._audit_misses = 0
+
+    @property
+    def cam_ids(self) -> set[int]:
+        return set(self._gates)
+
+    def route(self, cam_id: int, chw: np.ndarray, degraded: bool = False) -> str:
+        """Return ``"gate"`` when the gate alone decides ``chw`` is OK, else ``"full"``.
+
+        Every ``audit_every``-th cleared frame of a camera is routed as
+        ``"audit"``: it still runs the full model, whose score is then passed to
+        ``audit`` to check the gate.  ``degraded`` clears frames up to the wider
+        ``degraded_clear_ok_below`` and skips audits.
+        """
+        gate = self._gates.get(cam_id)
+        clear_below = self._config.degraded_clear_ok_below if degraded else self._config.clear_ok_below
+        if gate is None or gate.score(chw) >= clear_below:
+            self._full_model += 1
+            return "full"
+        count = self._cleared.get(cam_id, 0) + 1
+        self._cleared[cam_id] = count
+        if not degraded and self._config.audit_every > 0 and count % self._config.audit_every == 0:
+            self._audits += 1
+            return "audit"
+        self._gate_ok += 1
+        return "gate"
+
+    def audit(self, cam_id: int, trigger_idx: int, score: float, threshold: float) -> None:
+        """Record the full-model score of an audited frame the gate had cleared."""
+        if score >= threshold:
+            self._audit_misses += 1
+            jlog("cascade_audit_miss", cam_id=cam_id, trigger_idx=trigger_idx, score=score)
+
+    def stats(self) -> CascadeStats:
+        return CascadeStats(
+            gate_ok=self._gate_ok,
+            full_model=self._full_model,
+            audits=self._audits,
+            audit_misses=self._audit_misses,
+        )
+
+
+def load_cascade(config: CascadeConfig, camera_count: int) -> Cascade | None:
+    """Load the gates of every camera that has one; None when the cascade is off or no gate exists."""
+    if not config.enabled:
+        return None
+    gates: dict[int, GateModel] = {}
+    for cam_id in range(camera_count):
+        path = Path(config.gate_dir) / f"cam{cam_id + 1}.npz"
+        if path.is_file():
+            gates[cam_id] = GateModel.load(path)
+        else:
+            print(f"[Cascade] No gate for camera {cam_id} at {path}; it always runs the full model")
+    return Cascade(gates, config) if gates else None
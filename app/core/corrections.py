@@ -0,0 +1,128 @@
+"""Lens and shading corrections of a recipe, compiled into its preprocessing transform plan."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import cv2
+import numpy as np
+
+from app.core.preprocessor import CameraTransform, TransformPlan, crop_roi
+
+if TYPE_CHECKING:
+    from app.core.recipes import RecipeRuntime
+
+MIN_FLAT_LEVEL = 1.0  # flat-field pixels darker than this are treated as this level
+
+
+@dataclass(frozen=True, slots=True)
+class CameraCorrection:
+    """``camera_corrections`` entry of a recipe in ``configs/recipes.yaml``."""
+
+    camera_matrix: tuple[tuple[float, float, float], ...] | None = None  # 3x3 intrinsics for undistortion
+    dist_coeffs: tuple[float, ...] = ()                                   # OpenCV order k1, k2, p1, p2[, k3...]
+    image_size: tuple[int, int] | None = None                             # sensor (width, height)
+    flat_field: str = ""                                                  # image of a uniform white target
+
+
+def load_flat_field(path: str | Path) -> np.ndarray:
+    """Read a flat-field capture (.npy or an image file) as a float32 HxW plane."""
+    path = Path(path)
+    if path.suffix.lower() == ".npy":
+        flat = np.load(path)
+    else:
+        flat = cv2.imread(str(path), cv2.IMREAD_UNCHANGED)
+        if flat is None:
+            raise ValueError(f"Flat-field image {path} could not be read")
+    flat = flat.astype(np.float32)
+    return flat.mean(axis=2) if flat.ndim == 3 else flat
+
+
+def compile_camera(
+    size: tuple[int, int],
+    roi: tuple[int, int, int, int] | None,
+    correction: CameraCorrection,
+    mean: tuple[float, float, float] = (0.485, 0.456, 0.406),
+    std: tuple[float, float, float] = (0.229, 0.224, 0.225),
+    raw_input: str = "",
+) -> CameraTransform:
+    """Precompute the remap tables and input-size gain map of one camera.
+
+    The ROI is given in undistorted image coordinates.  Shading is smooth, so
+    the gain is taken from the flat field reduced to input size and applied
+    after resizing; the flat field is undistorted like the frames first.
+    """
+    flat = load_flat_field(correction.flat_field) if correction.flat_field else None
+    if correction.image_size is not None:
+        image_shape = (correction.image_size[1], correction.image_size[0])
+    else:
+        image_shape = flat.shape if flat is not None else None
+    if flat is not None and flat.shape != image_shape:
+        raise ValueError(f"Flat field {correction.flat_field} is {flat.shape}, frames are {image_shape}")
+    maps = None
+    if correction.camera_matrix is not None:
+        if image_shape is None:
+            raise ValueError("Undistortion needs image_size")
+        height, width = image_shape
+        x, y, roi_width, roi_height = roi if roi is not None else (0, 0, width, height)
+        if x + roi_width > width or y + roi_height > height:
+            raise ValueError(f"ROI {roi} is outside image shape {image_shape}")
+        matrix = np.asarray(correction.camera_matrix, dtype=np.float64)
+        full_x, full_y = cv2.initUndistortRectifyMap(
+            matrix, np.asarray(correction.dist_coeffs, dtype=np.float64), None, matrix, (width, height), cv2.CV_32FC1
+        )
+        # Tables for the ROI alone, in the compact fixed-point form cv2.remap reads fastest.
+        maps = cv2.convertMaps(
+            np.ascontiguousarray(full_x[y:y + roi_height, x:x + roi_width]),
+            np.ascontiguousarray(full_y[y:y + roi_height, x:x + roi_width]),
+            cv2.CV_16SC2,
+        )
+    gain = None
+    if flat is not None:
+        level = float(flat.mean())
+        region = cv2.remap(flat, maps[0], maps[1], cv2.INTER_LINEAR) if maps is not None else crop_roi(flat, roi)
+        region = cv2.resize(region, size, interpolation=cv2.INTER_AREA)
+        gain = level / np.maximum(region, MIN_FLAT_LEVEL)
+    return CameraTransform(
+        size,
+        None if maps is not None else roi,
+        maps=maps,
+        gain=gain,
+        image_shape=image_shape,
+        mean=mean,
+        std=std,
+        raw_input=raw_input,
+    )
+
+
+def compile_transform_plan(runtime: RecipeRuntime) -> TransformPlan:
+    """Compile the crop, resize and correction of every camera of ``runtime`` once per recipe."""
+    definition = runtime.definition
+    raw_inputs = camera_raw_inputs(runtime)
+    cam_ids = set(definition.camera_rois) | set(runtime.camera_input_sizes) | set(definition.camera_corrections)
+    cam_ids |= set(raw_inputs)
+    cameras: dict[int, CameraTransform] = {}
+    for cam_id in sorted(cam_ids):
+        size = runtime.camera_input_size(cam_id)
+        roi = definition.camera_rois.get(cam_id)
+        correction = definition.camera_corrections.get(cam_id)
+        raw_input = raw_inputs.get(cam_id, "")
+        try:
+            if correction is None:
+                cameras[cam_id] = CameraTransform(size, roi, raw_input=raw_input)
+            else:
+                cameras[cam_id] = compile_camera(size, roi, correction, raw_input=raw_input)
+        except (OSError, ValueError, cv2.error) as exc:
+            raise ValueError(f"Recipe {definition.name!r} preprocessing for camera {cam_id}: {exc}") from exc
+    return TransformPlan(runtime.input_size, cameras)
+
+
+def camera_raw_inputs(runtime: RecipeRuntime) -> dict[int, str]:
+    """The ``raw_input`` setting of every camera whose model in ``runtime.models`` takes raw rows."""
+    from app.core.recipes import camera_index  # recipes imports this module
+
+    return {
+        camera_index(key): str(model["raw_input"]) for key, model in runtime.models.items() if model.get("raw_input")
+    }
@@ -0,0 +1,171 @@
+"""Per-trigger deadlines derived from PLC line speed, and the warnings they drive.
+
+A product passes the cameras every ``product_length_mm / line speed`` seconds.
+Each trigger gets ``budget_fraction`` of that cycle to produce a verdict; work
+still pending when its deadline passes is abandoned and reported as
+``INSPECTION_TIMEOUT`` so the PLC never waits for a late result.
+
+Both warnings use hysteresis so they do not flicker around their thresholds:
+``INFERENCE_SLOWER_THAN_CYCLE_TIME`` is raised after ``slow_raise_after``
+consecutive triggers above ``slow_above`` of the budget (timeouts count as
+slow) and cleared after ``slow_clear_after`` consecutive triggers below
+``slow_clear_below``; ``HIGH_INFERENCE_QUEUE_DEPTH`` is raised at
+``queue_raise_depth`` pending triggers and cleared at ``queue_clear_depth``.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any
+
+from app.core.logger import jlog
+from app.core.modbus.register_map import VisionWarningCode
+from app.core.modbus.state import PlcInput
+
+BUDGET_STATS_EVERY = 500  # finished triggers between cycle budget logs
+EWMA_ALPHA = 0.1
+
+
+@dataclass(frozen=True, slots=True)
+class CycleBudgetConfig:
+    """``cycle_budget`` section of ``configs/inference.yaml``."""
+
+    enabled: bool = True
+    budget_fraction: float = 0.8     # share of the product cycle available for one verdict
+    min_budget_ms: float = 20.0      # floor against implausible speed or length values
+    slow_above: float = 0.9          # of the budget
+    slow_clear_below: float = 0.7
+    slow_raise_after: int = 5
+    slow_clear_after: int = 20
+    queue_raise_depth: int = 4
+    queue_clear_depth: int = 1
+
+    @classmethod
+    def from_mapping(cls, raw: dict[str, Any] | None) -> "CycleBudgetConfig":
+        raw = raw or {}
+        defaults = cls()
+        config = cls(
+            enabled=bool(raw.get("enabled", defaults.enabled)),
+            budget_fraction=float(raw.get("budget_fraction", defaults.budget_fraction)),
+            min_budget_ms=float(raw.get("min_budget_ms", defaults.min_budget_ms)),
+            slow_above=float(raw.get("slow_above", defaults.slow_above)),
+            slow_clear_below=float(raw.get("slow_clear_below", defaults.slow_clear_below)),
+            slow_raise_after=max(1, int(raw.get("slow_raise_after", defaults.slow_raise_after))),
+            slow_clear_after=max(1, int(raw.get("slow_clear_after", defaults.slow_clear_after))),
+            queue_raise_depth=max(1, int(raw.get("queue_raise_depth", defaults.queue_raise_depth))),
+            queue_clear_depth=max(0, int(raw.get("queue_clear_depth", defaults.queue_clear_depth))),
+        )
+        if not 0.0 < config.budget_fraction <= 1.0:
+            raise ValueError("cycle_budget.budget_fraction must be in (0, 1]")
+        if config.slow_clear_below > config.slow_above:
+            raise ValueError("cycle_budget.slow_clear_below must not exceed slow_above")
+        if config.queue_clear_depth >= config.queue_raise_depth:
+            raise ValueError("cycle_budget.queue_clear_depth must be below queue_raise_depth")
+        return config
+
+
+def cycle_time_ms(plc: PlcInput, line_speed_scale: int = 100) -> float | None:
+    """Time between products at the current line speed, or None while the line stands still.
+
+    The line-speed register holds mm/s times ``line_speed_scale`` (``data_format`` in ``configs/modbus.yaml``).
+    """
+    if plc.line_speed_x100 <= 0 or plc.product_length_mm <= 0:
+        return None
+    return plc.product_length_mm * line_speed_scale * 1000.0 / plc.line_speed_x100
+
+
+@dataclass(frozen=True, slots=True)
+class CycleBudgetStats:
+    budget_ms: float = 0.0
+    finished: int = 0
+    over_budget: int = 0
+    timeouts: int = 0
+    latency_ms: float = 0.0      # EWMA, trigger arrival to verdict
+    processing_ms: float = 0.0   # EWMA, preprocessing and inference
+    queue_ms: float = 0.0        # EWMA, waiting before and between stages
+
+
+class CycleBudget:
+    """Track verdict latency against the line's cycle time and decide the two warnings.
+
+    ``record``, ``record_timeout`` and ``observe_queue`` return the warning
+    transitions they cause as ``(code, raised)`` pairs for the caller to apply.
+    """
+
+    def __init__(self, config: CycleBudgetConfig, line_speed_scale: int = 100):
+        self._config = config
+        self._line_speed_scale = line_speed_scale
+        self._budget_ms = 0.0
+        self._slow = False
+        self._queue_high = False
+        self._slow_run = 0
+        self._fast_run = 0
+        self._finished = 0
+        self._over_budget = 0
+        self._timeouts = 0
+        self._latency_ms = 0.0
+        self._processing_ms = 0.0
+
+    def budget_ms(self, plc: PlcInput) -> float | None:
+        """Deadline for a trigger arriving now, relative to its arrival; None without a deadline."""
+        cycle_ms = cycle_time_ms(plc, self._line_speed_scale) if self._config.enabled else None
+        if cycle_ms is None:
+            return None
+        self._budget_ms = max(self._config.min_budget_ms, cycle_ms * self._config.budget_fraction)
+        return self._budget_ms
+
+    def record(self, latency_ms: float, processing_ms: float, budget_ms: float) -> list[tuple[VisionWarningCode, bool]]:
+        """Record a verdict delivered ``latency_ms`` after its trigger, ``processing_ms`` of it spent working."""
+        self._finished += 1
+        self._over_budget += latency_ms > budget_ms
+        if self._finished == 1:
+            self._latency_ms, self._processing_ms = latency_ms, processing_ms
+        else:
+            self._latency_ms += EWMA_ALPHA * (latency_ms - self._latency_ms)
+            self._processing_ms += EWMA_ALPHA * (processing_ms - self._processing_ms)
+        if self._finished % BUDGET_STATS_EVERY == 0:
+            jlog("cycle_budget", **{name: round(value, 3) for name, value in self._stat_items()})
+        return self._observe_latency(latency_ms / budget_ms)
+
+    def record_timeout(self) -> list[tuple[VisionWarningCode, bool]]:
+        self._timeouts += 1
+        return self._observe_latency(float("inf"))
+
+    def _observe_latency(self, fraction: float) -> list[tuple[VisionWarningCode, bool]]:
+        if fraction > self._config.slow_above:
+            self._slow_run, self._fast_run = self._slow_run + 1, 0
+        elif fraction < self._config.slow_clear_below:
+            self._slow_run, self._fast_run = 0, self._fast_run + 1
+        else:
+            self._slow_run = self._fast_run = 0
+        if not self._slow and self._slow_run >= self._config.slow_raise_after:
+            self._slow = True
+            return [(VisionWarningCode.INFERENCE_SLOWER_THAN_CYCLE_TIME, True)]
+        if self._slow and self._fast_run >= self._config.slow_clear_after:
+            self._slow = False
+            return [(VisionWarningCode.INFERENCE_SLOWER_THAN_CYCLE_TIME, False)]
+        return []
+
+    def observe_queue(self, depth: int) -> list[tuple[VisionWarningCode, bool]]:
+        """Record the number of triggers waiting for a verdict."""
+        if not self._queue_high and depth >= self._config.queue_raise_depth:
+            self._queue_high = True
+            return [(VisionWarningCode.HIGH_INFERENCE_QUEUE_DEPTH, True)]
+        if self._queue_high and depth <= self._config.queue_clear_depth:
+            self._queue_high = False
+            return [(VisionWarningCode.HIGH_INFERENCE_QUEUE_DEPTH, False)]
+        return []
+
+    def _stat_items(self) -> list[tuple[str, float]]:
+        return [
+            ("budget_ms", self._budget_ms),
+            ("finished", self._finished),
+            ("over_budget", self._over_budget),
+            ("timeouts", self._timeouts),
+            ("latency_ms", self._latency_ms),
+            ("processing_ms", self._processing_ms),
+            ("queue_ms", max(0.0, self._latency_ms - self._processing_ms)),
+        ]
+
+    def stats(self) -> CycleBudgetStats:
+        return CycleBudgetStats(**dict(self._stat_items()))
@@ -1,28 +1,68 @@
 # Updated multi-format inferencer with correct Anomalib .pt handling
 
 from __future__ import annotations
+from collections import deque
+import copy
+import logging
 import os
+import threading
+import time
 import numpy as np
 import torch
-from dataclasses import dataclass
-from typing import Any, Dict
+from concurrent.futures import Executor
+from dataclasses import asdict, dataclass, field, replace
+from typing import TYPE_CHECKING, Any, Callable, Dict, Sequence
 
 from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
 
-from app.core.postprocess import decide, fuse_scores
-from app.core.preprocessor import preprocess_batch
+from app.core.cascade import Cascade, load_cascade
+from app.core.logger import jlog
+from app.core.model_cache import MODEL_CACHE
+from app.core.modbus.register_map import ShedReason
+from app.core.postprocess import NgRateOrder, decide, fuse_scores
+from app.core.corrections import compile_transform_plan
+from app.core.preprocessor import RAW_DTYPES, BatchBufferPool, MixedBatch, TransformPlan, preprocess_batch
+from app.core.raw_input import NormalizeInput
 from app.core.recipes import RecipeRuntime
+from app.core.remote import RemoteError, RemoteModel, remote_model_config
+from app.core.similarity import FrameChangeDetector, LineCondition, load_detector
+from app.core.tiling import TilingConfig, select_tiles, tile_grid
+
+if TYPE_CHECKING:
+    from app.core.inference_service import InferenceService
 
 try:
     from anomalib.deploy import TorchInferencer as AnomTorchInferencer
 except Exception:
     AnomTorchInferencer = None
 
+try:
+    import onnxruntime as ort
+except Exception:
+    ort = None
+
+try:
+    import openvino as ov
+except Exception:
+    ov = None
+
 
 @dataclass
 class ModelConfig:
     path: str = ""
-    type: str = "auto"      # "auto" | "anomalib" | "torchscript" | "mock"
+    type: str = "auto"      # "auto" | "anomalib" | "torchscript" | "onnx" | "openvino" | "remote" | "mock"
+    intra_op_threads: int = 0           # ONNX Runtime and OpenVINO; 0 lets the runtime choose
+    inter_op_threads: int = 0           # ONNX Runtime
+    graph_optimization: str = "all"     # ONNX Runtime: "disable" | "basic" | "extended" | "all"
+    performance_hint: str = "LATENCY"   # OpenVINO: "LATENCY" | "THROUGHPUT"
+    inference_precision: str = "f32"    # OpenVINO: "f32" keeps scores on the torch scale; "" = CPU default
+    warmup_iterations: int = 3          # dummy inferences per batch size before the model counts as ready
+    score_only: bool = True             # skip anomaly-map post-processing; maps stay available on demand
+    server: str = ""                    # remote: "host:port" of tools/inference_server.py
+    remote_type: str = "auto"           # remote: model type on the server; path is resolved there
+    deadline_ms: float = 1000.0         # remote: per-request budget; 0 waits indefinitely
+    connections: int = 2                # remote: pooled connections per server
+    raw_input: str = ""                 # "uint8" | "float16": 1xHxW rows normalized by the model; "" = CPU-normalized
 
 
 class InferenceBackend:
@@ -36,6 +76,15 @@ class InferenceBackend:
             print("[InferenceBackend] CUDA requested but unavailable; using CPU inference")
         self._mode = None
         self._runner = None
+        self._requests = []
+        self._warm_shapes: set[tuple[int, int, int]] = set()
+        self._score_only: bool | None = None  # None until checked against the full path
+        self._skip_pre_processor: dict[tuple[int, ...], bool] = {}  # per (C,H,W) input shape
+        self._input_dtype = np.float32       # ONNX Runtime and OpenVINO: the graph's input element type
+        self._normalize_input: torch.nn.Module | None = None
+        # A cached backend is warmed on the recipe loader's thread while the worker scores
+        # with it; this guards the runtime, its request pool and the self-check state.
+        self._lock = threading.RLock()
 
         if self.device == "cuda":
             torch.backends.cudnn.benchmark = True
@@ -44,6 +93,9 @@ class InferenceBackend:
             torch.set_float32_matmul_precision("high")
 
         self._load()
+        if self.cfg.raw_input and self._mode in {"anomalib", "torchscript"}:
+            # The checkpoint expects normalized input; raw rows are converted on the device.
+            self._normalize_input = NormalizeInput().to(self.device)
 
     # --------------------------
     # Loader Logic
@@ -52,6 +104,26 @@ class InferenceBackend:
         path = self.cfg.path
         typ = (self.cfg.type or "auto").lower()
 
+        if self.cfg.raw_input and self.cfg.raw_input not in RAW_DTYPES:
+            print(f"[InferenceBackend] Unknown raw_input {self.cfg.raw_input!r} → mock")
+            self._mode = "mock"
+            return
+
+        # --------------------------
+        # 0. Remote inference server (the path lives on the server)
+        # --------------------------
+        if typ == "remote":
+            try:
+                self._runner = RemoteModel(
+                    self.cfg.server, remote_model_config(self.cfg), self.cfg.deadline_ms, self.cfg.connections
+                )
+                self._mode = "mock" if self._runner.mode == "mock" else "remote"
+                print(f"[InferenceBackend] Remote model on {self.cfg.server}: {path} ({self._runner.mode})")
+            except (RemoteError, ValueError) as e:
+                print(f"[InferenceBackend] FAILED remote load: {e}")
+                self._mode = "mock"
+            return
+
         if typ == "mock" or not os.path.exists(path):
             print(f"[InferenceBackend] File missing → mock mode. path={path}")
             self._mode = "mock"
@@ -96,6 +168,24 @@ class InferenceBackend:
                 except Exception as e:
                     print(f"[InferenceBackend] AUTO Anomalib failed: {e}")
 
+            if ext == ".xml":
+                try:
+                    print(f"[InferenceBackend] AUTO: Trying OpenVINO for {path}")
+                    self._runner = self._load_openvino(path)
+                    self._mode = "openvino"
+                    return
+                except Exception as e:
+                    print(f"[InferenceBackend] AUTO OpenVINO failed: {e}")
+
+            if ext == ".onnx":
+                try:
+                    print(f"[InferenceBackend] AUTO: Trying ONNX Runtime for {path}")
+                    self._runner = self._load_onnx(path)
+                    self._mode = "onnx"
+                    return
+                except Exception as e:
+                    print(f"[InferenceBackend] AUTO ONNX Runtime failed: {e}")
+
             # Then try TorchScript if .pt
             if ext in {".pt", ".ts"}:
                 try:
@@ -127,57 +217,681 @@ class InferenceBackend:
                 return
 
         # --------------------------
-        # 4. Final fallback
+        # 4. FORCED ONNX Runtime
+        # --------------------------
+        if typ == "onnx":
+            try:
+                print(f"[InferenceBackend] Loading ONNX Runtime session: {path}")
+                self._runner = self._load_onnx(path)
+                self._mode = "onnx"
+                return
+            except Exception as e:
+                print(f"[InferenceBackend] ONNX Runtime load failed: {e}")
+                self._mode = "mock"
+                return
+
+        # --------------------------
+        # 5. FORCED OpenVINO (CPU)
+        # --------------------------
+        if typ == "openvino":
+            try:
+                print(f"[InferenceBackend] Compiling OpenVINO model for CPU: {path}")
+                self._runner = self._load_openvino(path)
+                self._mode = "openvino"
+                return
+            except Exception as e:
+                print(f"[InferenceBackend] OpenVINO load failed: {e}")
+                self._mode = "mock"
+                return
+
+        # --------------------------
+        # 6. Final fallback
         # --------------------------
         print("[InferenceBackend] Unknown type → mock")
         self._mode = "mock"
 
+    def _load_onnx(self, path: str):
+        if ort is None:
+            raise RuntimeError("onnxruntime is not installed")
+        levels = {
+            "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }
+        level = (self.cfg.graph_optimization or "all").lower()
+        if level not in levels:
+            raise ValueError(f"Unknown graph_optimization {self.cfg.graph_optimization!r}")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = levels[level]
+        options.intra_op_num_threads = int(self.cfg.intra_op_threads)
+        options.inter_op_num_threads = int(self.cfg.inter_op_threads)
+        options.execution_mode = (
+            ort.ExecutionMode.ORT_PARALLEL if self.cfg.inter_op_threads > 1 else ort.ExecutionMode.ORT_SEQUENTIAL
+        )
+        providers = ["CPUExecutionProvider"]
+        if self.device == "cuda" and "CUDAExecutionProvider" in ort.get_available_providers():
+            providers.insert(0, "CUDAExecutionProvider")
+        session = ort.InferenceSession(path, sess_options=options, providers=providers)
+        input_types = {"tensor(float)": np.float32, "tensor(float16)": np.float16, "tensor(uint8)": np.uint8}
+        self._input_dtype = input_types.get(session.get_inputs()[0].type, np.float32)
+        return session
+
+    def _load_openvino(self, path: str):
+        """Compile once for the local CPU; reads OpenVINO IR (.xml) or ONNX."""
+        if ov is None:
+            raise RuntimeError("openvino is not installed")
+        hint = (self.cfg.performance_hint or "LATENCY").upper()
+        if hint not in {"LATENCY", "THROUGHPUT"}:
+            raise ValueError(f"Unknown performance_hint {self.cfg.performance_hint!r}")
+        config = {"PERFORMANCE_HINT": hint}
+        if self.cfg.inference_precision:
+            config["INFERENCE_PRECISION_HINT"] = self.cfg.inference_precision
+        if self.cfg.intra_op_threads > 0:
+            config["INFERENCE_NUM_THREADS"] = int(self.cfg.intra_op_threads)
+        compiled = ov.Core().compile_model(path, "CPU", config)
+        self._requests = [compiled.create_infer_request()]
+        try:
+            self._input_dtype = np.dtype(compiled.inputs[0].get_element_type().to_dtype()).type
+        except Exception:
+            self._input_dtype = np.float32
+        return compiled
+
+    def _openvino_request(self):
+        """Reuse an idle infer request; create one only when all are in flight."""
+        try:
+            return self._requests.pop()
+        except IndexError:
+            return self._runner.create_infer_request()
+
+    def _openvino_output(self, request) -> Dict:
+        """Copy the outputs out of ``request`` and return it to the idle pool."""
+        result = {}
+        for index, port in enumerate(self._runner.outputs):
+            value = request.get_output_tensor(index).data.copy()
+            result[port.get_any_name() if port.get_names() else f"output{index}"] = value
+        if not {"pred_score", "pred_scores", "scores"} & result.keys():
+            result["scores"] = request.get_output_tensor(0).data.copy()
+        self._requests.append(request)
+        return result
+
     # --------------------------
     # Inference
     # --------------------------
     @torch.inference_mode()
     def predict(self, batch: np.ndarray) -> Dict:
-        # batch: (B,C,H,W) float32
-        if self._mode == "mock":
-            scores = batch.mean(axis=(2, 3)).mean(axis=1)
-            return {"scores": scores.astype(np.float32)}
+        """Score ``batch`` (B,C,H,W float32, or B,1,H,W raw rows), using the score-only path where it is enabled.
 
-        t = torch.from_numpy(batch).to(self.device, non_blocking=True)
+        The first score-only call also runs the full path and keeps the fast path
+        only if both give the same scores.
+        """
+        if self._mode == "remote":
+            return self._runner.predict(batch)
+        with self._lock:
+            if not self.cfg.score_only or self._mode not in {"anomalib", "torchscript"} or self._score_only is False:
+                return self.predict_full(batch)
+            t = self._input_tensor(batch)
+            if self._score_only:
+                return self._predict_score_only(t)
+            full = self.predict_full(batch)
+            try:
+                fast = self._predict_score_only(t)
+                count = batch.shape[0]
+                self._score_only = bool(np.allclose(
+                    [extract_score(fast, index) for index in range(count)],
+                    [extract_score(full, index) for index in range(count)],
+                    rtol=1e-5,
+                    atol=1e-6,
+                ))
+            except Exception as exc:
+                reason = f"path unavailable: {exc}"
+                self._score_only = False
+            else:
+                reason = "scores differ from full output"
+            if not self._score_only:
+                print(f"[InferenceBackend] score-only {reason}; using full path for {self.cfg.path}")
+                jlog("score_only_disabled", level=logging.WARNING, model=self.cfg.path, reason=reason)
+            return full
 
-        if self._mode == "anomalib":
-            return self._runner.predict(t)
+    def _input_tensor(self, batch: np.ndarray) -> torch.Tensor:
+        """Move ``batch`` to the device; raw rows travel as they are and are normalized there."""
+        t = torch.from_numpy(np.ascontiguousarray(batch)).to(self.device, non_blocking=True)
+        return t if self._normalize_input is None else self._normalize_input(t)
 
+    def _predict_score_only(self, t: torch.Tensor) -> Dict:
         if self._mode == "torchscript":
             out = self._runner(t)
-            if isinstance(out, dict):
-                return {k: (v.detach().cpu().numpy() if torch.is_tensor(v) else v)
-                        for k, v in out.items()}
-            if torch.is_tensor(out):
-                return {"scores": out.detach().cpu().numpy()}
-            return {"scores": np.array(out)}
+            return {"scores": (out if torch.is_tensor(out) else score_tensor(out)).detach().cpu().numpy()}
+        # Anomalib module: the core model produces the raw score (and a raw map, which is
+        # dropped); the post-processor then runs on a batch holding the score alone.
+        module = self._runner.model
+        pre_processor = getattr(module, "pre_processor", None)
+        output = module.model(t if pre_processor is None else self._pre_process(pre_processor, t))
+        output_value = output.get if isinstance(output, dict) else lambda name: getattr(output, name, None)
+        score = output_value("pred_score")
+        if score is None:
+            score = torch.amax(output_value("anomaly_map"), dim=(-2, -1))
+        post_processor = getattr(module, "post_processor", None)
+        if post_processor is not None:
+            score = score_tensor(post_processor(type(output)(pred_score=score)))
+        return {"pred_score": score.detach().cpu().numpy()}
 
-        return {"scores": np.zeros(batch.shape[0], dtype=np.float32)}
+    def _pre_process(self, pre_processor: Callable, t: torch.Tensor) -> torch.Tensor:
+        """Apply the Anomalib pre-processor unless it is known to leave prepared frames unchanged.
+
+        ``preprocess_batch`` already crops, resizes and normalizes.  The first batch of
+        each input shape is run through the pre-processor and compared bit for bit;
+        when the result is identical the pre-processor is skipped for that shape.
+        """
+        shape = tuple(t.shape[1:])
+        skip = self._skip_pre_processor.get(shape)
+        if skip:
+            return t
+        prepared = pre_processor(t)
+        if skip is None:
+            skip = isinstance(prepared, torch.Tensor) and prepared.shape == t.shape and torch.equal(prepared, t)
+            self._skip_pre_processor[shape] = skip
+            if not skip:
+                print(f"[InferenceBackend] model pre-processor changes prepared {shape} input; keeping it for {self.cfg.path}")
+        return prepared
+
+    @torch.inference_mode()
+    def predict_full(self, batch: np.ndarray) -> Dict:
+        """Run the complete runtime output, including anomaly maps and masks where the model has them."""
+        if self._mode == "remote":
+            return self._runner.predict(batch, full=True)
+        with self._lock:
+            if self._mode == "mock":
+                scores = batch.mean(axis=(2, 3)).mean(axis=1)
+                return {"scores": scores.astype(np.float32)}
 
+            if self._mode == "onnx":
+                name = self._runner.get_inputs()[0].name
+                outputs = self._runner.run(None, {name: np.ascontiguousarray(batch, dtype=self._input_dtype)})
+                result = {meta.name: value for meta, value in zip(self._runner.get_outputs(), outputs)}
+                if not {"pred_score", "pred_scores", "scores"} & result.keys():
+                    result["scores"] = outputs[0]
+                return result
 
-def extract_score(output: Any) -> float:
-    """Return the one-image anomaly score or fail instead of silently accepting bad output."""
+            if self._mode == "openvino":
+                request = self._openvino_request()
+                request.infer({0: np.ascontiguousarray(batch, dtype=self._input_dtype)})
+                return self._openvino_output(request)
+
+            t = self._input_tensor(batch)
+
+            if self._mode == "anomalib":
+                return self._runner.predict(t)
+
+            if self._mode == "torchscript":
+                out = self._runner(t)
+                if isinstance(out, dict):
+                    return {k: (v.detach().cpu().numpy() if torch.is_tensor(v) else v)
+                            for k, v in out.items()}
+                if torch.is_tensor(out):
+                    return {"scores": out.detach().cpu().numpy()}
+                return {"scores": np.array(out)}
+
+            return {"scores": np.zeros(batch.shape[0], dtype=np.float32)}
+
+    def anomaly_map(self, batch: np.ndarray) -> np.ndarray | None:
+        """Return the anomaly map of ``batch`` through the full path, or None if the model has none."""
+        return extract_anomaly_map(self.predict_full(batch))
+
+    def predict_async(self, batch: np.ndarray) -> Callable[[], Dict]:
+        """Start inference and return a callable that waits for the output.
+
+        OpenVINO runs the request on its own threads and remote requests are
+        pipelined on pooled connections, so several cameras can be in flight at
+        once; other runtimes complete before this returns.
+        """
+        if self._mode == "remote":
+            return self._runner.submit(batch)
+        if self._mode != "openvino":
+            output = self.predict(batch)
+            return lambda: output
+        with self._lock:
+            request = self._openvino_request()
+            request.start_async({0: np.ascontiguousarray(batch, dtype=self._input_dtype)})
+
+        def wait() -> Dict:
+            request.wait()
+            with self._lock:
+                return self._openvino_output(request)
+
+        return wait
+
+    def warmup(self, input_size: tuple[int, int], batch_sizes: Sequence[int] = (1,)) -> float:
+        """Run dummy inferences so allocator growth, kernel selection and JIT specialization
+        happen at load time rather than on the first trigger.  Returns elapsed milliseconds.
+
+        Shapes a cached backend was already warmed at are skipped.  Each dummy
+        inference takes the backend's lock like ``predict``, so a live worker
+        sharing this cached backend only waits for one inference at a time.
+        """
+        if self._mode == "mock" or self.cfg.warmup_iterations <= 0:
+            return 0.0
+        if self._mode == "remote":
+            # The server warms its own backend, once for every station that shares it.
+            return self._runner.warmup(input_size, batch_sizes)
+        start = time.perf_counter()
+        for batch_size in sorted(set(batch_sizes)):
+            shape = (batch_size, input_size[0], input_size[1])
+            with self._lock:
+                if shape in self._warm_shapes:
+                    continue
+            dummy = self.dummy_batch(batch_size, input_size)
+            for _ in range(self.cfg.warmup_iterations):
+                extract_score(self.predict(dummy), batch_size - 1)
+            with self._lock:
+                self._warm_shapes.add(shape)
+        if self.device == "cuda":
+            torch.cuda.synchronize()
+        return (time.perf_counter() - start) * 1000.0
+
+    def dummy_batch(self, batch_size: int, input_size: tuple[int, int]) -> np.ndarray:
+        """Zeros shaped and typed like this backend's prepared input."""
+        if self.cfg.raw_input in RAW_DTYPES:
+            return np.zeros((batch_size, 1, input_size[1], input_size[0]), dtype=RAW_DTYPES[self.cfg.raw_input])
+        return np.zeros((batch_size, 3, input_size[1], input_size[0]), dtype=np.float32)
+
+    @property
+    def module(self) -> torch.nn.Module | None:
+        """The loaded torch module, or None for mock backends."""
+        if self._mode == "anomalib":
+            return self._runner.model
+        if self._mode == "torchscript":
+            return self._runner
+        return None
+
+    @property
+    def memory_bytes(self) -> int:
+        """Approximate weight size used for the model cache budget.
+
+        Torch weights count where they live, so on CUDA this is device memory,
+        not host RAM; the budget bounds both together.
+        """
+        module = self.module
+        if module is not None:
+            tensors = list(module.parameters()) + list(module.buffers())
+            return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+        if self._mode in {"onnx", "openvino"}:
+            return os.path.getsize(self.cfg.path)
+        return 0
+
+    @property
+    def batch_key(self) -> tuple:
+        """Backends with equal keys run the same architecture and can share one forward pass."""
+        if self._mode == "remote":
+            return (self._mode, self.cfg.server, self.device, self.cfg.raw_input)
+        module = self.module
+        return (self._mode, type(module).__qualname__ if module is not None else "", self.device, self.cfg.raw_input)
+
+
+def load_backend(cfg: ModelConfig | dict, device: str = "cuda") -> InferenceBackend:
+    """Return a shared backend from the process-wide model cache, loading it on a miss."""
+    if isinstance(cfg, dict):
+        cfg = ModelConfig(**cfg)
+    return MODEL_CACHE.get(cfg, device, InferenceBackend)
+
+
+def extract_score(output: Any, index: int = 0) -> float:
+    """Return one image's anomaly score or fail instead of silently accepting bad output."""
     for name in ("pred_score", "pred_scores", "scores"):
         value = output.get(name) if isinstance(output, dict) else getattr(output, name, None)
         if value is None:
             continue
         if isinstance(value, torch.Tensor):
             value = value.detach().cpu().numpy()
-        return float(np.asarray(value).reshape(-1)[0])
+        return float(np.asarray(value).reshape(-1)[index])
+    raise ValueError(f"Inference output does not contain a supported score: {type(output).__name__}")
+
+
+def extract_anomaly_map(output: Any) -> np.ndarray | None:
+    """Return the anomaly maps of a full output as float32, or None if it has none."""
+    value = output.get("anomaly_map") if isinstance(output, dict) else getattr(output, "anomaly_map", None)
+    if value is None:
+        return None
+    if isinstance(value, torch.Tensor):
+        value = value.detach().cpu().numpy()
+    return np.asarray(value, dtype=np.float32)
+
+
+def score_tensor(output: Any) -> torch.Tensor:
+    """Return the score tensor of a raw model output without leaving the device."""
+    for name in ("pred_score", "pred_scores", "scores"):
+        value = output.get(name) if isinstance(output, dict) else getattr(output, name, None)
+        if isinstance(value, (torch.Tensor, torch.fx.Proxy)):  # Proxy while FX-tracing for quantization
+            return value
     raise ValueError(f"Inference output does not contain a supported score: {type(output).__name__}")
 
 
+class ScoreHead(torch.nn.Module):
+    """Expose only the image score so exported and quantized graphs have one stable output."""
+
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, image: torch.Tensor) -> torch.Tensor:
+        return score_tensor(self.model(image)).reshape(-1)
+
+
+def score_all(backend: InferenceBackend, batch: np.ndarray) -> np.ndarray:
+    """Score ``batch`` one row at a time, as parity and drift checks compare backends."""
+    return np.asarray([extract_score(backend.predict(batch[index:index + 1])) for index in range(len(batch))])
+
+
+class CameraGroup:
+    """Cameras whose models share an architecture and input size, scored in one forward pass.
+
+    Cameras that use the same checkpoint in the same process are run as an ordinary
+    batch; model-service cameras owned by different processes never are, so every
+    process scores its own cameras.  Cameras with
+    different weights are run through ``torch.func.vmap`` over stacked parameters, so
+    every camera still uses its own weights.  If the architecture cannot be vectorized
+    the group falls back to one forward per camera.  The first scored batch also
+    runs per camera and keeps the stacked path only if both give the same scores.
+    """
+
+    def __init__(self, cam_ids: Sequence[int], backends: Sequence[InferenceBackend]):
+        self.cam_ids = tuple(cam_ids)
+        self._backends = tuple(backends)
+        self._mode = "serial"
+        self._ensemble = None
+        self._ensemble_checked = False
+        first = self._backends[0]
+        if len(self._backends) == 1:
+            return
+        owner = getattr(first, "owner", None)
+        if all(getattr(backend, "owner", None) is owner for backend in self._backends) and (
+            first._mode == "mock"
+            or all(
+                backend is first or (backend.cfg.path == first.cfg.path and backend._mode == first._mode)
+                for backend in self._backends
+            )
+        ):
+            self._mode = "shared"
+            return
+        if first._mode == "anomalib":
+            try:
+                self._ensemble = self._build_ensemble([backend.module for backend in self._backends])
+                self._mode = "ensemble"
+            except Exception as exc:
+                print(f"[CameraGroup] cams {self.cam_ids}: stacked weights unavailable ({exc}); serial forward")
+
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+    @property
+    def backends(self) -> tuple[InferenceBackend, ...]:
+        return self._backends
+
+    @staticmethod
+    def _build_ensemble(modules: list[torch.nn.Module]):
+        from torch.func import functional_call, stack_module_state
+
+        params, buffers = stack_module_state(modules)
+        base = copy.deepcopy(modules[0]).to("meta")
+
+        def forward(p, b, images):
+            return score_tensor(functional_call(base, (p, b), (images,))).reshape(-1)
+
+        return torch.vmap(forward), params, buffers
+
+    def warmup(
+        self,
+        input_size: tuple[int, int],
+        max_triggers: int = 1,
+        max_tiles: int = 0,
+    ) -> tuple[dict[int, float], float]:
+        """Warm every batch size this group uses; return per-camera and shared group milliseconds.
+
+        ``max_triggers`` is the largest number of triggers coalesced into one pass
+        and ``max_tiles`` the largest tile batch of one camera when tiling is on.
+        """
+        timings: dict[int, float] = {}
+        warmed: set[int] = set()
+        triggers = range(1, max_triggers + 1)
+        for cam_id, backend in zip(self.cam_ids, self._backends):
+            if id(backend) in warmed:
+                timings[cam_id] = 0.0
+                continue
+            warmed.add(id(backend))
+            # One row per trigger serves partial triggers, early-reject per-camera passes and
+            # the serial fallback; a shared backend also scores whole groups of coalesced triggers.
+            if self._mode == "shared" and backend is self._backends[0]:
+                sizes = sorted({*triggers, *(count * len(self.cam_ids) for count in triggers)})
+            else:
+                sizes = list(triggers)
+            sizes = sorted({*sizes, *range(1, max_tiles + 1)})
+            timings[cam_id] = backend.warmup(input_size, sizes)
+        group_ms = 0.0
+        iterations = max(backend.cfg.warmup_iterations for backend in self._backends)
+        if self._mode == "ensemble" and iterations > 0:
+            start = time.perf_counter()
+            for count in triggers:
+                dummy = self._backends[0].dummy_batch(count * len(self.cam_ids), input_size)
+                for _ in range(iterations):
+                    self._ensemble_scores(dummy)
+            group_ms = (time.perf_counter() - start) * 1000.0
+        return timings, group_ms
+
+    @torch.inference_mode()
+    def predict_scores(self, batch: np.ndarray) -> list[float]:
+        """Score one or more triggers' frames in group order and return one score per row.
+
+        ``batch`` holds ``len(cam_ids)`` rows per trigger, trigger after trigger.
+        """
+        if self._mode == "shared":
+            output = self._backends[0].predict(batch)
+            return [extract_score(output, index) for index in range(len(batch))]
+        if self._mode == "ensemble":
+            try:
+                scores = self._ensemble_scores(batch)
+            except Exception as exc:
+                print(f"[CameraGroup] cams {self.cam_ids}: batched forward failed ({exc}); serial forward")
+                self._mode = "serial"
+                self._ensemble = None
+            else:
+                if self._ensemble_checked:
+                    return scores
+                serial = self._serial_scores(batch)
+                self._ensemble_checked = True
+                if np.allclose(scores, serial, rtol=1e-5, atol=1e-6):
+                    return scores
+                print(f"[CameraGroup] cams {self.cam_ids}: stacked-weight scores differ from per-camera scores; "
+                      "serial forward")
+                self._mode = "serial"
+                self._ensemble = None
+                return serial
+        return self._serial_scores(batch)
+
+    def _ensemble_scores(self, batch: np.ndarray) -> list[float]:
+        width = len(self.cam_ids)
+        forward, params, buffers = self._ensemble
+        t = self._backends[0]._input_tensor(batch)
+        per_camera = t.reshape(-1, width, *t.shape[1:]).transpose(0, 1)
+        scores = forward(params, buffers, per_camera).transpose(0, 1).reshape(-1).detach().cpu().numpy()
+        return [float(score) for score in scores]
+
+    def _serial_scores(self, batch: np.ndarray) -> list[float]:
+        width = len(self.cam_ids)
+        pending = [backend.predict_async(batch[index::width]) for index, backend in enumerate(self._backends)]
+        per_camera = [wait() for wait in pending]
+        return [extract_score(per_camera[index % width], index // width) for index in range(len(batch))]
+
+
+def group_cameras(
+    backends: dict[int, InferenceBackend],
+    input_sizes: dict[int, tuple[int, int]] | None = None,
+    batched: bool = True,
+) -> list[CameraGroup]:
+    """Group cameras by backend architecture and input size, keeping camera order stable."""
+    keyed: dict[tuple, list[int]] = {}
+    for cam_id in sorted(backends):
+        if batched:
+            key = (backends[cam_id].batch_key, (input_sizes or {}).get(cam_id))
+        else:
+            key = ("camera", cam_id)
+        keyed.setdefault(key, []).append(cam_id)
+    return [CameraGroup(cam_ids, [backends[cam_id] for cam_id in cam_ids]) for cam_ids in keyed.values()]
+
+
+def raw_inputs(backends: dict[int, InferenceBackend]) -> dict[int, str]:
+    """The ``raw_input`` row dtype of every camera whose model normalizes in its graph."""
+    return {cam_id: backend.cfg.raw_input for cam_id, backend in backends.items() if backend.cfg.raw_input}
+
+
+def warm_up_groups(
+    groups: Sequence[CameraGroup],
+    input_size: tuple[int, int],
+    max_triggers: int = 1,
+    input_sizes: dict[int, tuple[int, int]] | None = None,
+    tiling: TilingConfig | None = None,
+) -> dict[int, float]:
+    """Warm all camera groups and log the changeover cost per camera.
+
+    ``input_sizes`` overrides ``input_size`` per camera; groups never mix sizes.
+    With ``tiling`` enabled tile batches are warmed too, and a model without
+    anomaly maps, which could not rank tiles, fails the warm-up.
+    """
+    max_tiles = tiling.max_tiles if tiling is not None and tiling.enabled else 0
+    timings: dict[int, float] = {}
+    for group in groups:
+        size = (input_sizes or {}).get(group.cam_ids[0], input_size)
+        if max_tiles:
+            for cam_id, backend in zip(group.cam_ids, group.backends):
+                if backend._mode != "mock" and backend.anomaly_map(backend.dummy_batch(1, size)) is None:
+                    raise ValueError(f"Tiling needs anomaly maps; the model of camera {cam_id} has none")
+        group_timings, group_ms = group.warmup(size, max_triggers, max_tiles)
+        for cam_id, elapsed_ms in group_timings.items():
+            jlog(
+                "model_warmup",
+                cam_id=cam_id,
+                ms=round(elapsed_ms, 3),
+                group=list(group.cam_ids),
+                group_mode=group.mode,
+                group_ms=round(group_ms, 3),
+            )
+        timings.update(group_timings)
+    return timings
+
+
+CASCADE_STATS_EVERY = 500     # triggers between cascade stage counter logs
+PREPROCESS_STATS_EVERY = 500  # forward passes between per-camera preprocessing time logs
+PREPROCESS_EWMA_ALPHA = 0.1
+MAX_ABANDONED = 256           # abandoned trigger IDs remembered for in-flight passes
+
+
+class TriggerInbox:
+    """Thread-safe FIFO of synchronized triggers waiting for the inference worker."""
+
+    def __init__(self):
+        self._ready = threading.Condition()
+        self._items: deque[tuple[int, list]] = deque()
+        self._abandoned: dict[int, None] = {}
+        self._lines: dict[int, LineCondition] = {}
+
+    def put(self, trigger_idx: int, frames: list, line: LineCondition | None = None) -> None:
+        """Queue a trigger with the PLC line condition it arrived in, if known."""
+        with self._ready:
+            self._items.append((trigger_idx, frames))
+            if line is not None:
+                self._lines[trigger_idx] = line
+            self._ready.notify()
+
+    def take(self, max_triggers: int, max_wait_s: float = 0.0) -> list[tuple[int, list]]:
+        """Return up to ``max_triggers`` oldest triggers.
+
+        Only when a backlog already exists (more than one trigger is waiting) does
+        this wait, at most ``max_wait_s``, for the batch to fill; a lone trigger
+        is returned at once.
+        """
+        with self._ready:
+            if not self._items:
+                return []
+            if 1 < len(self._items) < max_triggers and max_wait_s > 0.0:
+                deadline = time.monotonic() + max_wait_s
+                while len(self._items) < max_triggers:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0.0 or not self._ready.wait(remaining):
+                        break
+            return [self._items.popleft() for _ in range(min(max_triggers, len(self._items)))]
+
+    def pop_oldest(self) -> int | None:
+        """Remove the oldest waiting trigger and return its index, or None if none is waiting."""
+        with self._ready:
+            if not self._items:
+                return None
+            trigger_idx = self._items.popleft()[0]
+            self._lines.pop(trigger_idx, None)
+            return trigger_idx
+
+    def abandon(self, trigger_idx: int) -> bool:
+        """Give up on a trigger whose deadline passed; True if it was still waiting here.
+
+        A trigger already taken is remembered so the worker skips it before its
+        forward pass.
+        """
+        with self._ready:
+            for index, (queued_idx, _frames) in enumerate(self._items):
+                if queued_idx == trigger_idx:
+                    del self._items[index]
+                    self._lines.pop(trigger_idx, None)
+                    return True
+            self._abandoned[trigger_idx] = None
+            if len(self._abandoned) > MAX_ABANDONED:
+                del self._abandoned[next(iter(self._abandoned))]
+            return False
+
+    def is_abandoned(self, trigger_idx: int) -> bool:
+        """True if the trigger's deadline passed after the worker took it."""
+        with self._ready:
+            return trigger_idx in self._abandoned
+
+    def pop_abandoned(self, trigger_ids: Sequence[int]) -> set[int]:
+        """Return which of ``trigger_ids`` were abandoned, forgetting them."""
+        with self._ready:
+            return {trigger_idx for trigger_idx in trigger_ids if self._abandoned.pop(trigger_idx, 0) is None}
+
+    def pop_lines(self, trigger_ids: Sequence[int]) -> dict[int, LineCondition]:
+        """Return the line conditions ``trigger_ids`` were queued with, forgetting them."""
+        with self._ready:
+            return {
+                trigger_idx: self._lines.pop(trigger_idx)
+                for trigger_idx in trigger_ids
+                if trigger_idx in self._lines
+            }
+
+    def __len__(self) -> int:
+        with self._ready:
+            return len(self._items)
+
+
+@dataclass(frozen=True)
+class PreparedTriggers:
+    """Preprocessed input of one or more triggers, handed from preprocessing to inference."""
+
+    items: list[tuple[int, list]]
+    batch: np.ndarray | MixedBatch | None
+    plan: TransformPlan                   # the batch was prepared with
+    preprocess_ms: float
+    prepared_at: float
+    error: str | None = None
+    release: Callable[[], None] | None = None  # frees the preprocess stage's queue slot
+    camera_ms: dict[int, float] = field(default_factory=dict)  # preprocessing time per camera
+
+
 class BatchInferenceWorker(QObject):
     """Run CPU/GPU work outside the Qt UI thread while keeping model use serialized."""
 
-    completed = pyqtSignal(int, list, list, float, bool, float)
+    # (trigger_idx, frames, scores, fused, ok, elapsed_ms, reused_camera_mask, gate_camera_mask, shed_reason)
+    completed = pyqtSignal(int, list, list, float, bool, float, int, int, int)
     failed = pyqtSignal(int, str)
-    recipe_loaded = pyqtSignal(int, int, int, int)
-    recipe_failed = pyqtSignal(int, int, int, str)
+    anomaly_maps = pyqtSignal(int, dict)  # (trigger_idx, {cam_id: HxW float32 map}) for NG cameras
+    recipe_loaded = pyqtSignal(int, int, int, int, float, float)  # (..., model_mask, load_ms, swap_ms)
 
     def __init__(
         self,
@@ -185,69 +899,515 @@ class BatchInferenceWorker(QObject):
         input_size: tuple[int, int],
         threshold: float,
         camera_rois: dict[int, tuple[int, int, int, int]] | None = None,
-        allow_mock_models: bool = False,
+        batched: bool = True,
+        maps_on_ng: bool = False,
+        cascade: Cascade | None = None,
+        tiling: TilingConfig | None = None,
+        max_triggers: int = 1,
+        max_wait_ms: float = 0.0,
+        early_reject: Callable[[int, int, float], None] | None = None,
+        camera_input_sizes: dict[int, tuple[int, int]] | None = None,
+        camera_thresholds: dict[int, float] | None = None,
+        similarity: FrameChangeDetector | None = None,
+        transform_plan: TransformPlan | None = None,
+        preprocess_executor: Executor | None = None,
     ):
         super().__init__()
         self._backends = backends
         self._input_size = input_size
         self._threshold = threshold
+        self._camera_input_sizes = camera_input_sizes or {}
+        self._camera_thresholds = camera_thresholds or {}
         self._camera_rois = camera_rois or {}
-        self._allow_mock_models = allow_mock_models
+        self._maps_on_ng = maps_on_ng
+        self._cascade = cascade
+        self._tiling = tiling or TilingConfig()
+        self._similarity = similarity
+        self._triggers = 0
+        self._max_triggers = max(1, max_triggers)
+        self._max_wait_s = max(0.0, max_wait_ms) / 1000.0
+        self.inbox = TriggerInbox()
+        self._executor = preprocess_executor
+        self._camera_ms: dict[int, float] = {}
+        self._passes = 0
+        self._batches = BatchBufferPool(input_size, self._max_triggers * len(backends))
+        self._plan = transform_plan or TransformPlan.plain(
+            input_size, self._camera_rois, self._camera_input_sizes, camera_raw_inputs=raw_inputs(backends)
+        )
+        self._shedding: tuple[bool, frozenset[int]] = (False, frozenset())
+        self._early_reject = early_reject
+        self._ng_order = NgRateOrder()
+        self._groups = group_cameras(backends, self._camera_input_sizes, batched=batched)
+
+    def warm_up(self) -> dict[int, float]:
+        """Warm the current backends at every batch size ``process`` and ``drain`` will use."""
+        return warm_up_groups(
+            self._groups, self._input_size, self._max_triggers, self._camera_input_sizes, self._tiling
+        )
+
+    def camera_threshold(self, cam_id: int) -> float:
+        """OK threshold of ``cam_id`` in the active recipe."""
+        return self._camera_thresholds.get(cam_id, self._threshold)
 
     @pyqtSlot(int, list)
     def process(self, trigger_idx: int, frames: list) -> None:
-        import time
+        self.infer_prepared(self.prepare_triggers([(trigger_idx, frames)]))
+
+    @pyqtSlot()
+    def drain(self) -> None:
+        """Score the triggers waiting in ``inbox``, coalescing a backlog into one forward pass."""
+        items = self.take_triggers()
+        if items:
+            self.infer_prepared(self.prepare_triggers(items))
+
+    def set_load_shedding(self, degraded: bool, bypassed_cameras: frozenset[int] = frozenset()) -> None:
+        """Set the overload level applied from the next pass on; safe to call from another thread.
+
+        Degraded passes score the coarse whole-ROI input instead of tiles, clear
+        frames through the cascade gate's wider degraded margin and skip anomaly
+        maps; bypassed cameras are not scored and report 0.0.  Each result
+        carries the ``ShedReason`` its pass actually applied.
+        """
+        self._shedding = (degraded, frozenset(bypassed_cameras))
+
+    def take_triggers(self) -> list[tuple[int, list]]:
+        return self.inbox.take(self._max_triggers, self._max_wait_s)
+
+    def prepare_triggers(self, items: list[tuple[int, list]], pooled: bool = True) -> PreparedTriggers:
+        """Preprocess the frames of ``items`` into one batch; safe to call from another thread.
+
+        A pooled batch goes back to the buffer pool when ``infer_prepared`` is done with it.
+        """
+        plan = self._plan
+        start = time.perf_counter()
+        batch, error = None, None
+        camera_ms: dict[int, float] = {}
+        try:
+            all_frames = [frame for _trigger_idx, frames in items for frame in frames]
+            batch = preprocess_batch(
+                all_frames,
+                plan=plan,
+                pool=self._batches if pooled else None,
+                executor=self._executor,
+                timings=camera_ms,
+            )
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+        prepared_at = time.perf_counter()
+        return PreparedTriggers(
+            items, batch, plan, (prepared_at - start) * 1000.0, prepared_at, error, camera_ms=camera_ms
+        )
 
+    @pyqtSlot(object)
+    def infer_prepared(self, prepared: PreparedTriggers) -> None:
+        try:
+            self._infer(prepared)
+        finally:
+            self._batches.release(prepared.batch)
+            if prepared.release is not None:
+                prepared.release()
+
+    def _infer(self, prepared: PreparedTriggers) -> None:
+        """Score one or more prepared triggers together and emit their results in arrival order."""
         start_time = time.perf_counter()
+        wait_ms = (start_time - prepared.prepared_at) * 1000.0
+        items = prepared.items
+        degraded, bypassed = self._shedding
         try:
             if QThread.currentThread().isInterruptionRequested():
                 return
-            batch = preprocess_batch(frames, size=self._input_size, camera_rois=self._camera_rois)
-            scores: list[float] = []
-            for index, frame in enumerate(frames):
+            lines = self.inbox.pop_lines([trigger_idx for trigger_idx, _frames in items])
+            abandoned = self.inbox.pop_abandoned([trigger_idx for trigger_idx, _frames in items])
+            if abandoned:
+                # Their deadline passed and a timeout was already reported; skip the model work.
+                items = [item for item in items if item[0] not in abandoned]
+                if not items:
+                    return
+                if prepared.batch is not None:
+                    rows, offset = [], 0
+                    for trigger_idx, frames in prepared.items:
+                        if trigger_idx not in abandoned:
+                            rows.extend(range(offset, offset + len(frames)))
+                        offset += len(frames)
+                    prepared = replace(prepared, items=items, batch=prepared.batch[rows])
+                jlog("inference_abandoned", triggers=sorted(abandoned))
+            if prepared.plan is not self._plan:
+                # A recipe swap happened while these triggers waited for the model.
+                prepared = self.prepare_triggers(items, pooled=False)
+            if prepared.error is not None:
+                raise RuntimeError(prepared.error)
+            batch = prepared.batch
+            all_frames = [frame for _trigger_idx, frames in items for frame in frames]
+            trigger_rows: list[dict[int, int]] = []
+            offset = 0
+            for _trigger_idx, frames in items:
+                trigger_rows.append({frame.cam_id: offset + index for index, frame in enumerate(frames)})
+                offset += len(frames)
+            for cam_id in {frame.cam_id for frame in all_frames}:
+                if cam_id not in self._backends:
+                    raise RuntimeError(f"No inference backend configured for camera {cam_id}")
+            # Cascade: frames the gate clears as OK skip the full model, score 0.0 and are
+            # marked in gate_camera_mask.
+            trigger_routes: list[dict[int, str]] = [{} for _ in items]
+            if self._cascade is not None:
+                trigger_routes = [
+                    {
+                        cam_id: self._cascade.route(cam_id, batch[row], degraded)
+                        for cam_id, row in rows.items()
+                        if cam_id not in bypassed
+                    }
+                    for rows in trigger_rows
+                ]
+            trigger_scores = [
+                {cam_id: 0.0 for cam_id, route in routes.items() if route == "gate"} for routes in trigger_routes
+            ]
+            for rows, by_camera in zip(trigger_rows, trigger_scores):
+                by_camera.update((cam_id, 0.0) for cam_id in bypassed if cam_id in rows)
+            # Similarity skip: on a stopped, setup or slow line, frames unchanged since their
+            # camera's last scored frame reuse its score.
+            trigger_signatures: list[dict[int, np.ndarray]] = [{} for _ in items]
+            trigger_reused: list[set[int]] = [set() for _ in items]
+            if self._similarity is not None:
+                for (trigger_idx, _frames), rows, by_camera, signatures, reused in zip(
+                    items, trigger_rows, trigger_scores, trigger_signatures, trigger_reused
+                ):
+                    reuse = self._similarity.allowed(lines.get(trigger_idx))
+                    for cam_id, row in rows.items():
+                        if cam_id in by_camera or not self._similarity.applies_to(cam_id):
+                            continue
+                        signatures[cam_id] = self._similarity.signature(batch[row])
+                        previous = self._similarity.reuse(cam_id, signatures[cam_id]) if reuse else None
+                        if previous is not None:
+                            by_camera[cam_id] = previous
+                            reused.add(cam_id)
+            tiled = self._tiling.enabled and not degraded
+            early = self._early_reject is not None
+            if early and not self._score_in_ng_order(items, batch, trigger_rows, trigger_scores, tiled):
+                return
+            groups = () if tiled or early else self._groups  # tiled mode scores per camera below
+            for group in groups:
                 if QThread.currentThread().isInterruptionRequested():
                     return
-                backend = self._backends.get(frame.cam_id)
-                if backend is None:
-                    raise RuntimeError(f"No inference backend configured for camera {frame.cam_id}")
-                output = backend.predict(batch[index:index + 1])
-                scores.append(extract_score(output))
-
+                complete: list[int] = []
+                for position, (rows, by_camera) in enumerate(zip(trigger_rows, trigger_scores)):
+                    present = [cam_id for cam_id in group.cam_ids if cam_id in rows and cam_id not in by_camera]
+                    if len(present) == len(group.cam_ids):
+                        complete.append(position)
+                    else:
+                        by_camera.update(
+                            (cam_id, extract_score(self._backends[cam_id].predict(batch[rows[cam_id]:rows[cam_id] + 1])))
+                            for cam_id in present
+                        )
+                if not complete:
+                    continue
+                # Every trigger with the whole group present shares one forward pass.
+                index = [trigger_rows[position][cam_id] for position in complete for cam_id in group.cam_ids]
+                contiguous = index == list(range(index[0], index[0] + len(index)))
+                group_scores = group.predict_scores(batch[index[0]:index[0] + len(index)] if contiguous else batch[index])
+                width = len(group.cam_ids)
+                for number, position in enumerate(complete):
+                    trigger_scores[position].update(zip(group.cam_ids, group_scores[number * width:(number + 1) * width]))
+            if tiled:
+                for (_trigger_idx, frames), rows, by_camera in zip(items, trigger_rows, trigger_scores):
+                    for frame in frames:
+                        if frame.cam_id not in by_camera:
+                            if QThread.currentThread().isInterruptionRequested():
+                                return
+                            by_camera[frame.cam_id] = self._tiled_score(frame, batch[rows[frame.cam_id]])
+            infer_ms = (time.perf_counter() - start_time) * 1000.0
+            elapsed_ms = prepared.preprocess_ms + infer_ms
+        except Exception as exc:
+            message = str(exc) if prepared.error is not None else f"{type(exc).__name__}: {exc}"
+            for trigger_idx, _frames in items:
+                self.failed.emit(trigger_idx, message)
+            return
+        if len(items) > 1 or wait_ms >= 1.0:
+            jlog(
+                "inference_stages",
+                triggers=[trigger_idx for trigger_idx, _frames in items],
+                preprocess_ms=round(prepared.preprocess_ms, 3),
+                wait_ms=round(wait_ms, 3),
+                infer_ms=round(infer_ms, 3),
+                camera_ms={cam_id: round(ms, 3) for cam_id, ms in sorted(prepared.camera_ms.items())},
+            )
+        self._record_preprocess(prepared.camera_ms)
+        for (trigger_idx, frames), rows, routes, by_camera, signatures, reused in zip(
+            items, trigger_rows, trigger_routes, trigger_scores, trigger_signatures, trigger_reused
+        ):
+            scores = [by_camera[frame.cam_id] for frame in frames]
+            if not degraded:
+                for cam_id, signature in signatures.items():
+                    if cam_id not in reused:
+                        self._similarity.remember(cam_id, signature, by_camera[cam_id])
+            if routes:
+                self._record_cascade(trigger_idx, routes, by_camera)
+            if self._early_reject is not None:
+                self._ng_order.record(by_camera, self._threshold, self._camera_thresholds)
             fused = fuse_scores(scores)
-            ok = decide(self._threshold, fused)
-            elapsed_ms = (time.perf_counter() - start_time) * 1000.0
-            self.completed.emit(trigger_idx, frames, scores, fused, ok, elapsed_ms)
+            ok = all(decide(self.camera_threshold(cam_id), score) for cam_id, score in by_camera.items())
+            reused_mask = sum(1 << cam_id for cam_id in reused)
+            gate_mask = sum(1 << cam_id for cam_id, route in routes.items() if route == "gate")
+            if degraded and (self._tiling.enabled or routes):
+                shed_reason = ShedReason.DEGRADED
+            elif any(cam_id in rows for cam_id in bypassed):
+                shed_reason = ShedReason.CAMERAS_BYPASSED
+            else:
+                shed_reason = ShedReason.NONE
+            self.completed.emit(
+                trigger_idx, frames, scores, fused, ok, elapsed_ms, reused_mask, gate_mask, int(shed_reason)
+            )
+            if not ok and self._maps_on_ng and not degraded:
+                self._emit_anomaly_maps(trigger_idx, frames, scores, batch[[rows[frame.cam_id] for frame in frames]])
+
+    def _score_in_ng_order(
+        self,
+        items: list[tuple[int, list]],
+        batch: np.ndarray,
+        trigger_rows: list[dict[int, int]],
+        trigger_scores: list[dict[int, float]],
+        tiled: bool,
+    ) -> bool:
+        """Score camera by camera, likeliest NG first, firing the early reject on the first NG.
+
+        With max fusion a trigger is certainly NG once one camera reaches the
+        threshold; its remaining cameras are still scored for the result.
+        Returns False if interrupted.
+        """
+        fired: set[int] = set()
+        for cam_id in self._ng_order.order(self._backends):
+            positions = [
+                position
+                for position, (rows, by_camera) in enumerate(zip(trigger_rows, trigger_scores))
+                if cam_id in rows and cam_id not in by_camera
+            ]
+            if not positions:
+                continue
+            if QThread.currentThread().isInterruptionRequested():
+                return False
+            if tiled:
+                scores = [
+                    self._tiled_score(
+                        next(frame for frame in items[position][1] if frame.cam_id == cam_id),
+                        batch[trigger_rows[position][cam_id]],
+                    )
+                    for position in positions
+                ]
+            else:
+                output = self._backends[cam_id].predict(batch[[trigger_rows[position][cam_id] for position in positions]])
+                scores = [extract_score(output, index) for index in range(len(positions))]
+            for position, score in zip(positions, scores):
+                trigger_scores[position][cam_id] = score
+                if score >= self.camera_threshold(cam_id) and position not in fired:
+                    fired.add(position)
+                    # A trigger timed out mid-pass already has its result published.
+                    if not self.inbox.is_abandoned(items[position][0]):
+                        self._early_reject(items[position][0], cam_id, score)
+        return True
+
+    def _tiled_score(self, frame, coarse: np.ndarray) -> float:
+        """Score one camera as the max over full-resolution tiles picked by a coarse pass.
+
+        The coarse pass is the usual whole-ROI input; its anomaly map selects the
+        tiles, which are cut from the camera's corrected region by the recipe's
+        transform plan and run through the backend as one batch.  Without tiles
+        above the selection level the coarse score is the camera score.
+        """
+        backend = self._backends[frame.cam_id]
+        transform = self._plan.camera(frame.cam_id)
+        area = transform.region_size(frame.image.shape)
+        output = backend.predict_full(coarse[np.newaxis])
+        anomaly_map = extract_anomaly_map(output)
+        tiles = tile_grid(area[0], area[1], transform.size, self._tiling.overlap)
+        selected = select_tiles(
+            None if anomaly_map is None else anomaly_map.reshape(anomaly_map.shape[-2:]),
+            area,
+            tiles,
+            self._tiling.select_above,
+            self._tiling.max_tiles,
+        )
+        if not selected:
+            return extract_score(output)
+        tile_output = backend.predict(transform.tiles(frame.image, [tiles[index] for index in selected]))
+        return max(extract_score(tile_output, index) for index in range(len(selected)))
+
+    def _record_preprocess(self, camera_ms: dict[int, float]) -> None:
+        for cam_id, elapsed_ms in camera_ms.items():
+            average = self._camera_ms.get(cam_id, elapsed_ms)
+            self._camera_ms[cam_id] = average + PREPROCESS_EWMA_ALPHA * (elapsed_ms - average)
+        self._passes += 1
+        if self._passes % PREPROCESS_STATS_EVERY == 0:
+            jlog(
+                "preprocess_stats",
+                passes=self._passes,
+                parallel=self._executor is not None,
+                camera_ms={cam_id: round(ms, 3) for cam_id, ms in sorted(self._camera_ms.items())},
+            )
+
+    def _record_cascade(self, trigger_idx: int, routes: dict[int, str], by_camera: dict[int, float]) -> None:
+        for cam_id, route in routes.items():
+            if route == "audit":
+                self._cascade.audit(cam_id, trigger_idx, by_camera[cam_id], self.camera_threshold(cam_id))
+        self._triggers += 1
+        if self._triggers % CASCADE_STATS_EVERY == 0:
+            jlog("cascade_stats", triggers=self._triggers, **asdict(self._cascade.stats()))
+
+    def _emit_anomaly_maps(self, trigger_idx: int, frames: list, scores: list[float], batch: np.ndarray) -> None:
+        """Compute full anomaly maps for NG cameras after the verdict has been emitted."""
+        maps: dict[int, np.ndarray] = {}
+        try:
+            for index, (frame, score) in enumerate(zip(frames, scores)):
+                if score >= self.camera_threshold(frame.cam_id):
+                    anomaly_map = self._backends[frame.cam_id].anomaly_map(batch[index:index + 1])
+                    if anomaly_map is not None:
+                        maps[frame.cam_id] = anomaly_map.reshape(anomaly_map.shape[-2:])
         except Exception as exc:
-            self.failed.emit(trigger_idx, f"{type(exc).__name__}: {exc}")
+            print(f"[BatchInferenceWorker] anomaly maps failed for trigger {trigger_idx}: {exc}")
+        if maps:
+            self.anomaly_maps.emit(trigger_idx, maps)
+
+    @pyqtSlot(object)
+    def apply_recipe(self, loaded: LoadedRecipe) -> None:
+        """Swap to a fully loaded and warmed recipe between two triggers."""
+        swap_start = time.perf_counter()
+        runtime = loaded.runtime
+        self._backends = loaded.backends
+        self._groups = loaded.groups
+        self._input_size = runtime.input_size
+        self._threshold = runtime.ok_threshold
+        self._camera_input_sizes = runtime.camera_input_sizes
+        self._camera_thresholds = runtime.camera_thresholds
+        self._camera_rois = runtime.definition.camera_rois
+        self._plan = loaded.plan or TransformPlan.plain(
+            self._input_size, self._camera_rois, self._camera_input_sizes, camera_raw_inputs=raw_inputs(self._backends)
+        )
+        self._batches.configure(self._input_size, self._max_triggers * len(self._backends))
+        self._tiling = runtime.tiling
+        self._similarity = load_detector(runtime.similarity)  # references belong to the old product
+        if self._cascade is not None:
+            jlog("cascade_stats", triggers=self._triggers, **asdict(self._cascade.stats()))
+        self._cascade = loaded.cascade
+        self._triggers = 0
+        self._ng_order = NgRateOrder()  # NG rates are learned per product
+        swapped_at = time.perf_counter()
+        jlog(
+            "recipe_swap",
+            recipe_id=runtime.definition.recipe_id,
+            sequence=loaded.request_sequence,
+            load_ms=round(loaded.load_ms, 3),
+            wait_ms=round((swap_start - loaded.loaded_at) * 1000.0, 3),
+            swap_ms=round((swapped_at - swap_start) * 1000.0, 3),
+        )
+        self.recipe_loaded.emit(
+            loaded.request_sequence,
+            runtime.definition.recipe_id,
+            runtime.definition.revision,
+            sum(1 << cam_id for cam_id in loaded.backends),
+            loaded.load_ms,
+            (swapped_at - loaded.loaded_at) * 1000.0,
+        )
+
+
+class PreprocessStage(QObject):
+    """Prepare the next triggers on their own thread while the worker runs the model.
+
+    OpenCV releases the GIL during resizing, so trigger N+1 is preprocessed while
+    trigger N is inferred.  At most ``depth`` prepared passes wait for the model;
+    beyond that this stage blocks and new triggers collect in the worker's inbox,
+    where the next pass coalesces them.
+    """
+
+    prepared = pyqtSignal(object)
+
+    def __init__(self, worker: BatchInferenceWorker, depth: int = 1):
+        super().__init__()
+        self._worker = worker
+        self._slots = threading.Semaphore(max(1, depth))
+
+    @pyqtSlot()
+    def prepare(self) -> None:
+        if not len(self._worker.inbox):
+            return
+        while not self._slots.acquire(timeout=0.05):
+            if QThread.currentThread().isInterruptionRequested():
+                return
+        items = self._worker.take_triggers()
+        if not items:
+            self._slots.release()
+            return
+        self.prepared.emit(replace(self._worker.prepare_triggers(items), release=self._slots.release))
+
+
+@dataclass(frozen=True)
+class LoadedRecipe:
+    """Backends of a recipe that are loaded and warmed but not yet in service."""
+
+    runtime: RecipeRuntime
+    request_sequence: int
+    backends: dict[int, InferenceBackend]
+    groups: list[CameraGroup]
+    load_ms: float
+    loaded_at: float
+    cascade: Cascade | None = None
+    plan: TransformPlan | None = None
+
+
+class RecipeLoader(QObject):
+    """Load and warm recipe models on a separate thread while current models keep serving."""
+
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(int, int, int, str)
+
+    def __init__(
+        self,
+        camera_count: int,
+        allow_mock_models: bool = False,
+        batched: bool = True,
+        max_triggers: int = 1,
+        service: InferenceService | None = None,
+    ):
+        super().__init__()
+        self._camera_count = camera_count
+        self._allow_mock_models = allow_mock_models
+        self._batched = batched
+        self._max_triggers = max(1, max_triggers)
+        self._service = service
 
     @pyqtSlot(object, int)
-    def reconfigure_recipe(self, runtime: RecipeRuntime, request_sequence: int) -> None:
-        """Load recipe-specific models in the inference thread, behind queued predictions."""
+    def load(self, runtime: RecipeRuntime, request_sequence: int) -> None:
+        start = time.perf_counter()
         try:
             backends: dict[int, InferenceBackend] = {}
-            for cam_id in range(len(self._backends)):
-                raw = runtime.models.get(f"cam{cam_id + 1}", runtime.models.get(str(cam_id)))
+            for cam_id in range(self._camera_count):
+                raw = runtime.camera_model(cam_id)
                 if raw is None:
                     raise ValueError(f"Recipe lacks a model configuration for camera {cam_id}")
-                backend = InferenceBackend(ModelConfig(**raw), device="cuda")
+                if self._service is not None:
+                    backend = self._service.backend(cam_id, ModelConfig(**raw))
+                else:
+                    backend = load_backend(ModelConfig(**raw), device="cuda")
                 if backend._mode == "mock" and not self._allow_mock_models:
                     raise RuntimeError(f"Model for camera {cam_id} did not load")
                 backends[cam_id] = backend
-            self._backends = backends
-            self._input_size = runtime.input_size
-            self._threshold = runtime.ok_threshold
-            self._camera_rois = runtime.definition.camera_rois
-            mask = sum(1 << cam_id for cam_id in backends)
-            self.recipe_loaded.emit(
-                request_sequence,
-                runtime.definition.recipe_id,
-                runtime.definition.revision,
-                mask,
-            )
+            groups = group_cameras(backends, runtime.camera_input_sizes, batched=self._batched)
+            warm_up_groups(groups, runtime.input_size, self._max_triggers, runtime.camera_input_sizes, runtime.tiling)
+            cascade = load_cascade(runtime.cascade, self._camera_count)
+            plan = compile_transform_plan(runtime)
         except Exception as exc:
-            self.recipe_failed.emit(
+            self.failed.emit(
                 request_sequence,
                 runtime.definition.recipe_id,
                 runtime.definition.revision,
                 f"{type(exc).__name__}: {exc}",
             )
+            return
+        loaded_at = time.perf_counter()
+        self.loaded.emit(LoadedRecipe(
+            runtime=runtime,
+            request_sequence=request_sequence,
+            backends=backends,
+            groups=groups,
+            load_ms=(loaded_at - start) * 1000.0,
+            loaded_at=loaded_at,
+            cascade=cascade,
+            plan=plan,
+        ))
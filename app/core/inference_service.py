@@ -0,0 +1,383 @@
+"""Optional out-of-process inference: model processes fed through shared-memory rings.
+
+Each model process owns the models of a fixed set of cameras.  Prepared input
+rows are copied into a slot of the process's shared-memory ring, and only a small
+request tuple (request ID, slot, shape) travels over the pipe; scores come back
+the same way.  A process that dies or misses its deadline is killed and restarted
+in the background with its models, while requests for its cameras fail fast, so
+acquisition, the UI and the other cameras keep running.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict, deque
+from dataclasses import asdict, astuple, dataclass
+import multiprocessing as mp
+from multiprocessing.shared_memory import SharedMemory
+import threading
+import time
+from typing import Any, Callable, Sequence
+
+import numpy as np
+
+from app.core.infer_worker import ModelConfig, extract_anomaly_map, extract_score, load_backend
+from app.core.logger import jlog
+
+
+class ServiceError(RuntimeError):
+    """A model process is unavailable or failed a request."""
+
+
+@dataclass(frozen=True, slots=True)
+class ServiceConfig:
+    """``service`` section of ``configs/inference.yaml``."""
+
+    enabled: bool = False
+    processes: tuple[tuple[int, ...], ...] = ((0, 1), (2, 3))  # cameras per model process
+    ring_slots: int = 4
+    slot_mb: float = 16.0
+    timeout_ms: float = 5000.0
+    device: str = "cuda"
+
+    @classmethod
+    def from_mapping(cls, raw: dict[str, Any] | None) -> "ServiceConfig":
+        raw = raw or {}
+        defaults = cls()
+        processes = tuple(tuple(int(cam_id) for cam_id in cams) for cams in raw.get("processes", defaults.processes))
+        cam_ids = [cam_id for cams in processes for cam_id in cams]
+        if not processes or not all(processes) or len(cam_ids) != len(set(cam_ids)):
+            raise ValueError("service.processes must list each camera in exactly one non-empty process")
+        return cls(
+            enabled=bool(raw.get("enabled", defaults.enabled)),
+            processes=processes,
+            ring_slots=max(1, int(raw.get("ring_slots", defaults.ring_slots))),
+            slot_mb=float(raw.get("slot_mb", defaults.slot_mb)),
+            timeout_ms=float(raw.get("timeout_ms", defaults.timeout_ms)),
+            device=str(raw.get("device", defaults.device)),
+        )
+
+
+def _serve(conn, shm_name: str, slot_bytes: int, device: str, keep_models: int) -> None:
+    """Model process main loop: load models and score rows read from the shared ring."""
+    shm = SharedMemory(name=shm_name)
+    models: OrderedDict[tuple, Any] = OrderedDict()
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+            request_id, kind, key, slot, shape, payload = message
+            try:
+                if kind == "load":
+                    models[key] = load_backend(ModelConfig(**payload), device=device)
+                    models.move_to_end(key)
+                    while len(models) > keep_models:
+                        models.popitem(last=False)
+                    result = models[key]._mode
+                elif kind == "warmup":
+                    result = models[key].warmup(*payload)
+                else:
+                    rows = np.ndarray(shape, dtype=np.float32, buffer=shm.buf, offset=slot * slot_bytes)
+                    try:
+                        if kind == "predict":
+                            output = models[key].predict(rows)
+                            result = np.asarray([extract_score(output, index) for index in range(shape[0])])
+                        else:
+                            output = models[key].predict_full(rows)
+                            result = {"pred_score": np.asarray([extract_score(output, index) for index in range(shape[0])])}
+                            anomaly_map = extract_anomaly_map(output)
+                            if anomaly_map is not None:
+                                result["anomaly_map"] = anomaly_map
+                    finally:
+                        del rows
+                conn.send((request_id, True, result))
+            except Exception as exc:
+                conn.send((request_id, False, f"{type(exc).__name__}: {exc}"))
+    finally:
+        shm.close()
+
+
+class _ModelProcess:
+    """Client side of one model process: ring slots, pipe, and restart on failure."""
+
+    def __init__(self, index: int, cam_ids: Sequence[int], config: ServiceConfig, context):
+        self.index = index
+        self.cam_ids = tuple(cam_ids)
+        self.config = config
+        self._context = context
+        self._slot_bytes = int(config.slot_mb * 1024 * 1024)
+        self._keep_models = 2 * len(self.cam_ids)  # current recipe plus the one being loaded
+        self._shm = SharedMemory(create=True, size=self._slot_bytes * config.ring_slots)
+        self._cond = threading.Condition(threading.Lock())
+        self._free = deque(range(config.ring_slots))
+        self._slots: dict[int, int] = {}             # request ID -> ring slot
+        self._pending: set[int] = set()
+        self._replies: dict[int, tuple[bool, Any]] = {}
+        self._loads: OrderedDict[tuple, dict] = OrderedDict()  # replayed after a restart
+        self._next_id = 0
+        self._receiving = False
+        self._available = False
+        self._closing = False
+        self._conn = None
+        self._process = None
+        with self._cond:
+            self._spawn()
+        self._available = True
+
+    def _spawn(self) -> None:
+        parent, child = self._context.Pipe()
+        process = self._context.Process(
+            target=_serve,
+            args=(child, self._shm.name, self._slot_bytes, self.config.device, self._keep_models),
+            name=f"inference-{self.index}",
+            daemon=True,
+        )
+        process.start()
+        child.close()
+        self._conn, self._process = parent, process
+
+    def load(self, cfg: ModelConfig) -> str:
+        key = astuple(cfg)
+        with self._cond:
+            self._loads[key] = asdict(cfg)
+            self._loads.move_to_end(key)
+            while len(self._loads) > self._keep_models:
+                self._loads.popitem(last=False)
+        return self.wait(self.submit("load", key, payload=asdict(cfg)), timeout=None)
+
+    def submit(self, kind: str, key: tuple, rows: np.ndarray | None = None, payload: Any = None) -> int:
+        with self._cond:
+            if not self._available and kind != "load":
+                raise ServiceError(f"Model process {self.index} for cameras {self.cam_ids} is restarting")
+            slot = None
+            if rows is not None:
+                if rows.nbytes > self._slot_bytes:
+                    raise ServiceError(f"{rows.nbytes} byte request exceeds service.slot_mb")
+                deadline = time.monotonic() + self.config.timeout_ms / 1000.0
+                while not self._free:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0.0:
+                        raise ServiceError(f"Model process {self.index} ring is full")
+                    if self._receiving:
+                        self._cond.wait(min(remaining, 0.05))
+                    else:
+                        self._receive(min(remaining, 0.05))  # replies free their slots
+                    if not self._available and kind != "load":
+                        raise ServiceError(f"Model process {self.index} for cameras {self.cam_ids} failed")
+                slot = self._free.popleft()
+                view = np.ndarray(rows.shape, dtype=np.float32, buffer=self._shm.buf, offset=slot * self._slot_bytes)
+                np.copyto(view, rows, casting="same_kind")
+                del view
+            request_id = self._next_id
+            self._next_id += 1
+            self._pending.add(request_id)
+            if slot is not None:
+                self._slots[request_id] = slot
+            try:
+                self._conn.send((request_id, kind, key, slot, None if rows is None else rows.shape, payload))
+            except (OSError, ValueError) as exc:
+                self._fail(f"send failed: {exc}")
+            return request_id
+
+    def wait(self, request_id: int, timeout: float | None = -1.0) -> Any:
+        """Return the reply of ``request_id``; ``timeout`` -1 uses the service deadline, None waits."""
+        if timeout is not None and timeout < 0:
+            timeout = self.config.timeout_ms / 1000.0
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while request_id not in self._replies:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0.0:
+                    self._fail(f"no reply within {timeout * 1000.0:.0f} ms")
+                    continue
+                if self._receiving:
+                    self._cond.wait(0.05 if remaining is None else min(remaining, 0.05))
+                    continue
+                self._receive(0.05 if remaining is None else min(remaining, 0.05))
+            ok, result = self._replies.pop(request_id)
+        if not ok:
+            raise ServiceError(result)
+        return result
+
+    def _receive(self, timeout: float) -> None:
+        """Read one reply from the pipe without holding the lock while blocked."""
+        conn, process = self._conn, self._process
+        self._receiving = True
+        self._cond.release()
+        message, failure = None, None
+        try:
+            if conn.poll(timeout):
+                message = conn.recv()
+            elif not process.is_alive():
+                failure = f"exited with code {process.exitcode}"
+        except (EOFError, OSError) as exc:
+            failure = f"pipe closed ({type(exc).__name__})"
+        finally:
+            self._cond.acquire()
+            self._receiving = False
+            self._cond.notify_all()
+        if failure is not None:
+            if conn is self._conn:
+                self._fail(failure)
+            return
+        if message is not None and conn is self._conn:
+            request_id, ok, result = message
+            self._complete(request_id, ok, result)
+
+    def _complete(self, request_id: int, ok: bool, result: Any) -> None:
+        if request_id not in self._pending:
+            return
+        self._pending.discard(request_id)
+        slot = self._slots.pop(request_id, None)
+        if slot is not None:
+            self._free.append(slot)
+        self._replies[request_id] = (ok, result)
+        self._cond.notify_all()
+
+    def _fail(self, reason: str) -> None:
+        """Kill the process, fail its outstanding requests and restart it in the background."""
+        message = f"Model process {self.index} for cameras {self.cam_ids}: {reason}"
+        for request_id in list(self._pending):
+            self._complete(request_id, False, message)
+        if not self._available and not self._closing and self._process is not None and self._process.is_alive():
+            # Already restarting; this failure belongs to the new process being loaded.
+            self._process.kill()
+            return
+        was_available = self._available
+        self._available = False
+        if self._process is not None and self._process.is_alive():
+            self._process.kill()
+        jlog("inference_process_failed", process=self.index, cam_ids=list(self.cam_ids), reason=reason)
+        if was_available and not self._closing:
+            threading.Thread(target=self._restart, name=f"inference-{self.index}-restart", daemon=True).start()
+
+    def _restart(self) -> None:
+        while not self._closing:
+            start = time.perf_counter()
+            with self._cond:
+                self._free = deque(range(self.config.ring_slots))
+                self._slots.clear()
+                self._spawn()
+                loads = list(self._loads.items())
+            try:
+                for key, cfg in loads:
+                    self.wait(self.submit("load", key, payload=cfg), timeout=None)
+            except ServiceError as exc:
+                jlog("inference_process_restart_failed", process=self.index, error=str(exc))
+                time.sleep(1.0)
+                continue
+            with self._cond:
+                self._available = True
+            jlog(
+                "inference_process_restarted",
+                process=self.index,
+                cam_ids=list(self.cam_ids),
+                models=len(loads),
+                ms=round((time.perf_counter() - start) * 1000.0, 3),
+            )
+            return
+
+    @property
+    def available(self) -> bool:
+        with self._cond:
+            return self._available
+
+    def close(self) -> None:
+        with self._cond:
+            self._closing = True
+            self._available = False
+            try:
+                self._conn.send(None)
+            except (OSError, ValueError):
+                pass
+        self._process.join(timeout=3.0)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join(timeout=1.0)
+        self._conn.close()
+        self._shm.close()
+        self._shm.unlink()
+
+
+class ServiceBackend:
+    """Stand-in for ``InferenceBackend`` whose model lives in a model process."""
+
+    def __init__(self, process: _ModelProcess, cfg: ModelConfig, mode: str):
+        self.cfg = cfg
+        self.device = process.config.device
+        self.remote_mode = mode
+        self._mode = "mock" if mode == "mock" else "service"
+        self._process = process
+        self._key = astuple(cfg)
+
+    def predict(self, batch: np.ndarray) -> dict:
+        return self.predict_async(batch)()
+
+    def predict_async(self, batch: np.ndarray) -> Callable[[], dict]:
+        """Send ``batch`` and return a callable waiting for its scores, so processes run in parallel."""
+        request_id = self._process.submit("predict", self._key, rows=np.ascontiguousarray(batch, dtype=np.float32))
+        return lambda: {"scores": self._process.wait(request_id)}
+
+    def predict_full(self, batch: np.ndarray) -> dict:
+        rows = np.ascontiguousarray(batch, dtype=np.float32)
+        return self._process.wait(self._process.submit("full", self._key, rows=rows))
+
+    def anomaly_map(self, batch: np.ndarray) -> np.ndarray | None:
+        return extract_anomaly_map(self.predict_full(batch))
+
+    def dummy_batch(self, batch_size: int, input_size: tuple[int, int]) -> np.ndarray:
+        channels = 1 if self.cfg.raw_input else 3  # raw rows travel as float32 like every other row
+        return np.zeros((batch_size, channels, input_size[1], input_size[0]), dtype=np.float32)
+
+    def warmup(self, input_size: tuple[int, int], batch_sizes: Sequence[int] = (1,)) -> float:
+        payload = (tuple(input_size), list(batch_sizes))
+        return self._process.wait(self._process.submit("warmup", self._key, payload=payload), timeout=None)
+
+    @property
+    def owner(self) -> _ModelProcess:
+        """The model process serving this camera; only its own cameras may share one forward pass."""
+        return self._process
+
+    @property
+    def module(self) -> None:
+        return None
+
+    @property
+    def memory_bytes(self) -> int:
+        return 0
+
+    @property
+    def batch_key(self) -> tuple:
+        # One group for all service cameras of a row format: its serial mode keeps every
+        # process busy at once.
+        return ("service", self.device, self.cfg.raw_input)
+
+
+class InferenceService:
+    """Pool of model processes, each owning the models of a fixed set of cameras."""
+
+    def __init__(self, config: ServiceConfig):
+        self.config = config
+        context = mp.get_context("spawn")
+        self._processes = [
+            _ModelProcess(index, cam_ids, config, context) for index, cam_ids in enumerate(config.processes)
+        ]
+        self._by_camera = {cam_id: process for process in self._processes for cam_id in process.cam_ids}
+        jlog("inference_service_start", processes=[list(cam_ids) for cam_ids in config.processes])
+
+    def backend(self, cam_id: int, cfg: ModelConfig) -> ServiceBackend:
+        """Load ``cfg`` in the process owning ``cam_id``; blocks until the model is loaded."""
+        process = self._by_camera.get(cam_id)
+        if process is None:
+            raise ServiceError(f"No model process is configured for camera {cam_id}")
+        return ServiceBackend(process, cfg, process.load(cfg))
+
+    def ready_mask(self) -> int:
+        return sum(1 << cam_id for cam_id, process in self._by_camera.items() if process.available)
+
+    def close(self) -> None:
+        for process in self._processes:
+            process.close()
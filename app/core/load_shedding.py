@@ -0,0 +1,121 @@
+"""Overload policy: how many triggers may wait for a verdict and what gives way first.
+
+The pending-trigger limit adapts to measured inference time: as many forward
+passes as fit into the trigger deadline (see ``app.core.cycle_budget``), each
+coalescing up to ``max_triggers`` triggers, bounded by ``min_pending`` and
+``max_pending``.  Without a deadline the limit is ``max_pending``.
+
+At the limit a trigger is dropped, the newest (``drop_newest``) or the oldest
+still queued (``drop_oldest``).  The ``degrade`` and ``bypass_cameras``
+policies act earlier: once ``degrade_at`` of the limit is pending the worker
+inspects degraded (the coarse whole-ROI pass instead of tiles, the cascade
+gate's wider degraded margin, no anomaly maps) or skips
+``non_critical_cameras``, until the backlog falls to ``recover_at`` of the
+limit.  They still drop the newest trigger at the limit.  ``degrade`` needs a
+recipe with tiling or a cascade, or it would change nothing.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import math
+from typing import Any
+
+POLICIES = ("drop_newest", "drop_oldest", "degrade", "bypass_cameras")
+EWMA_ALPHA = 0.2
+
+
+@dataclass(frozen=True, slots=True)
+class LoadSheddingConfig:
+    """``load_shedding`` section of ``configs/inference.yaml``."""
+
+    policy: str = "drop_newest"
+    max_pending: int = 0            # 0: two forward passes of micro_batch.max_triggers
+    min_pending: int = 1
+    adaptive: bool = True
+    degrade_at: float = 0.5         # of the limit
+    recover_at: float = 0.25
+    non_critical_cameras: tuple[int, ...] = ()
+
+    @classmethod
+    def from_mapping(cls, raw: dict[str, Any] | None) -> "LoadSheddingConfig":
+        raw = raw or {}
+        defaults = cls()
+        config = cls(
+            policy=str(raw.get("policy", defaults.policy)),
+            max_pending=max(0, int(raw.get("max_pending", defaults.max_pending))),
+            min_pending=max(1, int(raw.get("min_pending", defaults.min_pending))),
+            adaptive=bool(raw.get("adaptive", defaults.adaptive)),
+            degrade_at=float(raw.get("degrade_at", defaults.degrade_at)),
+            recover_at=float(raw.get("recover_at", defaults.recover_at)),
+            non_critical_cameras=tuple(int(cam_id) for cam_id in raw.get("non_critical_cameras", ())),
+        )
+        if config.policy not in POLICIES:
+            raise ValueError(f"load_shedding.policy must be one of {', '.join(POLICIES)}")
+        if not 0.0 <= config.recover_at < config.degrade_at <= 1.0:
+            raise ValueError("load_shedding requires 0 <= recover_at < degrade_at <= 1")
+        if config.policy == "bypass_cameras" and not config.non_critical_cameras:
+            raise ValueError("load_shedding.policy bypass_cameras needs non_critical_cameras")
+        return config
+
+
+class LoadShedder:
+    """Decide admission of new triggers and the worker's degraded level from the backlog."""
+
+    def __init__(self, config: LoadSheddingConfig, max_triggers: int = 1, default_max_pending: int = 2):
+        self._config = config
+        self._max_triggers = max(1, max_triggers)
+        self._max_pending = config.max_pending or default_max_pending * self._max_triggers
+        self._min_pending = min(config.min_pending, self._max_pending)
+        self._limit = self._max_pending
+        self._pass_ms = 0.0
+        self._shedding = False
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def degraded(self) -> bool:
+        return self._shedding and self._config.policy == "degrade"
+
+    @property
+    def bypassed_cameras(self) -> frozenset[int]:
+        if self._shedding and self._config.policy == "bypass_cameras":
+            return frozenset(self._config.non_critical_cameras)
+        return frozenset()
+
+    def observe_pass(self, elapsed_ms: float) -> None:
+        """Record the preprocessing and inference time of one forward pass."""
+        if self._pass_ms <= 0.0:
+            self._pass_ms = elapsed_ms
+        else:
+            self._pass_ms += EWMA_ALPHA * (elapsed_ms - self._pass_ms)
+
+    def admit(self, pending: int, budget_ms: float | None) -> str:
+        """Return ``"accept"``, ``"drop_newest"`` or ``"drop_oldest"`` for a new trigger.
+
+        ``pending`` is the number of triggers already waiting for a verdict.
+        """
+        self._limit = self._adaptive_limit(budget_ms)
+        if pending < self._limit:
+            return "accept"
+        return "drop_oldest" if self._config.policy == "drop_oldest" else "drop_newest"
+
+    def _adaptive_limit(self, budget_ms: float | None) -> int:
+        if not self._config.adaptive or budget_ms is None or self._pass_ms <= 0.0:
+            return self._max_pending
+        passes = max(1, math.floor(budget_ms / self._pass_ms))
+        return max(self._min_pending, min(self._max_pending, passes * self._max_triggers))
+
+    def update(self, pending: int) -> bool:
+        """Enter or leave the degraded level for ``pending`` triggers; True when it changed."""
+        if self._config.policy not in ("degrade", "bypass_cameras"):
+            return False
+        if not self._shedding and pending >= max(1, math.ceil(self._limit * self._config.degrade_at)):
+            self._shedding = True
+            return True
+        if self._shedding and pending <= math.floor(self._limit * self._config.recover_at):
+            self._shedding = False
+            return True
+        return False
@@ -28,9 +28,9 @@ def setup_logging(level: int = logging.INFO,
     root.addHandler(file_handler)
 
 
-def jlog(event: str, **kw):
+def jlog(event: str, level: int = logging.INFO, **kw):
     """JSON structured log entry."""
-    _LOG.info(json.dumps({"event": event, **kw}, ensure_ascii=False))
+    _LOG.log(level, json.dumps({"event": event, **kw}, ensure_ascii=False))
 
 
 @contextmanager
@@ -64,6 +64,8 @@ class PcRegister(IntEnum):
     PROCESSED_COUNT_LO = 145
     PROCESSED_COUNT_HI = 146
     COMMAND_ACK_SEQ = 147
+    DEGRADED_TRIGGER_COUNT = 148
+    LAST_SHED_REASON = 149
 
 
 class PlcControlBits(IntFlag):
@@ -121,6 +123,15 @@ class ResultCode(IntEnum):
     TRIGGER_SYNCHRONIZATION_ERROR = 8
 
 
+class ShedReason(IntEnum):
+    NONE = 0
+    DROPPED_NEWEST = 1
+    DROPPED_OLDEST = 2
+    DEADLINE_EXPIRED = 3
+    DEGRADED = 4
+    CAMERAS_BYPASSED = 5
+
+
 class VisionErrorCode(IntEnum):
     NONE = 0
     MODBUS_CONNECTION_UNAVAILABLE = 100
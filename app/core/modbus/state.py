@@ -16,6 +16,7 @@ from .register_map import (
     PLC_TO_PC_START,
     PcStatusBits,
     ResultCode,
+    ShedReason,
     VisionErrorCode,
     VisionWarningCode,
 )
@@ -123,6 +124,7 @@ class ModbusSharedState:
         self._active_recipe_revision = 0
         self._recipe_ack_sequence = 0
         self._recipe_loaded = False
+        self._recipe_changing = False
         self._inspection_ready = False
         self._inspection_busy = False
         self._pc_heartbeat = 0
@@ -132,6 +134,9 @@ class ModbusSharedState:
         self._dropped_trigger_count = 0
         self._missing_frame_count = 0
         self._processed_count = 0
+        self._degraded_trigger_count = 0
+        self._shed_counts = {reason: 0 for reason in ShedReason if reason is not ShedReason.NONE}
+        self._last_shed_reason = ShedReason.NONE
         self._current_result: InspectionResult | None = None
         self._queued_results: deque[InspectionResult] = deque()
         self._result_published = False
@@ -189,6 +194,7 @@ class ModbusSharedState:
             self._active_recipe_revision = revision & 0xFFFF
             self._recipe_ack_sequence = request_sequence & 0xFFFFFFFF
             self._recipe_loaded = True
+            self._recipe_changing = False
             self._error_code = VisionErrorCode.NONE
 
     def active_recipe(self) -> tuple[int, int]:
@@ -196,9 +202,20 @@ class ModbusSharedState:
             return self._active_recipe_id, self._active_recipe_revision
 
     def begin_recipe_change(self) -> None:
+        """Clear the requested-recipe flag; the active recipe keeps inspecting until the swap."""
         with self._lock:
+            if self._recipe_loaded:
+                self._recipe_changing = True
             self._recipe_loaded = False
-            self._inspection_ready = False
+
+    def abort_recipe_change(self) -> None:
+        with self._lock:
+            self._recipe_changing = False
+
+    def recipe_serving(self) -> bool:
+        """True while a loaded recipe inspects, including during a changeover away from it."""
+        with self._lock:
+            return self._recipe_loaded or self._recipe_changing
 
     def set_inspection_ready(self, ready: bool) -> None:
         with self._lock:
@@ -234,6 +251,9 @@ class ModbusSharedState:
             self._dropped_trigger_count = 0
             self._missing_frame_count = 0
             self._processed_count = 0
+            self._degraded_trigger_count = 0
+            self._shed_counts = dict.fromkeys(self._shed_counts, 0)
+            self._last_shed_reason = ShedReason.NONE
 
     def acknowledge_command(self, command_sequence: int) -> None:
         with self._lock:
@@ -247,6 +267,20 @@ class ModbusSharedState:
         with self._lock:
             self._missing_frame_count = (self._missing_frame_count + 1) & 0xFFFFFFFF
 
+    def record_shed(self, reason: ShedReason) -> None:
+        """Count a trigger shed under overload: dropped without a verdict or inspected degraded."""
+        with self._lock:
+            self._shed_counts[reason] += 1
+            self._last_shed_reason = reason
+            if reason in (ShedReason.DEGRADED, ShedReason.CAMERAS_BYPASSED):
+                self._degraded_trigger_count = (self._degraded_trigger_count + 1) & 0xFFFF
+            else:
+                self._dropped_trigger_count = (self._dropped_trigger_count + 1) & 0xFFFFFFFF
+
+    def shed_counts(self) -> dict[ShedReason, int]:
+        with self._lock:
+            return dict(self._shed_counts)
+
     def increment_processed_count(self) -> None:
         with self._lock:
             self._processed_count = (self._processed_count + 1) & 0xFFFFFFFF
@@ -368,6 +402,8 @@ class ModbusSharedState:
             registers[23], registers[24] = missing_lo, missing_hi
             registers[25], registers[26] = processed_lo, processed_hi
             registers[27] = self._command_ack_sequence
+            registers[28] = self._degraded_trigger_count
+            registers[29] = int(self._last_shed_reason)
             return PcSnapshot(
                 registers=tuple(registers),
                 status_word=int(status),
@@ -0,0 +1,123 @@
+"""Process-wide LRU cache of loaded inference backends for fast recipe changeovers."""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import astuple, dataclass
+import os
+import threading
+from typing import TYPE_CHECKING, Callable
+
+from app.core.logger import jlog
+
+if TYPE_CHECKING:
+    from app.core.infer_worker import InferenceBackend, ModelConfig
+
+
+@dataclass(frozen=True, slots=True)
+class ModelCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes: int = 0
+    budget_bytes: int = 0
+
+
+class ModelCache:
+    """Share loaded backends between cameras and recipes under a memory budget.
+
+    The budget bounds the backends' ``memory_bytes``: host RAM for CPU and
+    ONNX/OpenVINO models, device memory for torch models on CUDA.
+
+    Entries are keyed by the resolved checkpoint path, its modification time and
+    size, the loader type, the requested device, and the remaining model options,
+    so an edited checkpoint is reloaded.  Mock fallbacks are never cached, which
+    keeps a failed load retryable.
+    """
+
+    def __init__(self, budget_mb: float = 4096.0):
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, tuple[InferenceBackend, int]] = OrderedDict()
+        self._budget_bytes = int(budget_mb * 1024 * 1024)
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def set_budget(self, budget_mb: float) -> None:
+        with self._lock:
+            self._budget_bytes = int(budget_mb * 1024 * 1024)
+            self._evict()
+
+    @staticmethod
+    def key(cfg: ModelConfig, device: str) -> tuple | None:
+        try:
+            path = os.path.realpath(cfg.path)
+            stat = os.stat(path)
+        except (OSError, TypeError, ValueError):
+            return None
+        options = astuple(cfg)[2:]
+        return (os.path.normcase(path), stat.st_mtime_ns, stat.st_size, (cfg.type or "auto").lower(), device, options)
+
+    def get(
+        self,
+        cfg: ModelConfig,
+        device: str,
+        load: Callable[[ModelConfig, str], InferenceBackend],
+    ) -> InferenceBackend:
+        """Return a cached backend for ``cfg`` or load, cache, and return a new one."""
+        key = None if (cfg.type or "").lower() == "mock" else self.key(cfg, device)
+        if key is not None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    jlog("model_cache_hit", path=cfg.path, hits=self._hits)
+                    return entry[0]
+                self._misses += 1
+        backend = load(cfg, device)
+        if key is None or backend._mode == "mock":
+            return backend
+        size = backend.memory_bytes
+        with self._lock:
+            # Another thread may have loaded the same model meanwhile; keep one copy.
+            existing = self._entries.get(key)
+            if existing is not None:
+                self._entries.move_to_end(key)
+                return existing[0]
+            self._entries[key] = (backend, size)
+            self._bytes += size
+            self._evict(keep=key)
+        jlog("model_cache_miss", path=cfg.path, misses=self._misses, mb=round(size / 1048576, 1))
+        return backend
+
+    def _evict(self, keep: tuple | None = None) -> None:
+        while self._bytes > self._budget_bytes and self._entries:
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            _backend, size = self._entries.pop(key)
+            self._bytes -= size
+            self._evictions += 1
+            jlog("model_cache_evict", path=key[0], evictions=self._evictions, mb=round(size / 1048576, 1))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> ModelCacheStats:
+        with self._lock:
+            return ModelCacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                budget_bytes=self._budget_bytes,
+            )
+
+
+MODEL_CACHE = ModelCache()
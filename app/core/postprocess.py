@@ -8,3 +8,37 @@ def fuse_scores(per_cam_scores: list[float]) -> float:
 
 def decide(ok_threshold: float, score: float) -> bool:
     return score < ok_threshold  # True = OK
+
+
+NG_RATE_DECAY = 0.99  # weight of history per trigger in the per-camera NG rate
+
+
+class NgRateOrder:
+    """Order cameras by their recent NG rate, most frequent first.
+
+    With max fusion one NG camera decides the trigger, so scoring likely-NG
+    cameras first reaches a certain NG soonest.  Rates are exponentially
+    decayed so the order follows the current product; ties keep camera order.
+    """
+
+    def __init__(self, decay: float = NG_RATE_DECAY):
+        self._decay = decay
+        self._rates: dict[int, float] = {}
+
+    def order(self, cam_ids) -> list[int]:
+        return sorted(cam_ids, key=lambda cam_id: -self._rates.get(cam_id, 0.0))
+
+    def record(
+        self,
+        by_camera: dict[int, float],
+        ok_threshold: float,
+        camera_thresholds: dict[int, float] | None = None,
+    ) -> None:
+        thresholds = camera_thresholds or {}
+        for cam_id, score in by_camera.items():
+            rate = self._rates.get(cam_id, 0.0)
+            ng = score >= thresholds.get(cam_id, ok_threshold)
+            self._rates[cam_id] = rate * self._decay + (1.0 - self._decay) * ng
+
+    def rates(self) -> dict[int, float]:
+        return dict(self._rates)
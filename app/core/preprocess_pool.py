@@ -0,0 +1,56 @@
+"""Thread pool preprocessing the cameras of a trigger in parallel.
+
+OpenCV resizing and remapping and NumPy's vector operations release the GIL,
+so cameras converted on separate threads overlap instead of queueing behind
+each other.  The pool shares the cores with OpenCV's own worker threads and
+torch's intra-op threads, so starting it also sets both: OpenCV to
+``opencv_threads`` per call and torch to the cores the pool leaves free,
+unless ``torch_threads`` is set.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import os
+from typing import Any
+
+import cv2
+import torch
+
+from app.core.logger import jlog
+
+
+@dataclass(frozen=True, slots=True)
+class PreprocessPoolConfig:
+    """``preprocess`` section of ``configs/inference.yaml``."""
+
+    workers: int = 0          # threads converting one trigger's cameras in parallel; 0: serial
+    opencv_threads: int = 1   # OpenCV threads per call while the pool runs; 0: OpenCV default
+    torch_threads: int = 0    # torch intra-op threads; 0: cores not used by the pool
+
+    @classmethod
+    def from_mapping(cls, raw: dict[str, Any] | None) -> "PreprocessPoolConfig":
+        raw = raw or {}
+        defaults = cls()
+        return cls(
+            workers=max(0, int(raw.get("workers", defaults.workers))),
+            opencv_threads=max(0, int(raw.get("opencv_threads", defaults.opencv_threads))),
+            torch_threads=max(0, int(raw.get("torch_threads", defaults.torch_threads))),
+        )
+
+
+def start_preprocess_pool(config: PreprocessPoolConfig) -> ThreadPoolExecutor | None:
+    """Create the pool and set the OpenCV and torch thread counts; None when preprocessing stays serial."""
+    if config.workers <= 0:
+        return None
+    if config.opencv_threads > 0:
+        cv2.setNumThreads(config.opencv_threads)
+    torch.set_num_threads(config.torch_threads or max(1, (os.cpu_count() or 1) - config.workers))
+    jlog(
+        "preprocess_pool",
+        workers=config.workers,
+        opencv_threads=cv2.getNumThreads(),
+        torch_threads=torch.get_num_threads(),
+    )
+    return ThreadPoolExecutor(max_workers=config.workers, thread_name_prefix="preprocess")
@@ -2,9 +2,44 @@
 
 from __future__ import annotations
 
+from concurrent.futures import Executor
+from functools import lru_cache
+import threading
+import time
+import weakref
+
 import cv2
 import numpy as np
 
+RAW_DTYPES = {"uint8": np.uint8, "float16": np.float16}  # raw_input model settings and their row dtypes
+
+
+@lru_cache(maxsize=8)
+def normalization_lut(
+    mean: tuple[float, float, float] = (0.485, 0.456, 0.406),
+    std: tuple[float, float, float] = (0.229, 0.224, 0.225),
+) -> np.ndarray:
+    """Per-channel 3x256 table mapping a uint8 value to its normalized float32 input value.
+
+    Computed with the same float32 operations as the direct conversion, so a
+    table lookup gives bit-identical values.
+    """
+    values = np.arange(256, dtype=np.float32)[:, np.newaxis] / 255.0
+    lut = (values - np.asarray(mean, dtype=np.float32)) / np.asarray(std, dtype=np.float32)
+    lut = np.ascontiguousarray(lut.T)
+    lut.setflags(write=False)
+    return lut
+
+
+def crop_roi(img: np.ndarray, roi: tuple[int, int, int, int] | None) -> np.ndarray:
+    """Return the ``[x, y, width, height]`` region of ``img``, or ``img`` without a ROI."""
+    if roi is None:
+        return img
+    x, y, width, height = roi
+    if x + width > img.shape[1] or y + height > img.shape[0]:
+        raise ValueError(f"ROI {roi} is outside image shape {img.shape[:2]}")
+    return img[y:y + height, x:x + width]
+
 
 def to_chw_tensor(
     img: np.ndarray,
@@ -12,29 +47,336 @@ def to_chw_tensor(
     mean: tuple[float, float, float] = (0.485, 0.456, 0.406),
     std: tuple[float, float, float] = (0.229, 0.224, 0.225),
     roi: tuple[int, int, int, int] | None = None,
+    out: np.ndarray | None = None,
 ) -> np.ndarray:
-    """Convert a camera image to a contiguous, normalized CHW float32 tensor."""
-    if roi is not None:
-        x, y, width, height = roi
-        if x + width > img.shape[1] or y + height > img.shape[0]:
-            raise ValueError(f"ROI {roi} is outside image shape {img.shape[:2]}")
-        img = img[y:y + height, x:x + width]
+    """Convert a camera image to a contiguous, normalized CHW float32 tensor.
+
+    Mono8 frames are resized once as a single channel and uint8 frames are
+    normalized through ``normalization_lut`` straight into the output, so no
+    full-size float intermediates are allocated.  Mono8 is replicated into the
+    three model channels.  ``out`` is an optional 3xHxW float32 array to write
+    into, such as a slot of a pooled batch.
+    """
+    img = crop_roi(img, roi)
+    if img.dtype == np.uint8:
+        resized = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        lut = normalization_lut(tuple(mean), tuple(std))
+        if out is None:
+            out = np.empty((3, size[1], size[0]), dtype=np.float32)
+        for channel in range(3):
+            plane = resized if resized.ndim == 2 else resized[..., channel]
+            np.take(lut[channel], plane, out=out[channel])
+        return out
     if img.ndim == 2:
         img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
 
     img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
     img = img.astype(np.float32, copy=False) / 255.0
     img = (img - np.asarray(mean, dtype=np.float32)) / np.asarray(std, dtype=np.float32)
+    if out is not None:
+        out[...] = np.moveaxis(img, -1, 0)
+        return out
     return np.ascontiguousarray(np.moveaxis(img, -1, 0))
 
 
+def to_raw_tensor(
+    img: np.ndarray,
+    size: tuple[int, int] = (280, 280),
+    roi: tuple[int, int, int, int] | None = None,
+    dtype: str = "uint8",
+    gain: np.ndarray | None = None,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """Crop and resize a Mono8 image to a 1xHxW ``uint8`` or ``float16`` row for raw-input models.
+
+    Such models replicate and normalize the channel in their graph (see
+    ``app.core.raw_input``), so the row keeps the sensor's gray levels.  An
+    input-size ``gain`` map applies flat-field correction, rounded back to
+    gray levels for ``uint8`` rows.
+    """
+    if dtype not in RAW_DTYPES:
+        raise ValueError(f"raw_input must be one of {', '.join(RAW_DTYPES)}, not {dtype!r}")
+    if img.ndim != 2:
+        raise ValueError(f"Raw model input needs single-channel frames, got shape {img.shape}")
+    resized = cv2.resize(crop_roi(img, roi), size, interpolation=cv2.INTER_AREA)
+    if out is None:
+        out = np.empty((1, size[1], size[0]), dtype=RAW_DTYPES[dtype])
+    if gain is None:
+        out[0] = resized
+        return out
+    corrected = resized * gain
+    if out.dtype == np.uint8:
+        np.clip(np.rint(corrected, out=corrected), 0, 255, out=corrected)
+    out[0] = corrected
+    return out
+
+
+class CameraTransform:
+    """Compiled crop, optional undistortion, resize and optional shading correction of one camera.
+
+    With ``maps`` the ROI is read through precomputed remap tables of the
+    undistorted image instead of cropped.  A ``gain`` map at input size folds
+    flat-field correction into normalization: every pixel becomes
+    ``value * scale + offset`` with ``scale = gain / (255 * std)``, one
+    multiply-add in place of the lookup it replaces.  With ``raw_input`` the
+    camera's model normalizes in its graph and rows are ``to_raw_tensor``
+    output instead.
+    """
+
+    def __init__(
+        self,
+        size: tuple[int, int],
+        roi: tuple[int, int, int, int] | None = None,
+        maps: tuple[np.ndarray, np.ndarray] | None = None,
+        gain: np.ndarray | None = None,
+        image_shape: tuple[int, int] | None = None,
+        mean: tuple[float, float, float] = (0.485, 0.456, 0.406),
+        std: tuple[float, float, float] = (0.229, 0.224, 0.225),
+        raw_input: str = "",
+    ):
+        if raw_input and raw_input not in RAW_DTYPES:
+            raise ValueError(f"raw_input must be one of {', '.join(RAW_DTYPES)}, not {raw_input!r}")
+        self.size = (int(size[0]), int(size[1]))
+        self.roi = roi
+        self.raw_input = raw_input
+        self._maps = maps
+        self._gain = None if gain is None else np.ascontiguousarray(gain, dtype=np.float32)
+        self._image_shape = image_shape  # (height, width) the maps and gain were computed for
+        self._mean, self._std = tuple(mean), tuple(std)
+        self._scale: np.ndarray | None = None
+        self._offset: np.ndarray | None = None
+        if gain is not None:
+            self._scale = self._gain_scale(gain)
+            self._offset = -np.asarray(mean, dtype=np.float32) / np.asarray(std, dtype=np.float32)
+
+    def apply(self, img: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        region = self.region(img)
+        if self.raw_input:
+            return to_raw_tensor(region, self.size, None, self.raw_input, self._gain, out)
+        if self._scale is None:
+            return to_chw_tensor(region, self.size, self._mean, self._std, out=out)
+        return self._normalize(cv2.resize(region, self.size, interpolation=cv2.INTER_AREA), self._scale, out)
+
+    def region(self, img: np.ndarray) -> np.ndarray:
+        """The inspected area of ``img`` at full resolution: the ROI, undistorted where calibrated."""
+        if self._image_shape is not None and img.shape[:2] != self._image_shape:
+            raise ValueError(f"Image shape {img.shape[:2]} does not match the calibrated shape {self._image_shape}")
+        if self._maps is not None:
+            return cv2.remap(img, self._maps[0], self._maps[1], cv2.INTER_LINEAR)
+        return crop_roi(img, self.roi)
+
+    def region_size(self, image_shape: tuple[int, ...]) -> tuple[int, int]:
+        """(width, height) of ``region`` for frames of ``image_shape``."""
+        if self._maps is not None:
+            height, width = self._maps[0].shape[:2]
+            return width, height
+        if self.roi is not None:
+            return self.roi[2], self.roi[3]
+        return image_shape[1], image_shape[0]
+
+    def tiles(self, img: np.ndarray, tiles: list[tuple[int, int, int, int]]) -> np.ndarray:
+        """Prepare ``region``-relative (x, y, w, h) tiles of ``img`` at input size as one batch.
+
+        Tiles get the same undistortion and shading correction as whole frames;
+        the smooth gain map is upsampled to region resolution and cut like the tiles.
+        """
+        region = self.region(img)
+        gain = None
+        if self._gain is not None:
+            gain = cv2.resize(self._gain, (region.shape[1], region.shape[0]), interpolation=cv2.INTER_LINEAR)
+        rows = []
+        for x, y, width, height in tiles:
+            tile = region[y:y + height, x:x + width]
+            tile_gain = None
+            if gain is not None:
+                tile_gain = cv2.resize(gain[y:y + height, x:x + width], self.size, interpolation=cv2.INTER_AREA)
+            if self.raw_input:
+                rows.append(to_raw_tensor(tile, self.size, None, self.raw_input, tile_gain))
+            elif tile_gain is None:
+                rows.append(to_chw_tensor(tile, self.size, self._mean, self._std))
+            else:
+                resized = cv2.resize(tile, self.size, interpolation=cv2.INTER_AREA)
+                rows.append(self._normalize(resized, self._gain_scale(tile_gain)))
+        return np.stack(rows)
+
+    def _gain_scale(self, gain: np.ndarray) -> np.ndarray:
+        std32 = np.asarray(self._std, dtype=np.float32)
+        return np.ascontiguousarray(
+            gain.astype(np.float32)[np.newaxis] / (255.0 * std32[:, np.newaxis, np.newaxis]), dtype=np.float32
+        )
+
+    def _normalize(self, resized: np.ndarray, scale: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        if out is None:
+            out = np.empty((3, self.size[1], self.size[0]), dtype=np.float32)
+        for channel in range(3):
+            plane = resized if resized.ndim == 2 else resized[..., channel]
+            np.multiply(plane, scale[channel], out=out[channel])
+            out[channel] += self._offset[channel]
+        return out
+
+
+class TransformPlan:
+    """Per-camera ``CameraTransform`` of one recipe; other cameras are resized whole to ``size``."""
+
+    def __init__(
+        self,
+        size: tuple[int, int],
+        cameras: dict[int, CameraTransform] | None = None,
+        mean: tuple[float, float, float] = (0.485, 0.456, 0.406),
+        std: tuple[float, float, float] = (0.229, 0.224, 0.225),
+    ):
+        self._default = CameraTransform(size, mean=mean, std=std)
+        self._cameras = dict(cameras or {})
+
+    @classmethod
+    def plain(
+        cls,
+        size: tuple[int, int],
+        camera_rois: dict[int, tuple[int, int, int, int]] | None = None,
+        camera_sizes: dict[int, tuple[int, int]] | None = None,
+        mean: tuple[float, float, float] = (0.485, 0.456, 0.406),
+        std: tuple[float, float, float] = (0.229, 0.224, 0.225),
+        camera_raw_inputs: dict[int, str] | None = None,
+    ) -> "TransformPlan":
+        """Plan that only crops and resizes; ``camera_raw_inputs`` names the raw-input cameras' row dtype."""
+        rois, sizes, raw_inputs = camera_rois or {}, camera_sizes or {}, camera_raw_inputs or {}
+        cameras = {
+            cam_id: CameraTransform(
+                sizes.get(cam_id, size), rois.get(cam_id), mean=mean, std=std, raw_input=raw_inputs.get(cam_id, "")
+            )
+            for cam_id in set(rois) | set(sizes) | set(raw_inputs)
+        }
+        return cls(size, cameras, mean, std)
+
+    def camera(self, cam_id: int) -> CameraTransform:
+        return self._cameras.get(cam_id, self._default)
+
+    def size(self, cam_id: int) -> tuple[int, int]:
+        return self.camera(cam_id).size
+
+    def apply(self, cam_id: int, img: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        return self.camera(cam_id).apply(img, out)
+
+
+class MixedBatch:
+    """Prepared rows of different input sizes or layouts, indexed like a BxCxHxW batch.
+
+    An integer selects one CHW row.  A slice or list of rows is stacked into an
+    array when the selected rows share one shape and dtype, as the rows of one
+    camera group always do, and otherwise stays a ``MixedBatch``.
+    """
+
+    def __init__(self, rows: list[np.ndarray]):
+        self._rows = rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self._rows[index]
+        rows = self._rows[index] if isinstance(index, slice) else [self._rows[row] for row in index]
+        if len({(row.shape, row.dtype) for row in rows}) > 1:
+            return MixedBatch(rows)
+        return np.stack(rows)
+
+
+class BatchBufferPool:
+    """Reusable BxCxHxW float32 batch buffers for the active recipe's input size.
+
+    ``acquire`` lends the first rows of a buffer sized for ``rows`` frames;
+    ``release`` returns it once the backend no longer reads it.  Buffers of
+    another size, including those lent before ``configure`` changed the size,
+    are dropped instead of pooled.  Safe to use from several threads.
+    """
+
+    def __init__(self, size: tuple[int, int] = (280, 280), rows: int = 1, max_free: int = 4):
+        self._lock = threading.Lock()
+        self._max_free = max(1, max_free)
+        self._owned: weakref.WeakValueDictionary[int, np.ndarray] = weakref.WeakValueDictionary()
+        self.configure(size, rows)
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self._size
+
+    def configure(self, size: tuple[int, int], rows: int | None = None) -> None:
+        """Size buffers for ``size`` inputs and up to ``rows`` frames per batch."""
+        with self._lock:
+            self._size = (int(size[0]), int(size[1]))
+            if rows is not None:
+                self._rows = max(1, rows)
+            self._free: list[np.ndarray] = []
+
+    def acquire(self, rows: int) -> np.ndarray:
+        with self._lock:
+            shape = (3, self._size[1], self._size[0])
+            while self._free:
+                buffer = self._free.pop()
+                if len(buffer) >= rows and buffer.shape[1:] == shape:
+                    return buffer[:rows]
+            self._rows = max(self._rows, rows)
+            buffer = np.empty((self._rows, *shape), dtype=np.float32)
+            self._owned[id(buffer)] = buffer
+            return buffer[:rows]
+
+    def release(self, batch: np.ndarray | MixedBatch | None) -> None:
+        buffer = batch.base if isinstance(batch, np.ndarray) and isinstance(batch.base, np.ndarray) else batch
+        with self._lock:
+            if buffer is None or self._owned.get(id(buffer)) is not buffer:
+                return
+            current = len(buffer) == self._rows and buffer.shape[1:] == (3, self._size[1], self._size[0])
+            if current and len(self._free) < self._max_free and all(free is not buffer for free in self._free):
+                self._free.append(buffer)
+
+
 def preprocess_batch(
     frames: list,
     size: tuple[int, int] = (280, 280),
     mean: tuple[float, float, float] = (0.485, 0.456, 0.406),
     std: tuple[float, float, float] = (0.229, 0.224, 0.225),
     camera_rois: dict[int, tuple[int, int, int, int]] | None = None,
-) -> np.ndarray:
-    """Preprocess all synchronized frames once into a BxCxHxW float32 batch."""
-    rois = camera_rois or {}
-    return np.stack([to_chw_tensor(frame.image, size, mean, std, rois.get(frame.cam_id)) for frame in frames])
\ No newline at end of file
+    camera_sizes: dict[int, tuple[int, int]] | None = None,
+    pool: BatchBufferPool | None = None,
+    plan: TransformPlan | None = None,
+    executor: Executor | None = None,
+    timings: dict[int, float] | None = None,
+) -> np.ndarray | MixedBatch:
+    """Preprocess all synchronized frames once into a BxCxHxW float32 batch.
+
+    ``camera_sizes`` overrides ``size`` per camera; when the sizes differ, or
+    the plan gives some cameras raw 1xHxW rows, the rows are returned as a
+    ``MixedBatch``.  A compiled ``plan`` replaces
+    ``size``, ``mean``, ``std``, ``camera_rois`` and ``camera_sizes``.  With a
+    ``pool`` of the batch's input size every frame is written straight into
+    its row of a pooled buffer, which the caller returns with ``pool.release``.
+    With an ``executor`` the frames are converted in parallel.  ``timings``
+    receives each camera's conversion time in milliseconds.
+    """
+    if plan is None:
+        plan = TransformPlan.plain(size, camera_rois, camera_sizes, mean, std)
+    batch = None
+    if pool is not None and frames and all(
+        plan.size(frame.cam_id) == pool.size and not plan.camera(frame.cam_id).raw_input for frame in frames
+    ):
+        batch = pool.acquire(len(frames))
+
+    def convert(index: int) -> tuple[np.ndarray, float]:
+        start = time.perf_counter()
+        frame = frames[index]
+        row = plan.apply(frame.cam_id, frame.image, out=None if batch is None else batch[index])
+        return row, (time.perf_counter() - start) * 1000.0
+
+    if executor is not None and len(frames) > 1:
+        converted = list(executor.map(convert, range(len(frames))))
+    else:
+        converted = [convert(index) for index in range(len(frames))]
+    if timings is not None:
+        for frame, (_row, elapsed_ms) in zip(frames, converted):
+            timings[frame.cam_id] = timings.get(frame.cam_id, 0.0) + elapsed_ms
+    if batch is not None:
+        return batch
+    rows = [row for row, _elapsed_ms in converted]
+    if len({(row.shape, row.dtype) for row in rows}) > 1:
+        return MixedBatch(rows)
+    return np.stack(rows)
\ No newline at end of file
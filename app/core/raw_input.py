@@ -0,0 +1,163 @@
+"""Models that take raw Mono8 frames and normalize inside their graph.
+
+A raw-input camera is fed 1xHxW ``uint8`` (or ``float16``) rows straight from
+crop and resize instead of three ImageNet-normalized float32 channels, a
+twelfth (or a sixth) of the bytes per frame.  Channel replication and
+normalization move into the model: on the inference device at load time
+(``NormalizeInput``), or at export time folded into the weights of the first
+convolution (``fold_input_normalization``), which leaves the exported graph
+with only a cast in front.
+"""
+
+from __future__ import annotations
+
+import copy
+from typing import Any
+
+import torch
+
+RAW_TORCH_DTYPES = {"uint8": torch.uint8, "float16": torch.float16}
+FOLD_RTOL = 1e-4
+FOLD_ATOL = 1e-4
+
+
+class NormalizeInput(torch.nn.Module):
+    """Replicate a Bx1xHxW raw frame into three normalized channels as one multiply-add."""
+
+    def __init__(
+        self,
+        mean: tuple[float, float, float] = (0.485, 0.456, 0.406),
+        std: tuple[float, float, float] = (0.229, 0.224, 0.225),
+    ):
+        super().__init__()
+        std_t = torch.tensor(std, dtype=torch.float32).reshape(1, 3, 1, 1)
+        self.register_buffer("scale", 1.0 / (255.0 * std_t))
+        self.register_buffer("offset", -torch.tensor(mean, dtype=torch.float32).reshape(1, 3, 1, 1) / std_t)
+
+    def forward(self, image: torch.Tensor) -> torch.Tensor:
+        return image.float() * self.scale + self.offset
+
+
+class ToFloat(torch.nn.Module):
+    """Cast raw frames for a model whose first convolution has normalization folded in."""
+
+    def forward(self, image: torch.Tensor) -> torch.Tensor:
+        return image.float()
+
+
+class RawInputModel(torch.nn.Module):
+    """``model`` behind the step that turns raw frames into its input."""
+
+    def __init__(self, model: torch.nn.Module, prepare: torch.nn.Module):
+        super().__init__()
+        self.prepare = prepare
+        self.model = model
+
+    def forward(self, image: torch.Tensor) -> Any:
+        return self.model(self.prepare(image))
+
+
+def fold_input_normalization(
+    model: torch.nn.Module,
+    input_size: tuple[int, int],
+    mean: tuple[float, float, float] = (0.485, 0.456, 0.406),
+    std: tuple[float, float, float] = (0.229, 0.224, 0.225),
+) -> RawInputModel:
+    """Adapt ``model`` to Bx1xHxW raw input, folding normalization into its first convolution.
+
+    Folding is exact only when that convolution reads the input directly and
+    pads nothing, since zero padding of normalized input is not zero in raw
+    gray levels.  The folded copy is compared with ``NormalizeInput`` in front
+    of the unchanged model on random frames; when folding does not apply or
+    the outputs differ, the in-graph normalization is returned instead.
+    """
+    reference = RawInputModel(model, NormalizeInput(mean, std)).eval()
+    parameter = next(model.parameters(), None)
+    device = parameter.device if parameter is not None else torch.device("cpu")
+    reference.to(device)
+    try:
+        folded = RawInputModel(_fold_first_conv(model, input_size, mean, std, device), ToFloat()).eval()
+    except ValueError as exc:
+        print(f"[raw_input] normalization stays in the graph: {exc}")
+        return reference
+    probe = torch.randint(0, 256, (2, 1, input_size[1], input_size[0]), dtype=torch.uint8, device=device)
+    with torch.inference_mode():
+        expected, actual = _tensors(reference(probe)), _tensors(folded(probe))
+    if len(expected) != len(actual) or not all(
+        torch.allclose(value, other, rtol=FOLD_RTOL, atol=FOLD_ATOL) for value, other in zip(expected, actual)
+    ):
+        print("[raw_input] normalization stays in the graph: folded outputs differ")
+        return reference
+    return folded
+
+
+def _fold_first_conv(
+    model: torch.nn.Module,
+    input_size: tuple[int, int],
+    mean: tuple[float, float, float],
+    std: tuple[float, float, float],
+    device: torch.device,
+) -> torch.nn.Module:
+    """Return a copy of ``model`` whose first convolution takes one raw channel."""
+    adapted = copy.deepcopy(model).eval()
+    calls: list[tuple[torch.nn.Conv2d, torch.Tensor]] = []
+
+    def record(module: torch.nn.Module, inputs: tuple) -> None:
+        if not calls:
+            calls.append((module, inputs[0]))
+
+    handles = [
+        module.register_forward_pre_hook(record)
+        for module in adapted.modules()
+        if isinstance(module, torch.nn.Conv2d)
+    ]
+    probe = torch.zeros(1, 3, input_size[1], input_size[0], device=device)
+    try:
+        with torch.inference_mode():
+            adapted(probe)
+    finally:
+        for handle in handles:
+            handle.remove()
+    if not calls:
+        raise ValueError("model has no 2-D convolution")
+    conv, seen = calls[0]
+    if seen is not probe:
+        raise ValueError("the first convolution does not read the model input")
+    if conv.in_channels != 3 or conv.groups != 1:
+        raise ValueError("the first convolution is not a dense 3-channel convolution")
+    if conv.padding != "valid" and (isinstance(conv.padding, str) or any(conv.padding)):
+        raise ValueError("the first convolution pads its input")
+
+    weight = conv.weight.detach().float()
+    std_t = torch.tensor(std, dtype=torch.float32, device=weight.device).reshape(1, 3, 1, 1)
+    mean_t = torch.tensor(mean, dtype=torch.float32, device=weight.device).reshape(1, 3, 1, 1)
+    bias = conv.bias.detach().float() if conv.bias is not None else torch.zeros(conv.out_channels, device=weight.device)
+    folded = torch.nn.Conv2d(
+        1, conv.out_channels, conv.kernel_size, conv.stride, 0, conv.dilation, bias=True, device=weight.device
+    )
+    with torch.no_grad():
+        # x = raw / 255 replicated: conv(x_norm) = sum_c w_c * (raw / (255 std_c) - mean_c / std_c) + b
+        folded.weight.copy_((weight / (255.0 * std_t)).sum(dim=1, keepdim=True))
+        folded.bias.copy_(bias - (weight * (mean_t / std_t)).sum(dim=(1, 2, 3)))
+    folded.to(conv.weight.dtype).eval()
+
+    for name, module in adapted.named_modules():
+        if module is conv:
+            break
+    if not name:
+        return folded
+    parent_name, _, child = name.rpartition(".")
+    setattr(adapted.get_submodule(parent_name), child, folded)
+    return adapted
+
+
+def _tensors(output: Any) -> list[torch.Tensor]:
+    """The float tensors of a model output, in a stable order."""
+    if torch.is_tensor(output):
+        return [output.float()]
+    if isinstance(output, dict):
+        return [tensor for key in sorted(output) for tensor in _tensors(output[key])]
+    if isinstance(output, (list, tuple)):
+        return [tensor for value in output for tensor in _tensors(value)]
+    fields = getattr(output, "__dict__", None)
+    return _tensors(dict(fields)) if fields else []
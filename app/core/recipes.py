@@ -2,12 +2,17 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
 
 import yaml
 
+from app.core.cascade import CascadeConfig
+from app.core.corrections import CameraCorrection
+from app.core.similarity import METHODS, SimilarityConfig
+from app.core.tiling import TilingConfig
+
 
 class RecipeError(ValueError):
     """Base error for an invalid or unavailable requested recipe."""
@@ -30,6 +35,15 @@ class RecipeDefinition:
     thresholds_file: str
     camera_rois: dict[int, tuple[int, int, int, int]]
     product_parameters: dict[str, Any]
+    camera_corrections: dict[int, CameraCorrection] = field(default_factory=dict)
+
+
+def camera_index(key: str) -> int:
+    """Map a models-file or ``cameras`` key (``cam1`` or ``0``) to the zero-based camera ID.
+
+    Raises ``ValueError`` for any other key.
+    """
+    return int(key[3:]) - 1 if key.startswith("cam") else int(key)
 
 
 @dataclass(frozen=True, slots=True)
@@ -38,6 +52,21 @@ class RecipeRuntime:
     models: dict[str, dict[str, Any]]
     input_size: tuple[int, int]
     ok_threshold: float
+    cascade: CascadeConfig = CascadeConfig()
+    tiling: TilingConfig = TilingConfig()
+    similarity: SimilarityConfig = SimilarityConfig()
+    camera_input_sizes: dict[int, tuple[int, int]] = field(default_factory=dict)  # overrides of input_size
+    camera_thresholds: dict[int, float] = field(default_factory=dict)             # overrides of ok_threshold
+
+    def camera_input_size(self, cam_id: int) -> tuple[int, int]:
+        return self.camera_input_sizes.get(cam_id, self.input_size)
+
+    def camera_threshold(self, cam_id: int) -> float:
+        return self.camera_thresholds.get(cam_id, self.ok_threshold)
+
+    def camera_model(self, cam_id: int) -> dict[str, Any] | None:
+        """The models-file entry of ``cam_id``, or None if the recipe has none."""
+        return next((model for key, model in self.models.items() if camera_index(key) == cam_id), None)
 
 
 class RecipeRepository:
@@ -73,6 +102,7 @@ class RecipeRepository:
                 thresholds_file=str(value.get("thresholds_file", "configs/thresholds.yaml")),
                 camera_rois=rois,
                 product_parameters=dict(value.get("product_parameters", {})),
+                camera_corrections=cls._parse_corrections(value.get("camera_corrections"), name, root),
             )
         return cls(definitions, root)
 
@@ -92,6 +122,37 @@ class RecipeRepository:
             result[int(camera)] = (x, y, width, height)
         return result
 
+    @staticmethod
+    def _parse_corrections(raw: Any, recipe_name: str, root: Path) -> dict[int, CameraCorrection]:
+        if raw in (None, {}):
+            return {}
+        if not isinstance(raw, dict):
+            raise RecipeError(f"Recipe {recipe_name!r} camera_corrections must be a mapping")
+        result: dict[int, CameraCorrection] = {}
+        for camera, value in raw.items():
+            if not isinstance(value, dict):
+                raise RecipeError(f"Recipe {recipe_name!r} corrections for camera {camera!r} must be a mapping")
+            try:
+                undistort = value.get("undistort") or {}
+                matrix = undistort.get("camera_matrix")
+                if matrix is not None:
+                    matrix = tuple(tuple(float(entry) for entry in row) for row in matrix)
+                    if len(matrix) != 3 or any(len(row) != 3 for row in matrix):
+                        raise ValueError("camera_matrix must be 3x3")
+                size = value.get("image_size")
+                flat_field = str(value.get("flat_field", ""))
+                if flat_field and not Path(flat_field).is_absolute():
+                    flat_field = str(root / flat_field)
+                result[int(camera)] = CameraCorrection(
+                    camera_matrix=matrix,
+                    dist_coeffs=tuple(float(coefficient) for coefficient in undistort.get("dist_coeffs", ())),
+                    image_size=None if size is None else (int(size[0]), int(size[1])),
+                    flat_field=flat_field,
+                )
+            except (IndexError, TypeError, ValueError) as exc:
+                raise RecipeError(f"Recipe {recipe_name!r} corrections for camera {camera!r} are invalid: {exc}") from exc
+        return result
+
     def get(self, recipe_id: int, revision: int | None = None) -> RecipeDefinition:
         try:
             definition = self._definitions[recipe_id]
@@ -115,29 +176,161 @@ class RecipeRepository:
         models = models_raw.get("models")
         if not isinstance(models, dict) or not models:
             raise RecipeError(f"Recipe {definition.name!r} model configuration has no 'models' mapping")
-        input_size = thresholds_raw.get("input_size", [280, 280])
-        if not isinstance(input_size, (list, tuple)) or len(input_size) != 2 or min(input_size) <= 0:
-            raise RecipeError(f"Recipe {definition.name!r} has invalid input_size")
+        input_size = self._parse_input_size(thresholds_raw.get("input_size", [280, 280]), definition.name)
         try:
             threshold = float(thresholds_raw["ok_threshold"])
         except (KeyError, TypeError, ValueError) as exc:
             raise RecipeError(f"Recipe {definition.name!r} has invalid ok_threshold") from exc
+        camera_sizes, camera_thresholds = self._parse_camera_overrides(thresholds_raw.get("cameras"), definition.name)
+        cascade = self._parse_cascade(thresholds_raw.get("cascade"), definition.name)
+        tiling = self._parse_tiling(thresholds_raw.get("tiling"), definition.name)
+        similarity = self._parse_similarity(thresholds_raw.get("similarity_skip"), definition.name)
         normalized_models: dict[str, dict[str, Any]] = {}
         for key, value in models.items():
             if not isinstance(value, dict):
                 continue
+            try:
+                camera_index(str(key))
+            except ValueError as exc:
+                raise RecipeError(f"Recipe {definition.name!r} model key {key!r} must be 'cam<N>' or an index") from exc
             model = dict(value)
-            if model.get("path"):
+            # Remote model paths are resolved by the inference server against its own root.
+            if model.get("path") and str(model.get("type", "")).lower() != "remote":
                 path = Path(str(model["path"]))
                 model["path"] = str(path if path.is_absolute() else self._project_root / path)
             normalized_models[str(key)] = model
         return RecipeRuntime(
             definition=definition,
             models=normalized_models,
-            input_size=(int(input_size[0]), int(input_size[1])),
+            input_size=input_size,
             ok_threshold=threshold,
+            cascade=cascade,
+            tiling=tiling,
+            similarity=similarity,
+            camera_input_sizes=camera_sizes,
+            camera_thresholds=camera_thresholds,
         )
 
+    @staticmethod
+    def _parse_input_size(raw: Any, recipe_name: str, camera: str = "") -> tuple[int, int]:
+        if isinstance(raw, (list, tuple)) and len(raw) == 2:
+            try:
+                size = (int(raw[0]), int(raw[1]))
+            except (TypeError, ValueError):
+                size = (0, 0)
+            if min(size) > 0:
+                return size
+        where = f" for camera {camera!r}" if camera else ""
+        raise RecipeError(f"Recipe {recipe_name!r} has invalid input_size{where}")
+
+    @classmethod
+    def _parse_camera_overrides(
+        cls,
+        raw: Any,
+        recipe_name: str,
+    ) -> tuple[dict[int, tuple[int, int]], dict[int, float]]:
+        """Parse per-camera ``input_size`` and ``ok_threshold`` keyed like the models file (``cam1`` or ``0``)."""
+        if raw in (None, {}):
+            return {}, {}
+        if not isinstance(raw, dict):
+            raise RecipeError(f"Recipe {recipe_name!r} cameras must be a mapping")
+        sizes: dict[int, tuple[int, int]] = {}
+        thresholds: dict[int, float] = {}
+        for camera, value in raw.items():
+            key = str(camera)
+            try:
+                cam_id = camera_index(key)
+            except ValueError as exc:
+                raise RecipeError(f"Recipe {recipe_name!r} camera key {key!r} must be 'cam<N>' or an index") from exc
+            if cam_id < 0 or not isinstance(value, dict):
+                raise RecipeError(f"Recipe {recipe_name!r} settings for camera {key!r} are invalid")
+            if "input_size" in value:
+                sizes[cam_id] = cls._parse_input_size(value["input_size"], recipe_name, key)
+            if "ok_threshold" in value:
+                try:
+                    thresholds[cam_id] = float(value["ok_threshold"])
+                except (TypeError, ValueError) as exc:
+                    raise RecipeError(f"Recipe {recipe_name!r} has invalid ok_threshold for camera {key!r}") from exc
+        return sizes, thresholds
+
+    def _parse_cascade(self, raw: Any, recipe_name: str) -> CascadeConfig:
+        if raw is None:
+            return CascadeConfig()
+        if not isinstance(raw, dict):
+            raise RecipeError(f"Recipe {recipe_name!r} cascade must be a mapping")
+        defaults = CascadeConfig()
+        try:
+            gate_dir = Path(str(raw.get("gate_dir", defaults.gate_dir)))
+            clear_ok_below = float(raw.get("clear_ok_below", defaults.clear_ok_below))
+            cascade = CascadeConfig(
+                enabled=bool(raw.get("enabled", False)),
+                gate_dir=str(gate_dir if gate_dir.is_absolute() else self._project_root / gate_dir),
+                clear_ok_below=clear_ok_below,
+                audit_every=int(raw.get("audit_every", defaults.audit_every)),
+                degraded_clear_ok_below=float(
+                    raw.get("degraded_clear_ok_below", max(defaults.degraded_clear_ok_below, clear_ok_below))
+                ),
+            )
+        except (TypeError, ValueError) as exc:
+            raise RecipeError(f"Recipe {recipe_name!r} has an invalid cascade section: {exc}") from exc
+        if cascade.clear_ok_below <= 0 or cascade.audit_every < 0:
+            raise RecipeError(f"Recipe {recipe_name!r} cascade needs clear_ok_below > 0 and audit_every >= 0")
+        if cascade.degraded_clear_ok_below < cascade.clear_ok_below:
+            raise RecipeError(f"Recipe {recipe_name!r} cascade needs degraded_clear_ok_below >= clear_ok_below")
+        return cascade
+
+    @staticmethod
+    def _parse_tiling(raw: Any, recipe_name: str) -> TilingConfig:
+        if raw is None:
+            return TilingConfig()
+        if not isinstance(raw, dict):
+            raise RecipeError(f"Recipe {recipe_name!r} tiling must be a mapping")
+        defaults = TilingConfig()
+        try:
+            tiling = TilingConfig(
+                enabled=bool(raw.get("enabled", False)),
+                overlap=float(raw.get("overlap", defaults.overlap)),
+                select_above=float(raw.get("select_above", defaults.select_above)),
+                max_tiles=int(raw.get("max_tiles", defaults.max_tiles)),
+            )
+        except (TypeError, ValueError) as exc:
+            raise RecipeError(f"Recipe {recipe_name!r} has an invalid tiling section: {exc}") from exc
+        if not 0.0 <= tiling.overlap < 1.0 or tiling.max_tiles <= 0:
+            raise RecipeError(f"Recipe {recipe_name!r} tiling needs 0 <= overlap < 1 and max_tiles > 0")
+        return tiling
+
+    @staticmethod
+    def _parse_similarity(raw: Any, recipe_name: str) -> SimilarityConfig:
+        if raw is None:
+            return SimilarityConfig()
+        if not isinstance(raw, dict):
+            raise RecipeError(f"Recipe {recipe_name!r} similarity_skip must be a mapping")
+        defaults = SimilarityConfig()
+        try:
+            grid = raw.get("grid", defaults.grid)
+            similarity = SimilarityConfig(
+                enabled=bool(raw.get("enabled", False)),
+                method=str(raw.get("method", defaults.method)),
+                grid=(int(grid[0]), int(grid[1])),
+                max_diff=float(raw.get("max_diff", defaults.max_diff)),
+                max_hash_distance=int(raw.get("max_hash_distance", defaults.max_hash_distance)),
+                max_reuse=int(raw.get("max_reuse", defaults.max_reuse)),
+                cameras=tuple(int(cam_id) for cam_id in raw.get("cameras", ())),
+                max_line_speed_mm_s=float(raw.get("max_line_speed_mm_s", defaults.max_line_speed_mm_s)),
+            )
+        except (IndexError, TypeError, ValueError) as exc:
+            raise RecipeError(f"Recipe {recipe_name!r} has an invalid similarity_skip section: {exc}") from exc
+        if similarity.method not in METHODS:
+            raise RecipeError(f"Recipe {recipe_name!r} similarity_skip.method must be one of {', '.join(METHODS)}")
+        if (
+            min(similarity.grid) <= 0
+            or similarity.max_diff < 0
+            or similarity.max_hash_distance < 0
+            or similarity.max_line_speed_mm_s < 0
+        ):
+            raise RecipeError(f"Recipe {recipe_name!r} similarity_skip needs a positive grid and non-negative limits")
+        return similarity
+
     def _resolve(self, value: str) -> Path:
         path = Path(value)
         path = path if path.is_absolute() else self._project_root / path
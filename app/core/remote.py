@@ -0,0 +1,408 @@
+"""Network inference: binary framing, pooled pipelined client, and the model server.
+
+Every message is one frame: a fixed little-endian header followed by a payload.
+
+Request header  ``<4sBBIII``: magic ``AIRQ``, kind, flags, request ID,
+deadline budget in ms (0 = none), payload length.
+Response header ``<4sBII``: magic ``AIRS``, status, request ID, payload length.
+
+Tensors are encoded as dtype code, dimension count, dimensions and raw bytes.
+The deadline is a budget relative to the server receiving the request, so client
+and server clocks need not agree; requests still queued when it expires are
+answered with ``STATUS_DEADLINE`` without running the model.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import asdict, astuple
+import itertools
+import json
+from pathlib import Path
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Any, Callable, Sequence
+
+import numpy as np
+
+from app.core.logger import jlog
+
+REQUEST_HEADER = struct.Struct("<4sBBIII")
+RESPONSE_HEADER = struct.Struct("<4sBII")
+REQUEST_MAGIC = b"AIRQ"
+RESPONSE_MAGIC = b"AIRS"
+
+KIND_LOAD = 1
+KIND_PREDICT = 2
+KIND_WARMUP = 3
+
+FLAG_FULL = 1  # PREDICT: also return the anomaly map
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_DEADLINE = 2
+STATUS_UNKNOWN_MODEL = 3
+
+_DTYPES = {0: np.dtype("<f4"), 1: np.dtype("<f2"), 2: np.dtype("u1")}
+_DTYPE_CODES = {dtype: code for code, dtype in _DTYPES.items()}
+
+
+class RemoteError(RuntimeError):
+    """The inference server is unreachable, rejected a request, or missed its deadline."""
+
+
+def encode_tensor(array: np.ndarray) -> bytes:
+    array = np.ascontiguousarray(array)
+    code = _DTYPE_CODES[array.dtype.newbyteorder("<") if array.dtype.byteorder == ">" else array.dtype]
+    header = struct.pack(f"<BB{array.ndim}I", code, array.ndim, *array.shape)
+    return header + array.tobytes()
+
+
+def decode_tensor(buffer: memoryview, offset: int = 0) -> tuple[np.ndarray, int]:
+    """Return the tensor at ``offset`` (a view, no copy) and the offset after it."""
+    code, ndim = struct.unpack_from("<BB", buffer, offset)
+    shape = struct.unpack_from(f"<{ndim}I", buffer, offset + 2)
+    offset += 2 + 4 * ndim
+    dtype = _DTYPES[code]
+    count = int(np.prod(shape, dtype=np.int64))
+    array = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).reshape(shape)
+    return array, offset + count * dtype.itemsize
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytearray:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            raise ConnectionError("connection closed")
+        received += count
+    return buffer
+
+
+# --------------------------
+# Client
+# --------------------------
+class _Connection:
+    """One TCP connection with any number of requests in flight, matched by request ID."""
+
+    def __init__(self, address: tuple[str, int], timeout_s: float):
+        self._sock = socket.create_connection(address, timeout=timeout_s)
+        self._sock.settimeout(None)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._send_lock = threading.Lock()
+        self._pending: dict[int, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.alive = True
+        threading.Thread(target=self._read_loop, name=f"remote-{address[0]}:{address[1]}", daemon=True).start()
+
+    def request(self, kind: int, payload: bytes, deadline_ms: float = 0.0, flags: int = 0) -> Future:
+        future: Future = Future()
+        with self._pending_lock:
+            if not self.alive:
+                raise RemoteError("connection closed")
+            request_id = next(self._ids) & 0xFFFFFFFF
+            self._pending[request_id] = future
+        header = REQUEST_HEADER.pack(REQUEST_MAGIC, kind, flags, request_id, int(max(0.0, deadline_ms)), len(payload))
+        try:
+            with self._send_lock:
+                self._sock.sendall(header)
+                self._sock.sendall(payload)
+        except OSError as exc:
+            self._close(f"send failed: {exc}")
+        return future
+
+    def _read_loop(self) -> None:
+        try:
+            while True:
+                magic, status, request_id, length = RESPONSE_HEADER.unpack(_recv_exact(self._sock, RESPONSE_HEADER.size))
+                if magic != RESPONSE_MAGIC:
+                    raise ConnectionError("bad response frame")
+                payload = _recv_exact(self._sock, length)
+                with self._pending_lock:
+                    future = self._pending.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_result((status, payload))
+        except (OSError, ConnectionError, struct.error) as exc:
+            self._close(str(exc))
+
+    def _close(self, reason: str) -> None:
+        with self._pending_lock:
+            self.alive = False
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(RemoteError(f"connection lost: {reason}"))
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        self._close("closed")
+
+
+class ConnectionPool:
+    """Round-robin over ``size`` pipelined connections to one server, reconnecting dead ones."""
+
+    def __init__(self, address: tuple[str, int], size: int = 2, connect_timeout_s: float = 3.0):
+        self.address = address
+        self._size = max(1, size)
+        self._connect_timeout_s = connect_timeout_s
+        self._connections: list[_Connection | None] = [None] * self._size
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def connection(self) -> _Connection:
+        index = next(self._next) % self._size
+        with self._lock:
+            connection = self._connections[index]
+            if connection is None or not connection.alive:
+                try:
+                    connection = _Connection(self.address, self._connect_timeout_s)
+                except OSError as exc:
+                    raise RemoteError(f"cannot connect to {self.address[0]}:{self.address[1]}: {exc}") from exc
+                self._connections[index] = connection
+            return connection
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections:
+                if connection is not None:
+                    connection.close()
+            self._connections = [None] * self._size
+
+
+_POOLS: dict[tuple[str, int], ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def parse_address(server: str) -> tuple[str, int]:
+    host, _, port = server.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Inference server must be 'host:port', got {server!r}")
+    return host, int(port)
+
+
+def connection_pool(server: str, size: int = 2) -> ConnectionPool:
+    """Return the process-wide pool for ``server``, shared by every camera that uses it."""
+    address = parse_address(server)
+    with _POOLS_LOCK:
+        pool = _POOLS.get(address)
+        if pool is None:
+            pool = _POOLS[address] = ConnectionPool(address, size)
+        return pool
+
+
+class RemoteModel:
+    """Client for one model hosted by an inference server."""
+
+    def __init__(self, server: str, model: dict[str, Any], deadline_ms: float = 1000.0, connections: int = 2):
+        self._pool = connection_pool(server, connections)
+        self._model = json.dumps(model, sort_keys=True).encode("utf-8")
+        self._deadline_ms = deadline_ms
+        self.mode = ""
+        self._handle = 0
+        self._load()
+
+    def _load(self) -> None:
+        payload = self._call(KIND_LOAD, self._model, deadline_ms=0.0, timeout_s=None)
+        self._handle = struct.unpack_from("<I", payload)[0]
+        self.mode = bytes(payload[4:]).decode("utf-8")
+
+    def _call(self, kind: int, payload: bytes, deadline_ms: float, timeout_s: float | None, flags: int = 0) -> bytearray:
+        return self._wait(self._pool.connection().request(kind, payload, deadline_ms, flags), timeout_s)
+
+    @staticmethod
+    def _wait(future: Future, timeout_s: float | None) -> bytearray:
+        try:
+            status, payload = future.result(timeout=timeout_s)
+        except FutureTimeoutError as exc:  # not the builtin TimeoutError before Python 3.11
+            future.cancel()
+            raise RemoteError(f"no reply within {timeout_s * 1000.0:.0f} ms") from exc
+        if status == STATUS_OK:
+            return payload
+        message = bytes(payload).decode("utf-8", "replace")
+        if status == STATUS_UNKNOWN_MODEL:
+            raise _UnknownModel(message)
+        raise RemoteError(message if status == STATUS_ERROR else f"deadline expired on server: {message}")
+
+    def submit(self, batch: np.ndarray, full: bool = False) -> Callable[[], dict]:
+        """Send ``batch`` and return a callable waiting for its output; several may be in flight."""
+        batch = np.asarray(batch)
+        if batch.dtype not in _DTYPE_CODES:
+            batch = batch.astype(np.float32)
+        payload = struct.pack("<I", self._handle) + encode_tensor(batch)
+        flags = FLAG_FULL if full else 0
+        timeout_s = self._deadline_ms / 1000.0 if self._deadline_ms > 0 else None
+        future = self._pool.connection().request(KIND_PREDICT, payload, self._deadline_ms, flags)
+
+        def wait() -> dict:
+            try:
+                reply = self._wait(future, timeout_s)
+            except _UnknownModel:
+                # The server restarted and lost its handles: load again and retry once.
+                self._load()
+                return self.submit(batch, full)()
+            buffer = memoryview(reply)
+            scores, offset = decode_tensor(buffer)
+            output = {"pred_score": scores}
+            if full and offset < len(buffer):
+                output["anomaly_map"] = decode_tensor(buffer, offset)[0]
+            return output
+
+        return wait
+
+    def predict(self, batch: np.ndarray, full: bool = False) -> dict:
+        return self.submit(batch, full)()
+
+    def warmup(self, input_size: tuple[int, int], batch_sizes: Sequence[int]) -> float:
+        options = json.dumps({"input_size": list(input_size), "batch_sizes": list(batch_sizes)}).encode("utf-8")
+        payload = self._call(KIND_WARMUP, struct.pack("<I", self._handle) + options, deadline_ms=0.0, timeout_s=None)
+        return struct.unpack_from("<f", payload)[0]
+
+
+class _UnknownModel(RemoteError):
+    pass
+
+
+# --------------------------
+# Server
+# --------------------------
+class ModelRegistry:
+    """Backends hosted by the server, shared by every station that loads the same model."""
+
+    def __init__(self, project_root: Path, device: str):
+        self._project_root = project_root
+        self._device = device
+        self._lock = threading.Lock()
+        self._handles: dict[tuple, int] = {}
+        self._models: dict[int, tuple[Any, threading.Lock]] = {}
+
+    def load(self, model: dict[str, Any]) -> tuple[int, str]:
+        from app.core.infer_worker import ModelConfig, load_backend
+
+        cfg = ModelConfig(**model)
+        path = Path(cfg.path)
+        if cfg.path and not path.is_absolute():
+            cfg.path = str(self._project_root / path)
+        key = astuple(cfg)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is not None:
+                return handle, self._models[handle][0]._mode
+        backend = load_backend(cfg, device=self._device)
+        with self._lock:
+            handle = self._handles.setdefault(key, len(self._handles) + 1)
+            self._models.setdefault(handle, (backend, threading.Lock()))
+            jlog("remote_model_loaded", handle=handle, path=cfg.path, mode=backend._mode)
+            return handle, self._models[handle][0]._mode
+
+    def get(self, handle: int) -> tuple[Any, threading.Lock] | None:
+        with self._lock:
+            return self._models.get(handle)
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    server: "InferenceServer"
+
+    def handle(self) -> None:
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        send_lock = threading.Lock()
+        peer = f"{self.client_address[0]}:{self.client_address[1]}"
+        jlog("remote_client_connected", peer=peer)
+        try:
+            while True:
+                magic, kind, flags, request_id, deadline_ms, length = REQUEST_HEADER.unpack(
+                    _recv_exact(sock, REQUEST_HEADER.size)
+                )
+                if magic != REQUEST_MAGIC:
+                    raise ConnectionError("bad request frame")
+                payload = _recv_exact(sock, length)
+                received = time.monotonic()
+                # Pipelined requests run concurrently; replies go back as they finish.
+                self.server.executor.submit(
+                    self._answer, sock, send_lock, kind, flags, request_id, deadline_ms, received, payload
+                )
+        except (OSError, ConnectionError, struct.error):
+            pass
+        jlog("remote_client_disconnected", peer=peer)
+
+    def _answer(self, sock, send_lock, kind, flags, request_id, deadline_ms, received, payload) -> None:
+        try:
+            status, reply = self.server.execute(kind, flags, deadline_ms, received, payload)
+        except Exception as exc:
+            status, reply = STATUS_ERROR, f"{type(exc).__name__}: {exc}".encode("utf-8")
+        try:
+            with send_lock:
+                sock.sendall(RESPONSE_HEADER.pack(RESPONSE_MAGIC, status, request_id, len(reply)) + reply)
+        except OSError:
+            pass
+
+
+class InferenceServer(socketserver.ThreadingTCPServer):
+    """Host ``InferenceBackend`` models for any number of stations over the binary protocol."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: tuple[str, int], project_root: Path, device: str = "cuda", workers: int = 4):
+        super().__init__(address, _RequestHandler)
+        self.models = ModelRegistry(project_root, device)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="remote-infer")
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def execute(self, kind: int, flags: int, deadline_ms: int, received: float, payload: bytearray) -> tuple[int, bytes]:
+        if kind == KIND_LOAD:
+            handle, mode = self.models.load(json.loads(payload.decode("utf-8")))
+            return STATUS_OK, struct.pack("<I", handle) + mode.encode("utf-8")
+        handle = struct.unpack_from("<I", payload)[0]
+        entry = self.models.get(handle)
+        if entry is None:
+            return STATUS_UNKNOWN_MODEL, f"unknown model handle {handle}".encode("utf-8")
+        backend, lock = entry
+        if kind == KIND_WARMUP:
+            options = json.loads(bytes(payload[4:]).decode("utf-8"))
+            with lock:
+                elapsed_ms = backend.warmup(tuple(options["input_size"]), options["batch_sizes"])
+            return STATUS_OK, struct.pack("<f", elapsed_ms)
+        if kind != KIND_PREDICT:
+            return STATUS_ERROR, f"unknown request kind {kind}".encode("utf-8")
+
+        from app.core.infer_worker import extract_anomaly_map, extract_score
+
+        batch, _offset = decode_tensor(memoryview(payload), 4)
+        with lock:
+            waited_ms = (time.monotonic() - received) * 1000.0
+            if deadline_ms and waited_ms > deadline_ms:
+                return STATUS_DEADLINE, f"queued {waited_ms:.0f} ms > {deadline_ms} ms".encode("utf-8")
+            output = backend.predict_full(batch) if flags & FLAG_FULL else backend.predict(batch)
+        scores = np.asarray([extract_score(output, index) for index in range(len(batch))], dtype=np.float32)
+        reply = encode_tensor(scores)
+        if flags & FLAG_FULL:
+            anomaly_map = extract_anomaly_map(output)
+            if anomaly_map is not None:
+                reply += encode_tensor(anomaly_map)
+        return STATUS_OK, reply
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def remote_model_config(cfg: Any) -> dict[str, Any]:
+    """The server-side model configuration of a ``type: remote`` entry."""
+    model = asdict(cfg)
+    model["type"] = model.pop("remote_type")
+    for name in ("server", "deadline_ms", "connections"):
+        model.pop(name)
+    return model
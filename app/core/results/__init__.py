@@ -1,6 +1,7 @@
 """Normalized inspection result publication."""
 
+from .early_reject import EarlyReject
 from .inspection_result import InspectionResult, ResultCode
 from .result_publisher import ResultPublisher
 
-__all__ = ["InspectionResult", "ResultCode", "ResultPublisher"]
\ No newline at end of file
+__all__ = ["EarlyReject", "InspectionResult", "ResultCode", "ResultPublisher"]
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""Reject output driven as soon as a trigger is certainly NG."""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any
+
+from app.core.logger import jlog
+
+MAX_EARLY_REJECTS = 64  # fired rejects awaiting their full result
+
+
+class EarlyReject:
+    """Own the DIO OK/NG output while early rejects are enabled.
+
+    The inference worker calls ``fire`` from its thread the moment one camera
+    decides NG, ahead of the remaining cameras and the queued result.  The
+    publisher then writes each full result through ``publish_output``, which
+    keeps the output NG while any later trigger's early reject is outstanding,
+    so an earlier OK result cannot clear it.  A reject whose full result is
+    never published, because the trigger timed out first, is withdrawn with
+    ``cancel`` so it does not hold the output NG.
+    """
+
+    def __init__(self, dio: Any):
+        self._dio = dio
+        self._lock = threading.Lock()
+        self._fired: dict[int, float] = {}
+
+    def fire(self, trigger_idx: int, cam_id: int, score: float) -> None:
+        with self._lock:
+            if trigger_idx in self._fired:
+                return
+            self._fired[trigger_idx] = time.perf_counter()
+            if len(self._fired) > MAX_EARLY_REJECTS:
+                del self._fired[next(iter(self._fired))]
+            self._dio.set_ok_ng(False)
+        jlog("early_reject", trigger_idx=trigger_idx, cam_id=cam_id, score=score)
+
+    def cancel(self, trigger_idx: int) -> None:
+        """Forget a fired reject whose result was replaced by a timeout; the output stays as published."""
+        with self._lock:
+            self._fired.pop(trigger_idx, None)
+
+    def publish_output(self, trigger_idx: int, ok: bool) -> float | None:
+        """Drive the output for a full result; return how many ms its early reject came before it."""
+        with self._lock:
+            fired_at = self._fired.pop(trigger_idx, None)
+            self._dio.set_ok_ng(ok and not self._fired)
+        return None if fired_at is None else (time.perf_counter() - fired_at) * 1000.0
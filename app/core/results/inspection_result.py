@@ -25,6 +25,8 @@ class InspectionResult:
     warning_code: VisionWarningCode = VisionWarningCode.NONE
     missing_camera_mask: int = 0
     bypass_active: bool = False
+    reused_camera_mask: int = 0   # cameras whose unchanged frame reused the previous score
+    gate_camera_mask: int = 0     # cameras the cascade gate cleared without the full model (score 0.0)
     timestamp: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
     sequence: int = 0
 
@@ -43,6 +45,8 @@ class InspectionResult:
             warning_code=self.warning_code,
             missing_camera_mask=self.missing_camera_mask,
             bypass_active=self.bypass_active,
+            reused_camera_mask=self.reused_camera_mask,
+            gate_camera_mask=self.gate_camera_mask,
             timestamp=self.timestamp,
             sequence=sequence,
         )
@@ -2,21 +2,31 @@
 
 from __future__ import annotations
 
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 from app.core.logger import jlog
 from app.core.modbus.state import ModbusSharedState
 
 from .inspection_result import InspectionResult
 
+if TYPE_CHECKING:
+    from .early_reject import EarlyReject
+
 
 class ResultPublisher:
     """Publish one normalized outcome to DIO, Modbus state, Qt UI, and logs."""
 
-    def __init__(self, dio: Any, modbus_state: ModbusSharedState, results_bus: Any):
+    def __init__(
+        self,
+        dio: Any,
+        modbus_state: ModbusSharedState,
+        results_bus: Any,
+        early_reject: EarlyReject | None = None,
+    ):
         self._dio = dio
         self._modbus_state = modbus_state
         self._results_bus = results_bus
+        self._early_reject = early_reject
 
     def publish(self, result: InspectionResult) -> bool:
         """Publish once; Modbus queues results rather than overwriting an unacknowledged one."""
@@ -24,7 +34,11 @@ class ResultPublisher:
         if queued_result is not None:
             result = queued_result
         # The hardwired DIO output remains the timing-critical reject interface.
-        self._dio.set_ok_ng(result.ok)
+        reject_lead_ms = None
+        if self._early_reject is not None:
+            reject_lead_ms = self._early_reject.publish_output(result.trigger_index, result.ok)
+        else:
+            self._dio.set_ok_ng(result.ok)
         queued = queued_result is not None
         self._modbus_state.increment_processed_count()
         self._results_bus.inference_result.emit(result.trigger_index, {
@@ -37,6 +51,8 @@ class ResultPublisher:
             "error_code": int(result.error_code),
             "warning_code": int(result.warning_code),
             "bypass": result.bypass_active,
+            "reused_camera_mask": result.reused_camera_mask,
+            "gate_camera_mask": result.gate_camera_mask,
             "result_sequence": result.sequence,
         })
         jlog(
@@ -48,7 +64,10 @@ class ResultPublisher:
             result_code=int(result.result_code),
             fused_score=result.fused_score,
             ng_camera_mask=result.ng_camera_mask,
+            reused_camera_mask=result.reused_camera_mask,
+            gate_camera_mask=result.gate_camera_mask,
             queued=queued,
+            reject_lead_ms=None if reject_lead_ms is None else round(reject_lead_ms, 3),
         )
         return queued
 
@@ -0,0 +1,131 @@
+"""Skip the model for frames that did not change since a camera's last scored frame.
+
+On a stopped or slow line consecutive frames of a camera are nearly identical.
+Each prepared frame is reduced to a small signature and compared with the
+signature of the camera's last frame that the model scored; below the
+recipe's threshold the previous score is reused instead of running the model.
+The reference is only replaced by frames the model actually scores, so slow
+drift accumulates against it instead of creeping through, and every
+``max_reuse``-th consecutive reuse still runs the model.  Reuse only happens
+while the PLC reports the line stopped, in setup, or in automatic production
+slower than the recipe's ``max_line_speed_mm_s``; a trigger without a line
+state, or in any other state, always runs the model.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from app.core.logger import jlog
+from app.core.modbus.register_map import LineState
+
+METHODS = ("diff", "phash")
+SIMILARITY_STATS_EVERY = 500  # compared frames between similarity skip logs
+HASH_SIZE = 8                 # phash keeps the lowest HASH_SIZE x HASH_SIZE DCT frequencies
+IDLE_LINE_STATES = (LineState.STOPPED, LineState.SETUP)
+
+
+@dataclass(frozen=True, slots=True)
+class SimilarityConfig:
+    """``similarity_skip`` section of a recipe's thresholds file."""
+
+    enabled: bool = False
+    method: str = "diff"              # diff: downsampled difference, phash: perceptual hash
+    grid: tuple[int, int] = (32, 32)  # diff signature cells (W, H)
+    max_diff: float = 0.05            # largest cell change in normalized input units (~0.017 per gray level)
+    max_hash_distance: int = 2        # differing phash bits out of 63
+    max_reuse: int = 50               # consecutive reuses per camera before the model runs anyway
+    cameras: tuple[int, ...] = ()     # cameras using the skip; empty for all
+    max_line_speed_mm_s: float = 0.0  # automatic production slower than this counts as slow; 0 never
+
+
+@dataclass(frozen=True, slots=True)
+class LineCondition:
+    """PLC line state and speed when a trigger arrived."""
+
+    state: int
+    speed_mm_s: float = 0.0
+
+
+@dataclass(frozen=True, slots=True)
+class SimilarityStats:
+    compared: int = 0
+    reused: int = 0
+    forced: int = 0   # unchanged frames scored because of max_reuse
+
+
+class FrameChangeDetector:
+    """Per-camera reference signatures and scores of the last frames the model scored."""
+
+    def __init__(self, config: SimilarityConfig):
+        self._config = config
+        self._references: dict[int, tuple[np.ndarray, float]] = {}
+        self._reuse_runs: dict[int, int] = {}
+        self._compared = 0
+        self._reused = 0
+        self._forced = 0
+
+    def applies_to(self, cam_id: int) -> bool:
+        return not self._config.cameras or cam_id in self._config.cameras
+
+    def allowed(self, line: LineCondition | None) -> bool:
+        """True if a trigger taken in ``line`` may reuse scores: stopped, setup or slow production."""
+        if line is None:
+            return False
+        if line.state in IDLE_LINE_STATES:
+            return True
+        return line.state == LineState.AUTOMATIC_PRODUCTION and line.speed_mm_s < self._config.max_line_speed_mm_s
+
+    def signature(self, chw: np.ndarray) -> np.ndarray:
+        plane = chw.mean(axis=0, dtype=np.float32) if chw.ndim == 3 else chw.astype(np.float32, copy=False)
+        if self._config.method == "phash":
+            side = HASH_SIZE * 4
+            low = cv2.dct(cv2.resize(plane, (side, side), interpolation=cv2.INTER_AREA))[:HASH_SIZE, :HASH_SIZE]
+            coefficients = low.ravel()[1:]  # the DC term only carries overall brightness
+            return coefficients > np.median(coefficients)
+        return cv2.resize(plane, self._config.grid, interpolation=cv2.INTER_AREA)
+
+    def change(self, signature: np.ndarray, reference: np.ndarray) -> float:
+        if self._config.method == "phash":
+            return float(np.count_nonzero(signature != reference))
+        return float(np.abs(signature - reference).max())
+
+    def reuse(self, cam_id: int, signature: np.ndarray) -> float | None:
+        """Return the reference score when ``signature`` is unchanged from it, else None."""
+        reference = self._references.get(cam_id)
+        if reference is None:
+            return None
+        self._compared += 1
+        if self._compared % SIMILARITY_STATS_EVERY == 0:
+            jlog(
+                "similarity_skip_stats",
+                method=self._config.method,
+                compared=self._compared,
+                reused=self._reused,
+                forced=self._forced,
+            )
+        limit = self._config.max_hash_distance if self._config.method == "phash" else self._config.max_diff
+        if self.change(signature, reference[0]) > limit:
+            return None
+        run = self._reuse_runs.get(cam_id, 0)
+        if self._config.max_reuse > 0 and run >= self._config.max_reuse:
+            self._forced += 1
+            return None
+        self._reuse_runs[cam_id] = run + 1
+        self._reused += 1
+        return reference[1]
+
+    def remember(self, cam_id: int, signature: np.ndarray, score: float) -> None:
+        """Make a frame the model scored the camera's new reference."""
+        self._references[cam_id] = (signature, score)
+        self._reuse_runs[cam_id] = 0
+
+    def stats(self) -> SimilarityStats:
+        return SimilarityStats(compared=self._compared, reused=self._reused, forced=self._forced)
+
+
+def load_detector(config: SimilarityConfig) -> FrameChangeDetector | None:
+    return FrameChangeDetector(config) if config.enabled else None
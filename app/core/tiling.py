@@ -0,0 +1,72 @@
+"""Overlapping model-sized tiles for full-resolution inspection of large ROIs."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass(frozen=True, slots=True)
+class TilingConfig:
+    """``tiling`` section of a recipe's thresholds file."""
+
+    enabled: bool = False
+    overlap: float = 0.25       # fraction of a tile shared with its neighbour
+    select_above: float = 0.3   # coarse anomaly-map value that sends a tile to full resolution
+    max_tiles: int = 8          # tiles scored per camera and trigger, highest coarse value first
+
+
+def tile_grid(
+    width: int,
+    height: int,
+    tile: tuple[int, int],
+    overlap: float,
+) -> list[tuple[int, int, int, int]]:
+    """Cover a ``width`` x ``height`` area with overlapping tiles as (x, y, w, h).
+
+    The last row and column are aligned to the far edge, so every pixel is
+    covered without padding.  An area smaller than a tile is one tile.
+    """
+
+    def starts(length: int, size: int) -> list[int]:
+        if length <= size:
+            return [0]
+        stride = max(1, int(size * (1.0 - overlap)))
+        positions = list(range(0, length - size, stride))
+        return positions + [length - size]
+
+    tile_width, tile_height = min(tile[0], width), min(tile[1], height)
+    return [
+        (x, y, tile_width, tile_height)
+        for y in starts(height, tile_height)
+        for x in starts(width, tile_width)
+    ]
+
+
+def select_tiles(
+    anomaly_map: np.ndarray | None,
+    area: tuple[int, int],
+    tiles: list[tuple[int, int, int, int]],
+    select_above: float,
+    max_tiles: int,
+) -> list[int]:
+    """Return indices of the tiles whose coarse anomaly-map peak reaches ``select_above``.
+
+    ``anomaly_map`` covers the whole ``area`` (width, height) at low resolution.
+    Without a map nothing ranks the tiles; the first ``max_tiles`` are taken so
+    the cycle budget still holds.  Recipes refuse tiling for such models at load.
+    """
+    if anomaly_map is None:
+        return list(range(min(max_tiles, len(tiles))))
+    map_height, map_width = anomaly_map.shape
+    scale_x, scale_y = map_width / area[0], map_height / area[1]
+    peaks = []
+    for x, y, width, height in tiles:
+        left, top = int(x * scale_x), int(y * scale_y)
+        right = max(left + 1, int(np.ceil((x + width) * scale_x)))
+        bottom = max(top + 1, int(np.ceil((y + height) * scale_y)))
+        peaks.append(float(anomaly_map[top:bottom, left:right].max()))
+    ranked = sorted(range(len(tiles)), key=peaks.__getitem__, reverse=True)
+    return [index for index in ranked[:max_tiles] if peaks[index] >= select_above]
+
@@ -2,10 +2,12 @@ from __future__ import annotations
 
 import ctypes
 from datetime import datetime
+import math
 import os
 from pathlib import Path
 from queue import Empty, Queue
 import sys
+import time
 from typing import Any
 
 import cv2
@@ -14,22 +16,42 @@ from PyQt5.QtCore import QObject, QThread, QTimer, Qt, pyqtSignal, pyqtSlot
 from PyQt5.QtWidgets import QApplication
 
 from app.core.camera_manager import CameraConfig, CameraWorker
+from app.core.captures import CAPTURE_DIR, capture_path
+from app.core.cascade import load_cascade
+from app.core.corrections import compile_transform_plan
+from app.core.cycle_budget import CycleBudget, CycleBudgetConfig
 from app.core.dio_client import DIOConfig, make_dio
-from app.core.infer_worker import BatchInferenceWorker, InferenceBackend, ModelConfig
+from app.core.infer_worker import (
+    BatchInferenceWorker,
+    MAX_ABANDONED,
+    InferenceBackend,
+    ModelConfig,
+    PreprocessStage,
+    RecipeLoader,
+    load_backend,
+)
+from app.core.inference_service import InferenceService, ServiceConfig, ServiceError
+from app.core.load_shedding import LoadShedder, LoadSheddingConfig
 from app.core.logger import jlog, setup_logging
 from app.core.modbus.config import ModbusConfig
 from app.core.modbus.protocol import ProtocolEvent
 from app.core.modbus.register_map import (
     PlcCommand,
     ResultCode,
+    ShedReason,
     VisionErrorCode,
+    VisionWarningCode,
 )
 from app.core.modbus.state import ModbusSharedState
 from app.core.modbus.worker import ModbusWorker
+from app.core.model_cache import MODEL_CACHE
+from app.core.preprocess_pool import PreprocessPoolConfig, start_preprocess_pool
 from app.core.recipes import RecipeError, RecipeNotFoundError, RecipeRepository, RecipeRevisionError, RecipeRuntime
+from app.core.results.early_reject import EarlyReject
 from app.core.results.inspection_result import InspectionResult
 from app.core.results.result_publisher import ResultPublisher
 from app.core.results_bus import ResultsBus
+from app.core.similarity import LineCondition, load_detector
 from app.core.trigger_coordinator import TriggerCoordinator
 from app.ui.main_window import MainWindow, np_to_qimage
 
@@ -44,34 +66,40 @@ if os.name == "nt":
         pass
 
 
-LOG_IMAGE_DIR = Path("logs") / "captures"
+LOG_IMAGE_DIR = CAPTURE_DIR
+ANOMALY_MAP_DIR = Path("logs") / "anomaly_maps"
 MAX_PENDING_INFERENCES = 2
 
 
 class BatchInferenceController(QObject):
     """Main-thread bridge to the existing dedicated inference QThread."""
 
-    requested = pyqtSignal(int, list)
+    drain_requested = pyqtSignal()
     recipe_requested = pyqtSignal(object, int)
 
-    def __init__(self, on_completed, on_failed, on_recipe_loaded, on_recipe_failed):
+    def __init__(self, on_completed, on_failed, on_recipe_loaded, on_recipe_failed, on_anomaly_maps):
         super().__init__()
         self._on_completed = on_completed
         self._on_failed = on_failed
         self._on_recipe_loaded = on_recipe_loaded
         self._on_recipe_failed = on_recipe_failed
+        self._on_anomaly_maps = on_anomaly_maps
 
-    @pyqtSlot(int, list, list, float, bool, float)
-    def completed(self, trigger_idx, frames, scores, fused, ok, elapsed_ms):
-        self._on_completed(trigger_idx, frames, scores, fused, ok, elapsed_ms)
+    @pyqtSlot(int, list, list, float, bool, float, int, int, int)
+    def completed(self, trigger_idx, frames, scores, fused, ok, elapsed_ms, reused_mask, gate_mask, shed_reason):
+        self._on_completed(trigger_idx, frames, scores, fused, ok, elapsed_ms, reused_mask, gate_mask, shed_reason)
 
     @pyqtSlot(int, str)
     def failed(self, trigger_idx, message):
         self._on_failed(trigger_idx, message)
 
-    @pyqtSlot(int, int, int, int)
-    def recipe_loaded(self, sequence, recipe_id, revision, model_mask):
-        self._on_recipe_loaded(sequence, recipe_id, revision, model_mask)
+    @pyqtSlot(int, dict)
+    def anomaly_maps(self, trigger_idx, maps):
+        self._on_anomaly_maps(trigger_idx, maps)
+
+    @pyqtSlot(int, int, int, int, float, float)
+    def recipe_loaded(self, sequence, recipe_id, revision, model_mask, load_ms, swap_ms):
+        self._on_recipe_loaded(sequence, recipe_id, revision, model_mask, load_ms, swap_ms)
 
     @pyqtSlot(int, int, int, str)
     def recipe_failed(self, sequence, recipe_id, revision, message):
@@ -91,15 +119,24 @@ def make_backends(
     camera_count: int,
     *,
     allow_mock_models: bool,
+    service: InferenceService | None = None,
 ) -> tuple[dict[int, InferenceBackend], int]:
     """Create initial backends; failed model loads remain visible through readiness masks."""
     backends: dict[int, InferenceBackend] = {}
     ready_mask = 0
     for cam_id in range(camera_count):
-        raw = runtime.models.get(f"cam{cam_id + 1}", runtime.models.get(str(cam_id)))
+        raw = runtime.camera_model(cam_id)
         if raw is None:
             raise RecipeError(f"Recipe {runtime.definition.name!r} lacks a model for camera {cam_id}")
-        backend = InferenceBackend(ModelConfig(**raw), device="cuda")
+        if service is None:
+            backend = load_backend(ModelConfig(**raw), device="cuda")
+        else:
+            try:
+                backend = service.backend(cam_id, ModelConfig(**raw))
+            except ServiceError as exc:
+                jlog("model_load_failure", cam_id=cam_id, error=str(exc))
+                backends[cam_id] = InferenceBackend(ModelConfig(path=str(raw.get("path", "")), type="mock"), device="cpu")
+                continue
         backends[cam_id] = backend
         if backend._mode != "mock" or allow_mock_models:
             ready_mask |= 1 << cam_id
@@ -117,13 +154,24 @@ def main() -> None:
     num_cams = len(camera_configs)
 
     modbus_cfg = ModbusConfig.from_mapping(load_yaml(project_root / "configs" / "modbus.yaml"))
+    try:
+        inference_cfg = load_yaml(project_root / "configs" / "inference.yaml")
+    except FileNotFoundError:
+        inference_cfg = {}
+    MODEL_CACHE.set_budget(float(inference_cfg.get("model_cache", {}).get("budget_mb", 4096)))
+    micro_batch_cfg = inference_cfg.get("micro_batch", {})
+    micro_batch_triggers = max(1, int(micro_batch_cfg.get("max_triggers", 1)))
     recipe_repository = RecipeRepository.from_yaml(project_root / "configs" / "recipes.yaml", project_root)
     initial_runtime = recipe_repository.load(0, 0)
     allow_mock_models = not modbus_cfg.enabled or modbus_cfg.behavior.simulation_mode
+    service_cfg = ServiceConfig.from_mapping(inference_cfg.get("service"))
+    # Models run in separate processes so a crash or slow load cannot stall this one.
+    inference_service = InferenceService(service_cfg) if service_cfg.enabled else None
     backends, model_ready_mask = make_backends(
         initial_runtime,
         num_cams,
         allow_mock_models=allow_mock_models,
+        service=inference_service,
     )
 
     try:
@@ -143,16 +191,35 @@ def main() -> None:
         required_camera_mask=required_mask,
         required_model_mask=required_mask,
     )
-    modbus_state.set_model_ready_mask(model_ready_mask)
     modbus_state.set_recipe_loaded(initial_runtime.definition.recipe_id, initial_runtime.definition.revision, 0)
     modbus_events: Queue[tuple[str, object]] = Queue()
     modbus_worker = ModbusWorker(modbus_cfg, modbus_state, modbus_events)
     if modbus_cfg.enabled:
         modbus_worker.start()
 
-    publisher = ResultPublisher(dio, modbus_state, bus)
+    # Cameras run likeliest-NG first and the reject output fires on the first NG camera.
+    early_reject = EarlyReject(dio) if inference_cfg.get("early_reject", {}).get("enabled", False) else None
+    publisher = ResultPublisher(dio, modbus_state, bus, early_reject=early_reject)
+    cycle_budget = CycleBudget(
+        CycleBudgetConfig.from_mapping(inference_cfg.get("cycle_budget")), modbus_cfg.line_speed_scale
+    )
+    # By default a backlog of up to MAX_PENDING_INFERENCES forward passes, each coalescing several triggers.
+    load_shedding_cfg = LoadSheddingConfig.from_mapping(inference_cfg.get("load_shedding"))
+    if load_shedding_cfg.policy == "degrade" and not (
+        initial_runtime.tiling.enabled or initial_runtime.cascade.enabled
+    ):
+        raise ValueError("load_shedding.policy degrade needs tiling or a cascade in the active recipe")
+    load_shedder = LoadShedder(
+        load_shedding_cfg,
+        max_triggers=micro_batch_triggers,
+        default_max_pending=MAX_PENDING_INFERENCES,
+    )
     accepting_inspections = True
     pending_batches = 0
+    # trigger_idx -> (arrival, budget_ms) of triggers waiting for a verdict under a deadline.
+    trigger_deadlines: dict[int, tuple[float, float]] = {}
+    # Triggers given up on while already taken by the worker; their late verdicts are dropped.
+    abandoned_triggers: dict[int, None] = {}
     write_config_enabled = False
     write_collect_data_enabled = False
     force_save_diagnostics = False
@@ -181,9 +248,10 @@ def main() -> None:
     def refresh_inspection_ready() -> None:
         health = modbus_state.health_snapshot()
         snapshot = modbus_state.pc_snapshot()
-        application_ready = all(
+        # During a changeover the previous recipe keeps serving until the new one is swapped in.
+        application_ready = modbus_state.recipe_serving() and all(
             snapshot.status_word & bit
-            for bit in ((1 << 1), (1 << 2), (1 << 3))
+            for bit in ((1 << 1), (1 << 2))
         )
         ready = (
             accepting_inspections
@@ -226,6 +294,91 @@ def main() -> None:
         publisher.publish(result)
         publish_status()
 
+    def apply_warnings(transitions: list[tuple[VisionWarningCode, bool]]) -> None:
+        for code, raised in transitions:
+            if raised:
+                modbus_state.set_warning(code)
+            else:
+                modbus_state.clear_warning_if(code)
+            jlog("cycle_budget_warning", code=int(code), raised=raised)
+
+    def set_pending(count: int) -> None:
+        nonlocal pending_batches
+        pending_batches = max(0, count)
+        modbus_state.set_inspection_busy(pending_batches > 0)
+        apply_warnings(cycle_budget.observe_queue(pending_batches))
+        if load_shedder.update(pending_batches):
+            inference_worker.set_load_shedding(load_shedder.degraded, load_shedder.bypassed_cameras)
+            jlog(
+                "load_shedding_level",
+                degraded=load_shedder.degraded,
+                bypassed_cameras=sorted(load_shedder.bypassed_cameras),
+                pending=pending_batches,
+                limit=load_shedder.limit,
+            )
+
+    def shed(trigger_idx: int, reason: ShedReason) -> None:
+        modbus_state.record_shed(reason)
+        jlog(
+            "load_shed",
+            trigger_idx=trigger_idx,
+            reason=reason.name.lower(),
+            pending=pending_batches,
+            limit=load_shedder.limit,
+            count=modbus_state.shed_counts()[reason],
+        )
+
+    def drop_trigger(trigger_idx: int, reason: ShedReason) -> None:
+        shed(trigger_idx, reason)
+        modbus_state.set_error(VisionErrorCode.RESULT_QUEUE_FULL)
+        recipe_id, revision = current_recipe_result_fields()
+        publish_inspection_result(InspectionResult(
+            trigger_index=trigger_idx,
+            recipe_id=recipe_id,
+            recipe_revision=revision,
+            result_code=ResultCode.INSPECTION_TIMEOUT,
+            ok=False,
+            error_code=VisionErrorCode.RESULT_QUEUE_FULL,
+        ))
+
+    def finish_pending(trigger_idx: int) -> bool:
+        """Count a trigger's verdict as delivered; False if its deadline already reported a timeout."""
+        if trigger_idx in abandoned_triggers:
+            del abandoned_triggers[trigger_idx]
+            if early_reject is not None:  # fired after the timeout was published
+                early_reject.cancel(trigger_idx)
+            jlog("late_result_discarded", trigger_idx=trigger_idx)
+            return False
+        set_pending(pending_batches - 1)
+        return True
+
+    def on_trigger_deadline(trigger_idx: int) -> None:
+        deadline = trigger_deadlines.pop(trigger_idx, None)
+        if deadline is None:
+            return
+        arrival, budget_ms = deadline
+        queued = inference_worker.inbox.abandon(trigger_idx)
+        if not queued:
+            abandoned_triggers[trigger_idx] = None
+            if len(abandoned_triggers) > MAX_ABANDONED:  # skipped by the worker, so never reported back
+                del abandoned_triggers[next(iter(abandoned_triggers))]
+        set_pending(pending_batches - 1)
+        apply_warnings(cycle_budget.record_timeout())
+        shed(trigger_idx, ShedReason.DEADLINE_EXPIRED)
+        recipe_id, revision = current_recipe_result_fields()
+        publish_inspection_result(InspectionResult(
+            trigger_index=trigger_idx,
+            recipe_id=recipe_id,
+            recipe_revision=revision,
+            result_code=ResultCode.INSPECTION_TIMEOUT,
+            ok=False,
+            inference_time_ms=(time.monotonic() - arrival) * 1000.0,
+            warning_code=VisionWarningCode.INFERENCE_SLOWER_THAN_CYCLE_TIME,
+        ))
+        if early_reject is not None:
+            early_reject.cancel(trigger_idx)
+        jlog("inspection_deadline_expired", trigger_idx=trigger_idx, budget_ms=round(budget_ms, 3), queued=queued)
+
     def on_inference_completed(
         trigger_idx: int,
         frames: list,
@@ -233,13 +386,26 @@ def main() -> None:
         fused: float,
         ok: bool,
         elapsed_ms: float,
+        reused_mask: int,
+        gate_mask: int,
+        shed_reason: int,
     ) -> None:
-        nonlocal pending_batches, force_save_diagnostics
-        pending_batches = max(0, pending_batches - 1)
-        modbus_state.set_inspection_busy(pending_batches > 0)
+        nonlocal force_save_diagnostics
+        if not finish_pending(trigger_idx):
+            return
+        if shed_reason != ShedReason.NONE:  # the level the worker actually applied to this trigger
+            shed(trigger_idx, ShedReason(shed_reason))
+        load_shedder.observe_pass(elapsed_ms)
+        deadline = trigger_deadlines.pop(trigger_idx, None)
+        if deadline is not None:
+            arrival, budget_ms = deadline
+            apply_warnings(cycle_budget.record((time.monotonic() - arrival) * 1000.0, elapsed_ms, budget_ms))
         recipe_id, revision = current_recipe_result_fields()
-        threshold = inference_worker._threshold
-        ng_mask = sum(1 << frame.cam_id for frame, score in zip(frames, per_cam_scores) if score >= threshold)
+        ng_mask = sum(
+            1 << frame.cam_id
+            for frame, score in zip(frames, per_cam_scores)
+            if score >= inference_worker.camera_threshold(frame.cam_id)
+        )
         result = InspectionResult(
             trigger_index=trigger_idx,
             recipe_id=recipe_id,
@@ -250,6 +416,8 @@ def main() -> None:
             fused_score=fused,
             ng_camera_mask=ng_mask,
             inference_time_ms=elapsed_ms,
+            reused_camera_mask=reused_mask,
+            gate_camera_mask=gate_mask,
         )
         publish_inspection_result(result)
         jlog("batch_inference", ms=elapsed_ms, trigger_idx=trigger_idx)
@@ -266,17 +434,18 @@ def main() -> None:
                 inference_ms=elapsed_ms,
             )
         if write_collect_data_enabled or plc.save_training_images or force_save_diagnostics:
-            LOG_IMAGE_DIR.mkdir(parents=True, exist_ok=True)
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
             for frame, score in zip(frames, per_cam_scores):
-                filename = LOG_IMAGE_DIR / f"{timestamp}_ti{trigger_idx:06d}_cam{frame.cam_id}_s{score:.3f}.png"
+                gated = bool(gate_mask & (1 << frame.cam_id))
+                filename = capture_path(LOG_IMAGE_DIR, recipe_id, trigger_idx, frame.cam_id, score, timestamp, gated)
+                filename.parent.mkdir(parents=True, exist_ok=True)
                 cv2.imwrite(str(filename), frame.image)
             force_save_diagnostics = False
 
     def on_inference_failed(trigger_idx: int, message: str) -> None:
-        nonlocal pending_batches
-        pending_batches = max(0, pending_batches - 1)
-        modbus_state.set_inspection_busy(pending_batches > 0)
+        if not finish_pending(trigger_idx):
+            return
+        trigger_deadlines.pop(trigger_idx, None)
         modbus_state.set_error(VisionErrorCode.INTERNAL_INSPECTION_EXCEPTION)
         recipe_id, revision = current_recipe_result_fields()
         publish_inspection_result(InspectionResult(
@@ -289,43 +458,118 @@ def main() -> None:
         ))
         jlog("batch_inference_failed", trigger_idx=trigger_idx, error=message)
 
-    def on_recipe_loaded(sequence: int, recipe_id: int, revision: int, model_mask: int) -> None:
+    def on_anomaly_maps(trigger_idx: int, maps: dict) -> None:
+        recipe_id, _revision = current_recipe_result_fields()
+        directory = ANOMALY_MAP_DIR / f"recipe{recipe_id}"
+        directory.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        for cam_id, anomaly_map in maps.items():
+            heat = cv2.normalize(anomaly_map, None, 0, 255, cv2.NORM_MINMAX).astype("uint8")
+            filename = directory / f"{timestamp}_ti{trigger_idx:06d}_cam{cam_id}_map.png"
+            cv2.imwrite(str(filename), cv2.applyColorMap(heat, cv2.COLORMAP_JET))
+        jlog("anomaly_maps_saved", trigger_idx=trigger_idx, cameras=sorted(maps))
+
+    def on_recipe_loaded(
+        sequence: int,
+        recipe_id: int,
+        revision: int,
+        model_mask: int,
+        load_ms: float,
+        swap_ms: float,
+    ) -> None:
         modbus_state.set_model_ready_mask(model_mask)
         modbus_state.set_recipe_loaded(recipe_id, revision, sequence)
         refresh_inspection_ready()
-        jlog("recipe_loaded", recipe_id=recipe_id, revision=revision, sequence=sequence)
+        cache = MODEL_CACHE.stats()
+        jlog(
+            "recipe_loaded",
+            recipe_id=recipe_id,
+            revision=revision,
+            sequence=sequence,
+            load_ms=round(load_ms, 3),
+            swap_ms=round(swap_ms, 3),
+            model_cache_hits=cache.hits,
+            model_cache_misses=cache.misses,
+            model_cache_evictions=cache.evictions,
+            model_cache_mb=round(cache.bytes / 1048576, 1),
+        )
 
     def on_recipe_failed(sequence: int, recipe_id: int, revision: int, message: str) -> None:
         del sequence, recipe_id, revision
         modbus_state.set_error(VisionErrorCode.MODEL_LOADING_FAILED)
+        modbus_state.abort_recipe_change()
         modbus_state.set_inspection_ready(False)
         publisher.fail_safe()
         publish_status()
         jlog("recipe_load_failed", error=message)
 
     inference_thread = QThread()
+    preprocess_executor = start_preprocess_pool(PreprocessPoolConfig.from_mapping(inference_cfg.get("preprocess")))
     inference_worker = BatchInferenceWorker(
         backends=backends,
         input_size=initial_runtime.input_size,
         threshold=initial_runtime.ok_threshold,
         camera_rois=initial_runtime.definition.camera_rois,
-        allow_mock_models=allow_mock_models,
+        batched=bool(inference_cfg.get("batched_forward", True)),
+        maps_on_ng=bool(inference_cfg.get("anomaly_maps_on_ng", False)),
+        cascade=load_cascade(initial_runtime.cascade, num_cams),
+        tiling=initial_runtime.tiling,
+        max_triggers=micro_batch_triggers,
+        max_wait_ms=float(micro_batch_cfg.get("max_wait_ms", 0.0)),
+        early_reject=early_reject.fire if early_reject is not None else None,
+        camera_input_sizes=initial_runtime.camera_input_sizes,
+        camera_thresholds=initial_runtime.camera_thresholds,
+        similarity=load_detector(initial_runtime.similarity),
+        transform_plan=compile_transform_plan(initial_runtime),
+        preprocess_executor=preprocess_executor,
     )
+    try:
+        inference_worker.warm_up()
+    except Exception as exc:
+        jlog("model_warmup_failed", error=f"{type(exc).__name__}: {exc}")
+        model_ready_mask = 0
+    modbus_state.set_model_ready_mask(model_ready_mask)
+    refresh_inspection_ready()
     inference_worker.moveToThread(inference_thread)
     inference_controller = BatchInferenceController(
         on_inference_completed,
         on_inference_failed,
         on_recipe_loaded,
         on_recipe_failed,
+        on_anomaly_maps,
     )
-    inference_controller.requested.connect(inference_worker.process, Qt.QueuedConnection)
-    inference_controller.recipe_requested.connect(inference_worker.reconfigure_recipe, Qt.QueuedConnection)
+    pipeline_cfg = inference_cfg.get("pipeline", {})
+    preprocess_thread = QThread()
+    if pipeline_cfg.get("enabled", True):
+        # Trigger N+1 is preprocessed on its own thread while the model runs trigger N.
+        preprocess_stage = PreprocessStage(inference_worker, depth=int(pipeline_cfg.get("depth", 1)))
+        preprocess_stage.moveToThread(preprocess_thread)
+        inference_controller.drain_requested.connect(preprocess_stage.prepare, Qt.QueuedConnection)
+        preprocess_stage.prepared.connect(inference_worker.infer_prepared, Qt.QueuedConnection)
+        preprocess_thread.start()
+    else:
+        inference_controller.drain_requested.connect(inference_worker.drain, Qt.QueuedConnection)
     inference_worker.completed.connect(inference_controller.completed, Qt.QueuedConnection)
     inference_worker.failed.connect(inference_controller.failed, Qt.QueuedConnection)
+    inference_worker.anomaly_maps.connect(inference_controller.anomaly_maps, Qt.QueuedConnection)
     inference_worker.recipe_loaded.connect(inference_controller.recipe_loaded, Qt.QueuedConnection)
-    inference_worker.recipe_failed.connect(inference_controller.recipe_failed, Qt.QueuedConnection)
     inference_thread.start()
 
+    # Models load and warm up here while the current ones keep serving triggers.
+    recipe_thread = QThread()
+    recipe_loader = RecipeLoader(
+        num_cams,
+        allow_mock_models=allow_mock_models,
+        batched=bool(inference_cfg.get("batched_forward", True)),
+        max_triggers=micro_batch_triggers,
+        service=inference_service,
+    )
+    recipe_loader.moveToThread(recipe_thread)
+    inference_controller.recipe_requested.connect(recipe_loader.load, Qt.QueuedConnection)
+    recipe_loader.loaded.connect(inference_worker.apply_recipe, Qt.QueuedConnection)
+    recipe_loader.failed.connect(inference_controller.recipe_failed, Qt.QueuedConnection)
+    recipe_thread.start()
+
     def request_recipe_load(recipe_id: int, revision: int, sequence: int) -> None:
         try:
             runtime = recipe_repository.load(recipe_id, revision)
@@ -341,6 +585,7 @@ def main() -> None:
         else:
             inference_controller.recipe_requested.emit(runtime, sequence)
             return
+        modbus_state.abort_recipe_change()
         modbus_state.set_inspection_ready(False)
         publisher.fail_safe()
         jlog("recipe_request_rejected", error=error_message)
@@ -396,7 +641,6 @@ def main() -> None:
     modbus_timer.start()
 
     def on_batch(trigger_idx: int, frames: list) -> None:
-        nonlocal pending_batches
         for frame in frames:
             bus.frame_preview.emit(trigger_idx, frame.cam_id, np_to_qimage(frame.image))
         plc = modbus_state.plc_snapshot()
@@ -424,21 +668,31 @@ def main() -> None:
                 error_code=VisionErrorCode.MODBUS_CONNECTION_UNAVAILABLE,
             ))
             return
-        if pending_batches >= MAX_PENDING_INFERENCES:
-            modbus_state.increment_dropped_trigger_count()
-            modbus_state.set_error(VisionErrorCode.RESULT_QUEUE_FULL)
-            publish_inspection_result(InspectionResult(
-                trigger_index=trigger_idx,
-                recipe_id=recipe_id,
-                recipe_revision=revision,
-                result_code=ResultCode.INSPECTION_TIMEOUT,
-                ok=False,
-                error_code=VisionErrorCode.RESULT_QUEUE_FULL,
-            ))
+        budget_ms = cycle_budget.budget_ms(plc)
+        admission = load_shedder.admit(pending_batches, budget_ms)
+        if admission == "drop_oldest":
+            oldest = inference_worker.inbox.pop_oldest()
+            if oldest is None:  # everything pending is already being inferred
+                admission = "drop_newest"
+            else:
+                trigger_deadlines.pop(oldest, None)
+                set_pending(pending_batches - 1)
+                drop_trigger(oldest, ShedReason.DROPPED_OLDEST)
+        if admission == "drop_newest":
+            drop_trigger(trigger_idx, ShedReason.DROPPED_NEWEST)
             return
-        pending_batches += 1
-        modbus_state.set_inspection_busy(True)
-        inference_controller.requested.emit(trigger_idx, frames)
+        set_pending(pending_batches + 1)
+        if budget_ms is not None:
+            trigger_deadlines[trigger_idx] = (time.monotonic(), budget_ms)
+            QTimer.singleShot(math.ceil(budget_ms), lambda: on_trigger_deadline(trigger_idx))
+        # Without a PLC the line state is unknown, so unchanged frames are still scored.
+        line = (
+            LineCondition(plc.line_state, plc.line_speed_x100 / modbus_cfg.line_speed_scale)
+            if modbus_cfg.enabled
+            else None
+        )
+        inference_worker.inbox.put(trigger_idx, frames, line)
+        inference_controller.drain_requested.emit()
 
     coordinator.batch_ready.connect(on_batch)
 
@@ -487,9 +741,18 @@ def main() -> None:
         if modbus_cfg.enabled:
             modbus_worker.stop()
             modbus_worker.join(timeout=3.0)
+        recipe_thread.quit()
+        recipe_thread.wait(3000)
+        preprocess_thread.requestInterruption()
+        preprocess_thread.quit()
+        preprocess_thread.wait(3000)
         inference_thread.requestInterruption()
         inference_thread.quit()
         inference_thread.wait(3000)
+        if preprocess_executor is not None:
+            preprocess_executor.shutdown(wait=False)
+        if inference_service is not None:
+            inference_service.close()
         for camera in cam_workers:
             camera.stop()
         for camera in cam_workers:
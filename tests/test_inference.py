@@ -0,0 +1,1162 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+import importlib.util
+import logging
+from dataclasses import replace
+from pathlib import Path
+from types import SimpleNamespace
+import struct
+import tempfile
+import time
+import unittest
+
+import cv2
+import numpy as np
+import torch
+
+from app.core.camera_manager import CameraFrame
+from app.core.cascade import Cascade, CascadeConfig, CascadeStats, GateModel
+from app.core.corrections import CameraCorrection, camera_raw_inputs, compile_transform_plan
+from app.core.infer_worker import (
+    BatchInferenceWorker,
+    CameraGroup,
+    InferenceBackend,
+    ModelConfig,
+    PreprocessStage,
+    RecipeLoader,
+    TriggerInbox,
+    group_cameras,
+    score_all,
+    warm_up_groups,
+)
+from app.core.modbus.register_map import LineState
+from app.core.preprocessor import (
+    BatchBufferPool,
+    CameraTransform,
+    MixedBatch,
+    TransformPlan,
+    preprocess_batch,
+    to_chw_tensor,
+    to_raw_tensor,
+)
+from app.core.raw_input import NormalizeInput, ToFloat, fold_input_normalization
+from app.core.recipes import RecipeDefinition, RecipeRuntime, camera_index
+from app.core.similarity import FrameChangeDetector, LineCondition, SimilarityConfig
+from app.core.tiling import TilingConfig, select_tiles, tile_grid
+
+
+def mock_backend() -> InferenceBackend:
+    return InferenceBackend(ModelConfig(path="missing.pt", type="mock"), device="cpu")
+
+
+def frames(count: int = 4, seed: int = 0) -> list[CameraFrame]:
+    rng = np.random.default_rng(seed)
+    return [
+        CameraFrame(cam_id, 1, 0.0, 0.0, rng.integers(0, 256, (48, 64), dtype=np.uint8))
+        for cam_id in range(count)
+    ]
+
+
+class TinyNet(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv = torch.nn.Conv2d(3, 4, 3)
+
+    def forward(self, x):
+        features = self.conv(x).relu()
+        return {"pred_score": features.amax(dim=(1, 2, 3)), "anomaly_map": features}
+
+
+class TinyRunner:
+    def __init__(self):
+        self.model = TinyNet().eval()
+
+    def predict(self, image):
+        return self.model(image)
+
+
+def tiny_backend(path: str) -> InferenceBackend:
+    backend = mock_backend()
+    backend.cfg = ModelConfig(path=path, type="anomalib")
+    backend._mode = "anomalib"
+    backend._runner = TinyRunner()
+    return backend
+
+
+class TinyPostProcessor(torch.nn.Module):
+    enable_normalization = True
+    image_min, image_max, image_threshold = torch.tensor(0.0), torch.tensor(4.0), torch.tensor(1.0)
+
+    @staticmethod
+    def _normalize(score, low, high, threshold):
+        return ((score - threshold) / (high - low) + 0.5).clamp(0, 1)
+
+    def forward(self, predictions):
+        if not self.enable_normalization:
+            return predictions
+        score = self._normalize(predictions["pred_score"], self.image_min, self.image_max, self.image_threshold)
+        return {**predictions, "pred_score": score}
+
+
+class TinyAnomalibModule(torch.nn.Module):
+    """Pre-processor, core model and post-processor split like an Anomalib module."""
+
+    def __init__(self):
+        super().__init__()
+        self.pre_processor = torch.nn.Identity()
+        self.model = TinyNet()
+        self.post_processor = TinyPostProcessor()
+
+    def forward(self, image):
+        raw = self.model(self.pre_processor(image))
+        post = self.post_processor
+        score = post._normalize(raw["pred_score"], post.image_min, post.image_max, post.image_threshold)
+        return {"pred_score": score, "anomaly_map": raw["anomaly_map"][:, :1]}
+
+
+class TinyAnomalibRunner:
+    def __init__(self):
+        self.model = TinyAnomalibModule().eval()
+        self.calls = 0
+
+    def predict(self, image):
+        self.calls += 1
+        output = self.model(image)
+        return {"pred_score": output["pred_score"], "anomaly_map": output["anomaly_map"]}
+
+
+def anomalib_backend(path: str) -> InferenceBackend:
+    backend = tiny_backend(path)
+    backend._runner = TinyAnomalibRunner()
+    return backend
+
+
+class PreprocessTests(unittest.TestCase):
+    def test_lookup_table_path_matches_float_conversion(self):
+        mean, std = np.float32([0.485, 0.456, 0.406]), np.float32([0.229, 0.224, 0.225])
+        rng = np.random.default_rng(3)
+        for shape, roi in (((96, 128), None), ((96, 128), (8, 4, 90, 70)), ((60, 80, 3), None)):
+            image = rng.integers(0, 256, shape, dtype=np.uint8)
+            crop = image if roi is None else image[roi[1]:roi[1] + roi[3], roi[0]:roi[0] + roi[2]]
+            rgb = cv2.cvtColor(crop, cv2.COLOR_GRAY2RGB) if crop.ndim == 2 else crop
+            expected = (cv2.resize(rgb, (40, 30), interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0 - mean) / std
+            np.testing.assert_array_equal(to_chw_tensor(image, (40, 30), roi=roi), np.moveaxis(expected, -1, 0))
+
+
+    def test_pooled_batches_match_and_are_recycled(self):
+        pool = BatchBufferPool((32, 32), rows=4)
+        batch = frames()
+        pooled = preprocess_batch(batch, (32, 32), pool=pool)
+        np.testing.assert_array_equal(pooled, preprocess_batch(batch, (32, 32)))
+        self.assertTrue(pooled.flags.c_contiguous)
+        pool.release(pooled)
+        again = preprocess_batch(batch[:2], (32, 32), pool=pool)
+        self.assertIs(again.base, pooled.base)
+        self.assertIsNot(preprocess_batch(batch, (32, 32), pool=pool).base, pooled.base)  # still lent
+        pool.configure((24, 24))
+        pool.release(again)                                   # lent at the old size: dropped
+        self.assertEqual(preprocess_batch(batch, (24, 24), pool=pool).shape, (4, 3, 24, 24))
+
+        backend = mock_backend()
+        seen: list[np.ndarray] = []
+        original = backend.predict
+        backend.predict = lambda rows: seen.append(rows) or original(rows)
+        worker = BatchInferenceWorker({cam_id: backend for cam_id in range(4)}, (32, 32), 0.5)
+        worker.process(0, batch)
+        worker.process(1, frames(seed=1))
+        self.assertIs(seen[0].base, seen[1].base)
+
+
+    def test_compiled_plan_undistorts_and_removes_shading(self):
+        rng = np.random.default_rng(4)
+        scene = cv2.GaussianBlur(rng.integers(40, 200, (60, 80), dtype=np.uint8), (9, 9), 0)
+        flat = np.tile(np.linspace(100.0, 200.0, 80, dtype=np.float32), (60, 1))
+        shaded = np.clip(scene * (flat / flat.mean()), 0, 255).round().astype(np.uint8)
+        roi = (8, 6, 64, 48)
+        with tempfile.TemporaryDirectory() as temporary:
+            np.save(Path(temporary) / "flat.npy", flat)
+            corrections = {
+                0: CameraCorrection(flat_field=str(Path(temporary) / "flat.npy")),
+                1: CameraCorrection(((50.0, 0.0, 40.0), (0.0, 50.0, 30.0), (0.0, 0.0, 1.0)), (0.0,) * 5, (80, 60)),
+            }
+            runtime = RecipeRuntime(
+                definition=RecipeDefinition(0, "plan", 0, "", "", {0: roi, 1: roi}, {}, corrections),
+                models={},
+                input_size=(32, 24),
+                ok_threshold=0.5,
+            )
+            plan = compile_transform_plan(runtime)
+        expected = to_chw_tensor(scene, (32, 24), roi=roi)
+        np.testing.assert_allclose(plan.apply(0, shaded), expected, atol=0.05)
+        self.assertGreater(np.abs(to_chw_tensor(shaded, (32, 24), roi=roi) - expected).max(), 0.5)
+        np.testing.assert_allclose(plan.apply(1, scene), expected, atol=1e-5)  # no distortion: same crop
+        np.testing.assert_array_equal(plan.apply(2, scene), to_chw_tensor(scene, (32, 24)))
+        with self.assertRaises(ValueError):
+            plan.apply(1, scene[:50])
+
+    def test_models_keyed_by_name_or_index_map_to_the_same_cameras(self):
+        runtime = RecipeRuntime(
+            definition=RecipeDefinition(0, "keys", 0, "", "", {}, {}),
+            models={"cam1": {"path": "a.onnx", "raw_input": "uint8"}, "2": {"path": "c.onnx"}},
+            input_size=(16, 16),
+            ok_threshold=0.5,
+        )
+        self.assertEqual((camera_index("cam3"), camera_index("2")), (2, 2))
+        self.assertEqual([runtime.camera_model(cam_id) for cam_id in range(3)][1:], [None, {"path": "c.onnx"}])
+        self.assertEqual(camera_raw_inputs(runtime), {0: "uint8"})
+        self.assertEqual(compile_transform_plan(runtime).apply(0, frames()[0].image).shape, (1, 16, 16))
+        with self.assertRaises(ValueError):
+            camera_index("left")
+
+    def test_parallel_preprocessing_matches_serial_and_times_each_camera(self):
+        batch = frames()
+        rois = {1: (4, 4, 40, 30)}
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            timings: dict[int, float] = {}
+            parallel = preprocess_batch(batch, (32, 32), camera_rois=rois, executor=executor, timings=timings)
+            np.testing.assert_array_equal(parallel, preprocess_batch(batch, (32, 32), camera_rois=rois))
+            self.assertEqual(set(timings), {0, 1, 2, 3})
+            worker = BatchInferenceWorker(
+                {cam_id: mock_backend() for cam_id in range(4)}, (32, 32), 0.5, preprocess_executor=executor
+            )
+            prepared = worker.prepare_triggers([(0, batch), (1, frames(seed=1))])
+            self.assertIsNone(prepared.error)
+            self.assertEqual(set(prepared.camera_ms), {0, 1, 2, 3})
+
+    def test_raw_input_cameras_are_only_cropped_and_resized(self):
+        batch = frames()
+        rois = {1: (4, 4, 40, 30)}
+        plan = TransformPlan.plain((32, 32), rois, camera_raw_inputs={1: "uint8", 2: "float16"})
+        pool = BatchBufferPool((32, 32), 4)
+        prepared = preprocess_batch(batch, pool=pool, plan=plan)
+        self.assertIsInstance(prepared, MixedBatch)
+        resized = cv2.resize(batch[1].image[4:34, 4:44], (32, 32), interpolation=cv2.INTER_AREA)
+        np.testing.assert_array_equal(prepared[1][0], resized)
+        self.assertEqual((prepared[1].dtype, prepared[2].dtype), (np.uint8, np.float16))
+        self.assertEqual(prepared[[0, 3]].shape, (2, 3, 32, 32))
+        normalized = NormalizeInput()(torch.from_numpy(prepared[[1]])).numpy()
+        np.testing.assert_allclose(normalized[0], to_chw_tensor(batch[1].image, (32, 32), roi=rois[1]), atol=1e-5)
+
+
+class ScoreOnlyTests(unittest.TestCase):
+    def test_score_only_path_matches_full_output(self):
+        backend = anomalib_backend("score_only.pt")
+        batch = np.random.default_rng(2).random((2, 3, 16, 16), dtype=np.float32)
+        first = backend.predict(batch)
+        self.assertTrue(backend._score_only)
+        calls = backend._runner.calls
+        fast = backend.predict(batch)
+        self.assertEqual(backend._runner.calls, calls)
+        self.assertNotIn("anomaly_map", fast)
+        np.testing.assert_allclose(fast["pred_score"], first["pred_score"].numpy(), rtol=1e-6)
+
+    def test_mismatching_score_only_path_falls_back(self):
+        backend = anomalib_backend("mismatch.pt")
+        backend._runner.model.post_processor.enable_normalization = False
+        batch = np.random.default_rng(3).random((1, 3, 16, 16), dtype=np.float32)
+        with self.assertLogs("aiinsp", logging.WARNING) as logs:
+            backend.predict(batch)
+        self.assertIs(backend._score_only, False)
+        self.assertIn('"score_only_disabled"', logs.output[0])
+        self.assertIn("anomaly_map", backend.predict(batch))
+
+    def test_prepared_input_skips_a_no_op_pre_processor(self):
+        backend = anomalib_backend("identity.pt")
+        module = backend._runner.model
+        seen: list[tuple[int, ...]] = []
+        module.pre_processor.register_forward_hook(lambda _m, inputs, _out: seen.append(tuple(inputs[0].shape)))
+        batch = np.random.default_rng(4).random((2, 3, 16, 16), dtype=np.float32)
+        reference = backend.predict_full(batch)["pred_score"].numpy()
+        for _ in range(3):
+            scores = backend.predict(batch)["pred_score"]
+        np.testing.assert_array_equal(scores, reference)
+        self.assertEqual(backend._skip_pre_processor, {(3, 16, 16): True})
+        self.assertEqual(len(seen), 3)  # reference, then the first predict (full path + check) only
+
+    def test_pre_processor_that_changes_input_is_kept(self):
+        backend = anomalib_backend("rescale.pt")
+        backend._runner.model.pre_processor = torch.nn.Upsample(scale_factor=2.0)
+        batch = np.random.default_rng(5).random((1, 3, 16, 16), dtype=np.float32)
+        reference = backend.predict_full(batch)["pred_score"].numpy()
+        backend.predict(batch)
+        np.testing.assert_array_equal(backend.predict(batch)["pred_score"], reference)
+        self.assertEqual(backend._skip_pre_processor, {(3, 16, 16): False})
+
+    def test_ng_cameras_get_maps_after_the_verdict(self):
+        backends = {cam_id: anomalib_backend(f"cam{cam_id}.pt") for cam_id in range(2)}
+        worker = BatchInferenceWorker(backends, (16, 16), 0.0, batched=False, maps_on_ng=True)
+        events: list[str] = []
+        maps: list[dict] = []
+        worker.completed.connect(lambda *_args: events.append("completed"))
+        worker.anomaly_maps.connect(lambda _ti, cam_maps: events.append("maps") or maps.append(cam_maps))
+        worker.process(1, frames(2))
+        self.assertEqual(events, ["completed", "maps"])
+        self.assertEqual(set(maps[0]), {0, 1})
+        self.assertEqual(maps[0][0].shape, (14, 14))
+
+
+class CascadeTests(unittest.TestCase):
+    def prepared(self, count: int, seed: int, defect: bool = False) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        images = rng.normal(120, 3, (count, 48, 64)).clip(0, 255).astype(np.uint8)
+        if defect:
+            images[:, 10:20, 20:30] = 255
+        return np.stack([to_chw_tensor(image, (32, 32)) for image in images])
+
+    def test_gate_separates_ok_from_defects(self):
+        gate = GateModel.fit(self.prepared(40, 0))
+        with tempfile.TemporaryDirectory() as tmp:
+            gate.save(Path(tmp) / "cam1.npz")
+            gate = GateModel.load(Path(tmp) / "cam1.npz")
+        self.assertLess(max(gate.score(chw) for chw in self.prepared(10, 1)), 2.0)
+        self.assertGreater(min(gate.score(chw) for chw in self.prepared(10, 2, defect=True)), 10.0)
+
+    def test_cleared_frames_skip_the_full_model(self):
+        calls: list[int] = []
+        backend = mock_backend()
+        original = backend.predict
+        backend.predict = lambda batch: calls.append(len(batch)) or original(batch)
+        gate = GateModel.fit(self.prepared(40, 0))
+        config = CascadeConfig(enabled=True, clear_ok_below=1e9, audit_every=3)
+        cascade = Cascade({0: gate}, config)
+        worker = BatchInferenceWorker({0: backend, 1: backend}, (32, 32), 5.0, batched=False, cascade=cascade)
+        emitted: list[list[float]] = []
+        gate_masks: list[int] = []
+        worker.completed.connect(
+            lambda _ti, _frames, scores, *rest: (emitted.append(scores), gate_masks.append(rest[4]))
+        )
+        for trigger_idx in range(3):
+            worker.process(trigger_idx, frames(2, seed=trigger_idx))
+        self.assertEqual([scores[0] for scores in emitted[:2]], [0.0, 0.0])
+        self.assertEqual(gate_masks, [1, 1, 0])  # the audited frame has a model score
+        self.assertNotEqual(emitted[2][0], 0.0)  # third cleared frame is audited by the full model
+        self.assertEqual(len(calls), 3 + 1)
+        self.assertEqual(cascade.stats(), CascadeStats(gate_ok=2, full_model=3, audits=1, audit_misses=0))
+
+    def test_degraded_passes_clear_through_the_gate_and_report_it(self):
+        from app.core.modbus.register_map import ShedReason
+
+        gate = GateModel.fit(self.prepared(40, 0))
+        config = CascadeConfig(enabled=True, clear_ok_below=1e-9, audit_every=1, degraded_clear_ok_below=1e9)
+        cascade = Cascade({0: gate}, config)
+        worker = BatchInferenceWorker(
+            {0: mock_backend(), 1: mock_backend()}, (32, 32), 5.0, batched=False, cascade=cascade
+        )
+        emitted: list[tuple] = []
+        worker.completed.connect(lambda _ti, _frames, scores, *rest: emitted.append((scores[0], rest[-1])))
+        worker.process(0, frames(2))
+        worker.set_load_shedding(True)
+        worker.process(1, frames(2))
+        self.assertNotEqual(emitted[0][0], 0.0)
+        self.assertEqual(emitted, [(emitted[0][0], ShedReason.NONE), (0.0, ShedReason.DEGRADED)])
+        self.assertEqual(cascade.stats().audits, 0)
+
+        plain = BatchInferenceWorker({0: mock_backend(), 1: mock_backend()}, (32, 32), 5.0)
+        reasons: list[int] = []
+        plain.completed.connect(lambda *args: reasons.append(args[-1]))
+        plain.set_load_shedding(True)  # nothing to degrade without tiling or a cascade
+        plain.process(0, frames(2))
+        plain.set_load_shedding(False, frozenset({1}))
+        plain.process(1, frames(2))
+        self.assertEqual(reasons, [ShedReason.NONE, ShedReason.CAMERAS_BYPASSED])
+
+
+class TilingTests(unittest.TestCase):
+    def test_tiles_cover_the_roi_with_overlap(self):
+        tiles = tile_grid(100, 40, (32, 32), 0.25)
+        self.assertEqual(sorted({x for x, *_ in tiles}), [0, 24, 48, 68])
+        self.assertEqual(sorted({y for _, y, *_ in tiles}), [0, 8])
+        self.assertEqual(tile_grid(20, 20, (32, 32), 0.5), [(0, 0, 20, 20)])
+
+    def test_coarse_map_picks_tiles(self):
+        tiles = tile_grid(64, 32, (32, 32), 0.0)
+        anomaly_map = np.zeros((8, 16), dtype=np.float32)
+        anomaly_map[2, 12] = 0.9
+        self.assertEqual(select_tiles(anomaly_map, (64, 32), tiles, 0.3, 8), [1])
+        self.assertEqual(select_tiles(None, (64, 32), tiles, 0.3, 1), [0])
+
+    def test_camera_score_is_max_over_picked_tiles(self):
+        backend = anomalib_backend("tiled.pt")
+        frame = CameraFrame(0, 1, 0.0, 0.0, np.random.default_rng(6).integers(0, 256, (40, 70), dtype=np.uint8))
+        roi = (4, 2, 60, 36)
+        worker = BatchInferenceWorker({0: backend}, (16, 16), 2.0, camera_rois={0: roi},
+                                      tiling=TilingConfig(enabled=True, select_above=-1.0, max_tiles=3))
+        emitted: list[list[float]] = []
+        worker.completed.connect(lambda _ti, _frames, scores, *_rest: emitted.append(scores))
+        worker.process(1, [frame])
+        coarse_map = backend.anomaly_map(to_chw_tensor(frame.image, (16, 16), roi=roi)[np.newaxis])[0, 0]
+        tiles = tile_grid(60, 36, (16, 16), 0.25)
+        picked = select_tiles(coarse_map, (60, 36), tiles, -1.0, 3)
+        expected = backend.predict(CameraTransform((16, 16), roi).tiles(frame.image, [tiles[index] for index in picked]))
+        self.assertAlmostEqual(emitted[0][0], float(expected["pred_score"].max()), places=5)
+
+    def test_tiles_get_the_camera_corrections(self):
+        rng = np.random.default_rng(8)
+        scene = cv2.GaussianBlur(rng.integers(40, 200, (60, 80), dtype=np.uint8), (9, 9), 0)
+        flat = np.tile(np.linspace(100.0, 200.0, 80, dtype=np.float32), (60, 1))
+        shaded = np.clip(scene * (flat / flat.mean()), 0, 255).round().astype(np.uint8)
+        roi = (8, 6, 64, 48)
+        with tempfile.TemporaryDirectory() as temporary:
+            np.save(Path(temporary) / "flat.npy", flat)
+            correction = CameraCorrection(flat_field=str(Path(temporary) / "flat.npy"))
+            runtime = RecipeRuntime(
+                definition=RecipeDefinition(0, "tiles", 0, "", "", {0: roi}, {}, {0: correction}),
+                models={},
+                input_size=(16, 16),
+                ok_threshold=0.5,
+            )
+            transform = compile_transform_plan(runtime).camera(0)
+        tiles = tile_grid(*transform.region_size(shaded.shape), (16, 16), 0.25)
+        uncorrected = CameraTransform((16, 16), roi)
+        expected = uncorrected.tiles(scene, tiles)
+        np.testing.assert_allclose(transform.tiles(shaded, tiles), expected, atol=0.1)
+        self.assertGreater(np.abs(uncorrected.tiles(shaded, tiles) - expected).max(), 0.5)
+
+    def test_tile_batches_are_warmed_and_map_less_models_refused(self):
+        shapes: list[tuple[int, ...]] = []
+        backend = tiny_backend("tiles.pt")
+        original = backend._runner.predict
+        backend._runner.predict = lambda image: shapes.append(tuple(image.shape)) or original(image)
+        tiling = TilingConfig(enabled=True, max_tiles=3)
+        warm_up_groups(group_cameras({0: backend}), (16, 16), tiling=tiling)
+        self.assertEqual({shape[0] for shape in shapes}, {1, 2, 3})
+        scores_only = tiny_backend("scores.pt")
+        scores_only._runner.predict = lambda image: {"pred_score": original(image)["pred_score"]}
+        with self.assertRaises(ValueError):
+            warm_up_groups(group_cameras({0: scores_only}), (16, 16), tiling=tiling)
+
+
+class BatchedInferenceTests(unittest.TestCase):
+    def run_worker(self, worker: BatchInferenceWorker, batch: list[CameraFrame]) -> list[float]:
+        emitted: list[list[float]] = []
+        worker.completed.connect(lambda _ti, _frames, scores, *_rest: emitted.append(scores))
+        worker.failed.connect(lambda _ti, message: self.fail(message))
+        worker.process(1, batch)
+        return emitted[0]
+
+    def test_compatible_cameras_share_one_group(self):
+        groups = group_cameras({cam_id: mock_backend() for cam_id in range(4)})
+        self.assertEqual([group.cam_ids for group in groups], [(0, 1, 2, 3)])
+        self.assertEqual(groups[0].mode, "shared")
+        self.assertEqual(len(group_cameras({0: mock_backend(), 1: mock_backend()}, batched=False)), 2)
+
+    def test_batched_scores_match_serial_scores(self):
+        backends = {cam_id: mock_backend() for cam_id in range(4)}
+        batch = frames()
+        batched = self.run_worker(BatchInferenceWorker(backends, (32, 32), 0.5), batch)
+        serial = self.run_worker(BatchInferenceWorker(backends, (32, 32), 0.5, batched=False), batch)
+        np.testing.assert_allclose(batched, serial, rtol=1e-6)
+
+    def test_stacked_weights_keep_per_camera_models(self):
+        backends = [tiny_backend(f"cam{cam_id}.pt") for cam_id in range(4)]
+        group = CameraGroup(range(4), backends)
+        self.assertEqual(group.mode, "ensemble")
+        batch = np.random.default_rng(1).random((4, 3, 16, 16), dtype=np.float32)
+        expected = []
+        with torch.no_grad():
+            for index, backend in enumerate(backends):
+                expected.append(float(backend.module(torch.from_numpy(batch[index:index + 1]))["pred_score"]))
+        np.testing.assert_allclose(group.predict_scores(batch), expected, rtol=1e-5)
+        self.assertEqual(group.mode, "ensemble")
+
+    def test_stacked_weights_that_disagree_fall_back_to_serial(self):
+        backends = [tiny_backend(f"cam{cam_id}.pt") for cam_id in range(2)]
+        group = CameraGroup(range(2), backends)
+        forward, params, buffers = group._ensemble
+        group._ensemble = (lambda p, b, images: forward(p, b, images) + 1.0, params, buffers)
+        batch = np.random.default_rng(7).random((2, 3, 16, 16), dtype=np.float32)
+        with torch.no_grad():
+            expected = [
+                float(backend.module(torch.from_numpy(batch[index:index + 1]))["pred_score"])
+                for index, backend in enumerate(backends)
+            ]
+        np.testing.assert_allclose(group.predict_scores(batch), expected, rtol=1e-5)
+        self.assertEqual(group.mode, "serial")
+
+    def test_cameras_keep_their_own_input_size_and_threshold(self):
+        backend = tiny_backend("shared.pt")
+        backends = {cam_id: backend for cam_id in range(4)}
+        batch = frames()
+        worker = BatchInferenceWorker(
+            backends, (16, 16), 0.0, camera_input_sizes={2: (24, 24)}, camera_thresholds={2: 100.0}
+        )
+        self.assertEqual([group.cam_ids for group in worker._groups], [(0, 1, 3), (2,)])
+        results: list[tuple] = []
+        worker.completed.connect(lambda _ti, _frames, scores, _fused, ok, *_rest: results.append((scores, ok)))
+        worker.failed.connect(lambda _ti, message: self.fail(message))
+        worker.process(1, batch)
+        expected = [
+            float(backend.module(torch.from_numpy(to_chw_tensor(frame.image, size)[np.newaxis]))["pred_score"])
+            for frame, size in zip(batch, [(16, 16), (16, 16), (24, 24), (16, 16)])
+        ]
+        np.testing.assert_allclose(results[0][0], expected, rtol=1e-5)
+        self.assertFalse(results[0][1])
+        self.assertEqual((worker.camera_threshold(2), worker.camera_threshold(0)), (100.0, 0.0))
+        worker.process(2, [batch[2]])
+        self.assertTrue(results[1][1])
+
+    def test_warm_up_covers_every_batch_size_used(self):
+        shapes: list[tuple[int, ...]] = []
+        backend = tiny_backend("shared.pt")
+        backend.cfg.warmup_iterations = 2
+        original = backend._runner.predict
+        backend._runner.predict = lambda image: shapes.append(tuple(image.shape)) or original(image)
+        worker = BatchInferenceWorker({0: backend, 1: backend, 2: backend}, (16, 16), 0.5)
+        timings = worker.warm_up()
+        self.assertEqual(set(timings), {0, 1, 2})
+        self.assertEqual(shapes.count((1, 3, 16, 16)), 2)
+        self.assertEqual(shapes.count((3, 3, 16, 16)), 2)
+        shapes.clear()
+        CameraGroup(range(3), [backend] * 3).warmup((24, 24), max_triggers=3)
+        self.assertEqual(sorted({shape[0] for shape in shapes}), [1, 2, 3, 6, 9])
+
+    def test_recipe_loads_off_thread_and_swaps_at_once(self):
+        runtime = RecipeRuntime(
+            definition=RecipeDefinition(5, "small", 2, "", "", {0: (0, 0, 32, 32)}, {}),
+            models={f"cam{cam_id + 1}": {"path": "missing.pt", "type": "mock"} for cam_id in range(4)},
+            input_size=(24, 24),
+            ok_threshold=0.7,
+        )
+        loader = RecipeLoader(4, allow_mock_models=True)
+        loaded: list = []
+        loader.loaded.connect(loaded.append)
+        loader.failed.connect(lambda *args: self.fail(args))
+        loader.load(runtime, 9)
+        worker = BatchInferenceWorker({cam_id: mock_backend() for cam_id in range(4)}, (32, 32), 0.5)
+        events: list[tuple] = []
+        worker.recipe_loaded.connect(lambda *args: events.append(args))
+        worker.apply_recipe(loaded[0])
+        self.assertEqual(events[0][:4], (9, 5, 2, 0xF))
+        self.assertGreaterEqual(events[0][5], 0.0)
+        self.assertEqual((worker._input_size, worker._threshold), ((24, 24), 0.7))
+
+        rejected: list[tuple] = []
+        strict = RecipeLoader(4, allow_mock_models=False)
+        strict.failed.connect(lambda *args: rejected.append(args))
+        strict.load(runtime, 10)
+        self.assertEqual(rejected[0][:3], (10, 5, 2))
+
+
+class MicroBatchTests(unittest.TestCase):
+    def drain(self, worker: BatchInferenceWorker, triggers: list[list[CameraFrame]]) -> list[tuple[int, list[float]]]:
+        emitted: list[tuple[int, list[float]]] = []
+        worker.completed.connect(lambda trigger_idx, _frames, scores, *_rest: emitted.append((trigger_idx, scores)))
+        worker.failed.connect(lambda _ti, message: self.fail(message))
+        for trigger_idx, batch in enumerate(triggers):
+            worker.inbox.put(trigger_idx, batch)
+        while len(worker.inbox):
+            worker.drain()
+        return emitted
+
+    def test_inbox_takes_the_oldest_triggers(self):
+        inbox = TriggerInbox()
+        self.assertEqual(inbox.take(4), [])
+        for trigger_idx in range(5):
+            inbox.put(trigger_idx, [])
+        self.assertEqual([item[0] for item in inbox.take(3, max_wait_s=0.001)], [0, 1, 2])
+        self.assertEqual([item[0] for item in inbox.take(3, max_wait_s=0.001)], [3, 4])
+
+    def test_backlog_runs_in_one_pass_and_results_keep_order(self):
+        backend = mock_backend()
+        sizes: list[int] = []
+        original = backend.predict
+        backend.predict = lambda batch: sizes.append(len(batch)) or original(batch)
+        worker = BatchInferenceWorker({cam_id: backend for cam_id in range(4)}, (32, 32), 0.5, max_triggers=4)
+        triggers = [frames(seed=seed) for seed in range(3)]
+        emitted = self.drain(worker, triggers)
+        self.assertEqual(sizes, [12])
+        self.assertEqual([trigger_idx for trigger_idx, _scores in emitted], [0, 1, 2])
+        reference = BatchInferenceWorker({cam_id: mock_backend() for cam_id in range(4)}, (32, 32), 0.5)
+        for (_trigger_idx, scores), batch in zip(emitted, triggers):
+            reference_scores: list[list[float]] = []
+            reference.completed.connect(lambda _ti, _frames, values, *_rest: reference_scores.append(values))
+            reference.process(0, batch)
+            np.testing.assert_allclose(scores, reference_scores[-1], rtol=1e-6)
+
+    def test_stacked_and_serial_groups_coalesce_per_camera(self):
+        backends = {cam_id: tiny_backend(f"cam{cam_id}.pt") for cam_id in range(4)}
+        triggers = [frames(seed=seed) for seed in range(2)]
+        for batched in (True, False):
+            worker = BatchInferenceWorker(backends, (16, 16), 100.0, batched=batched, max_triggers=2)
+            coalesced = self.drain(worker, triggers)
+            single = BatchInferenceWorker(backends, (16, 16), 100.0, batched=batched)
+            one_by_one = self.drain(single, triggers)
+            for (_a, left), (_b, right) in zip(coalesced, one_by_one):
+                np.testing.assert_allclose(left, right, rtol=1e-5)
+
+
+class CycleBudgetTests(unittest.TestCase):
+    def test_deadline_follows_line_speed(self):
+        from app.core.cycle_budget import CycleBudget, CycleBudgetConfig, cycle_time_ms
+        from app.core.modbus.state import PlcInput
+
+        plc = PlcInput(line_speed_x100=50_000, product_length_mm=100)  # 500 mm/s
+        self.assertAlmostEqual(cycle_time_ms(plc), 200.0)
+        self.assertIsNone(cycle_time_ms(PlcInput(product_length_mm=100)))
+        budget = CycleBudget(CycleBudgetConfig(budget_fraction=0.5, min_budget_ms=20.0))
+        self.assertAlmostEqual(budget.budget_ms(plc), 100.0)
+        self.assertAlmostEqual(budget.budget_ms(PlcInput(line_speed_x100=65_535, product_length_mm=1)), 20.0)
+        self.assertAlmostEqual(cycle_time_ms(PlcInput(line_speed_x100=5_000, product_length_mm=100), 10), 200.0)
+        tenths = CycleBudget(CycleBudgetConfig(budget_fraction=0.5, min_budget_ms=20.0), line_speed_scale=10)
+        self.assertAlmostEqual(tenths.budget_ms(PlcInput(line_speed_x100=5_000, product_length_mm=100)), 100.0)
+
+    def test_warnings_use_hysteresis(self):
+        from app.core.cycle_budget import CycleBudget, CycleBudgetConfig
+        from app.core.modbus.register_map import VisionWarningCode
+
+        slow = VisionWarningCode.INFERENCE_SLOWER_THAN_CYCLE_TIME
+        budget = CycleBudget(CycleBudgetConfig(slow_raise_after=2, slow_clear_after=2))
+        self.assertEqual(budget.record(95.0, 50.0, 100.0), [])
+        self.assertEqual(budget.record_timeout(), [(slow, True)])
+        self.assertEqual(budget.record(80.0, 50.0, 100.0), [])   # between the levels: keeps the warning
+        self.assertEqual(budget.record(50.0, 40.0, 100.0), [])
+        self.assertEqual(budget.record(50.0, 40.0, 100.0), [(slow, False)])
+        self.assertEqual(budget.stats().timeouts, 1)
+
+        queue = VisionWarningCode.HIGH_INFERENCE_QUEUE_DEPTH
+        self.assertEqual([budget.observe_queue(depth) for depth in (3, 4, 5, 2, 1, 4)], [
+            [], [(queue, True)], [], [], [(queue, False)], [(queue, True)],
+        ])
+
+    def test_abandoned_triggers_are_skipped(self):
+        worker = BatchInferenceWorker({cam_id: mock_backend() for cam_id in range(4)}, (32, 32), 0.5, max_triggers=4)
+        emitted: list[tuple[int, list[float]]] = []
+        worker.completed.connect(lambda trigger_idx, _frames, scores, *_rest: emitted.append((trigger_idx, scores)))
+        for trigger_idx in range(4):
+            worker.inbox.put(trigger_idx, frames(seed=trigger_idx))
+        self.assertTrue(worker.inbox.abandon(3))             # still queued: removed
+        prepared = worker.prepare_triggers(worker.take_triggers())
+        self.assertFalse(worker.inbox.abandon(1))            # already taken: skipped before inference
+        worker.infer_prepared(prepared)
+        self.assertEqual([trigger_idx for trigger_idx, _scores in emitted], [0, 2])
+        reference: list[list[float]] = []
+        worker.completed.connect(lambda _ti, _frames, scores, *_rest: reference.append(scores))
+        worker.process(2, frames(seed=2))
+        np.testing.assert_allclose(emitted[1][1], reference[0], rtol=1e-6)
+        self.assertEqual(worker.inbox.pop_abandoned([1]), set())
+
+
+class SimilaritySkipTests(unittest.TestCase):
+    def test_unchanged_frames_reuse_the_last_model_score(self):
+        backend = anomalib_backend("shared.pt")
+        config = SimilarityConfig(enabled=True, max_reuse=2)
+        worker = BatchInferenceWorker(
+            {cam_id: backend for cam_id in range(4)}, (16, 16), 100.0, similarity=FrameChangeDetector(config)
+        )
+        emitted: list[tuple] = []
+        worker.completed.connect(lambda _ti, _frames, scores, *rest: emitted.append((scores, rest[3])))
+        worker.failed.connect(lambda _ti, message: self.fail(message))
+        stopped = LineCondition(LineState.STOPPED)
+
+        def score(trigger_idx, trigger_frames, line=stopped):
+            worker.inbox.put(trigger_idx, trigger_frames, line)
+            worker.drain()
+
+        still = frames()
+        score(0, still)
+        calls = backend._runner.calls
+        score(1, still)
+        self.assertEqual(backend._runner.calls, calls)
+        self.assertEqual(emitted[1], (emitted[0][0], 0xF))
+        moved = list(still)
+        moved[1] = CameraFrame(1, 1, 0.0, 0.0, 255 - still[1].image)
+        score(2, moved)
+        self.assertEqual(emitted[2][1], 0xF & ~(1 << 1))
+        score(3, moved)                           # cameras 0, 2 and 3 reach max_reuse
+        self.assertEqual(emitted[3][1], 1 << 1)
+        self.assertEqual(worker._similarity.stats().forced, 3)
+        score(4, moved, None)                     # no PLC line state
+        self.assertEqual(emitted[4][1], 0)
+
+    def test_running_line_always_runs_the_model(self):
+        backend = anomalib_backend("shared.pt")
+        config = SimilarityConfig(enabled=True, max_line_speed_mm_s=50.0)
+        worker = BatchInferenceWorker(
+            {cam_id: backend for cam_id in range(4)}, (16, 16), 100.0, similarity=FrameChangeDetector(config)
+        )
+        reused: list[int] = []
+        worker.completed.connect(lambda *args: reused.append(args[6]))
+        passes: list[int] = []
+        backend._runner.model.model.register_forward_hook(lambda *_args: passes.append(1))
+        still = frames()
+        lines = [
+            LineCondition(LineState.AUTOMATIC_PRODUCTION, 120.0),
+            LineCondition(LineState.AUTOMATIC_PRODUCTION, 120.0),
+            LineCondition(LineState.PRODUCT_CHANGEOVER),
+            LineCondition(LineState.AUTOMATIC_PRODUCTION, 20.0),  # slow production
+            LineCondition(LineState.SETUP),
+        ]
+        for trigger_idx, line in enumerate(lines):
+            before = len(passes)
+            worker.inbox.put(trigger_idx, still, line)
+            worker.drain()
+            self.assertEqual(len(passes) > before, trigger_idx < 3)
+        self.assertEqual(reused, [0, 0, 0, 0xF, 0xF])
+
+    def test_perceptual_hash_ignores_noise_but_not_changes(self):
+        detector = FrameChangeDetector(SimilarityConfig(enabled=True, method="phash"))
+        chw = to_chw_tensor(frames(1)[0].image, (64, 64))
+        noisy = chw + np.random.default_rng(2).normal(0.0, 0.01, chw.shape).astype(np.float32)
+        signature = detector.signature(chw)
+        self.assertEqual(detector.change(detector.signature(noisy), signature), 0.0)
+        self.assertGreater(detector.change(detector.signature(chw[:, ::-1]), signature), 2.0)
+
+
+class LoadSheddingTests(unittest.TestCase):
+    def test_limit_adapts_to_pass_time_and_policy_picks_the_victim(self):
+        from app.core.load_shedding import LoadShedder, LoadSheddingConfig
+
+        shedder = LoadShedder(LoadSheddingConfig(), max_triggers=4, default_max_pending=2)
+        self.assertEqual(shedder.admit(7, None), "accept")
+        self.assertEqual(shedder.admit(8, None), "drop_newest")
+        shedder.observe_pass(40.0)
+        self.assertEqual(shedder.admit(3, 50.0), "accept")       # one pass fits: limit 4
+        self.assertEqual(shedder.limit, 4)
+        self.assertEqual(shedder.admit(4, 50.0), "drop_newest")
+        self.assertEqual(shedder.admit(7, 500.0), "accept")      # capped at max_pending
+        self.assertEqual(shedder.limit, 8)
+        oldest = LoadShedder(LoadSheddingConfig(policy="drop_oldest", max_pending=2))
+        self.assertEqual(oldest.admit(2, None), "drop_oldest")
+        with self.assertRaises(ValueError):
+            LoadSheddingConfig.from_mapping({"policy": "bypass_cameras"})
+
+    def test_degraded_level_uses_hysteresis(self):
+        from app.core.load_shedding import LoadShedder, LoadSheddingConfig
+
+        shedder = LoadShedder(LoadSheddingConfig(policy="bypass_cameras", max_pending=8, non_critical_cameras=(3,)))
+        self.assertEqual([shedder.update(depth) for depth in (3, 4, 3, 2)], [False, True, False, True])
+        self.assertEqual(shedder.bypassed_cameras, frozenset())
+        shedder.update(4)
+        self.assertEqual(shedder.bypassed_cameras, frozenset({3}))
+        self.assertFalse(shedder.degraded)
+
+    def test_worker_skips_bypassed_cameras_and_tiles_when_degraded(self):
+        backends = {cam_id: anomalib_backend(f"cam{cam_id}.pt") for cam_id in range(4)}
+        worker = BatchInferenceWorker(backends, (16, 16), 100.0, tiling=TilingConfig(enabled=True, select_above=0.0))
+        emitted: list[list[float]] = []
+        worker.completed.connect(lambda _ti, _frames, scores, *_rest: emitted.append(scores))
+        worker.failed.connect(lambda _ti, message: self.fail(message))
+        batch = frames()
+        worker.process(0, batch)
+        worker.set_load_shedding(True, frozenset({3}))
+        worker.process(1, batch)
+        coarse = BatchInferenceWorker(backends, (16, 16), 100.0)
+        coarse.completed.connect(lambda _ti, _frames, scores, *_rest: emitted.append(scores))
+        coarse.process(2, batch)
+        self.assertEqual(emitted[1][3], 0.0)
+        np.testing.assert_allclose(emitted[1][:3], emitted[2][:3], rtol=1e-5)
+        self.assertFalse(np.allclose(emitted[0], emitted[2]))
+
+
+class EarlyRejectTests(unittest.TestCase):
+    def test_first_ng_camera_fires_before_the_result_and_order_follows_ng_rate(self):
+        from app.core.postprocess import NgRateOrder
+
+        events: list[tuple] = []
+        backends = {cam_id: mock_backend() for cam_id in range(4)}
+        worker = BatchInferenceWorker(
+            backends, (32, 32), 0.5, max_triggers=2, early_reject=lambda *args: events.append(("reject", *args))
+        )
+        worker.completed.connect(lambda trigger_idx, _frames, scores, *_rest: events.append(("done", trigger_idx, scores)))
+        worker.failed.connect(lambda _ti, message: self.fail(message))
+        dark, bright = frames(seed=0), frames(seed=1)
+        for frame in dark:
+            frame.image[:] = 10
+        bright[2].image[:] = 250  # only camera 2 is NG
+        for frame in bright[:2] + bright[3:]:
+            frame.image[:] = 10
+        worker.inbox.put(0, dark)
+        worker.inbox.put(1, bright)
+        worker.drain()
+        self.assertEqual([event[0] for event in events], ["reject", "done", "done"])
+        self.assertEqual(events[0][1:3], (1, 2))
+        reference: list[list[float]] = []
+        plain = BatchInferenceWorker(backends, (32, 32), 0.5)
+        plain.completed.connect(lambda _ti, _frames, scores, *_rest: reference.append(scores))
+        plain.process(1, bright)
+        np.testing.assert_allclose(events[2][2], reference[0], rtol=1e-6)
+        self.assertEqual(worker._ng_order.order(range(4))[0], 2)
+
+        order = NgRateOrder(decay=0.5)
+        order.record({0: 0.9, 1: 0.1}, 0.5)
+        order.record({0: 0.1, 1: 0.9}, 0.5)
+        self.assertEqual(order.order([0, 1, 2]), [1, 0, 2])
+
+    def test_earlier_ok_result_does_not_clear_a_pending_early_reject(self):
+        from app.core.results.early_reject import EarlyReject
+
+        outputs: list[bool] = []
+        early = EarlyReject(SimpleNamespace(set_ok_ng=outputs.append))
+        early.fire(2, 0, 0.9)
+        self.assertIsNone(early.publish_output(1, True))
+        self.assertGreaterEqual(early.publish_output(2, False), 0.0)
+        early.publish_output(3, True)
+        self.assertEqual(outputs, [False, False, False, True])
+
+    def test_timeout_during_the_pass_does_not_latch_a_late_early_reject(self):
+        from app.core.results.early_reject import EarlyReject
+
+        events: list[tuple] = []
+        worker = BatchInferenceWorker(
+            {cam_id: mock_backend() for cam_id in range(4)},
+            (32, 32),
+            0.5,
+            early_reject=lambda *args: events.append(("reject", *args)),
+        )
+        worker.completed.connect(lambda trigger_idx, *_rest: events.append(("done", trigger_idx)))
+        order = worker._ng_order.order
+
+        def expire_mid_pass(cam_ids):
+            worker.inbox.abandon(7)  # the deadline passes after the worker took the trigger
+            return order(cam_ids)
+
+        worker._ng_order.order = expire_mid_pass
+        bright = frames(seed=1)
+        for frame in bright:
+            frame.image[:] = 250
+        worker.inbox.put(7, bright)
+        worker.drain()
+        self.assertEqual(events, [("done", 7)])
+
+        outputs: list[bool] = []
+        early = EarlyReject(SimpleNamespace(set_ok_ng=outputs.append))
+        early.publish_output(7, False)  # the timeout result
+        early.fire(7, 2, 0.9)  # a reject already in flight lands late
+        early.cancel(7)  # its result is discarded
+        early.publish_output(8, True)
+        self.assertEqual(outputs, [False, False, True])
+
+
+class PipelineTests(unittest.TestCase):
+    def test_stage_hands_prepared_triggers_over_in_order(self):
+        worker = BatchInferenceWorker({cam_id: mock_backend() for cam_id in range(4)}, (32, 32), 0.5)
+        stage = PreprocessStage(worker, depth=1)
+        handed: list = []
+        stage.prepared.connect(handed.append)
+        emitted: list[int] = []
+        worker.completed.connect(lambda trigger_idx, *_rest: emitted.append(trigger_idx))
+        for trigger_idx in range(3):
+            worker.inbox.put(trigger_idx, frames(seed=trigger_idx))
+        stage.prepare()
+        self.assertFalse(stage._slots.acquire(blocking=False))  # one prepared pass waits for the model
+        worker.infer_prepared(handed.pop())
+        for _ in range(2):
+            stage.prepare()
+            worker.infer_prepared(handed.pop())
+        stage.prepare()
+        self.assertEqual((emitted, handed), ([0, 1, 2], []))
+
+    def test_triggers_prepared_before_a_recipe_swap_are_prepared_again(self):
+        runtime = RecipeRuntime(
+            definition=RecipeDefinition(3, "swap", 1, "", "", {}, {}),
+            models={f"cam{cam_id + 1}": {"path": "missing.pt", "type": "mock"} for cam_id in range(4)},
+            input_size=(24, 24),
+            ok_threshold=0.5,
+        )
+        loader = RecipeLoader(4, allow_mock_models=True)
+        loaded: list = []
+        loader.loaded.connect(loaded.append)
+        loader.load(runtime, 1)
+        worker = BatchInferenceWorker({cam_id: mock_backend() for cam_id in range(4)}, (32, 32), 0.5)
+        emitted: list[float] = []
+        worker.completed.connect(lambda _ti, _frames, _scores, fused, *_rest: emitted.append(fused))
+        batch = frames()
+        stale = worker.prepare_triggers([(1, batch)])
+        worker.apply_recipe(loaded[0])
+        worker.infer_prepared(stale)
+        worker.process(2, batch)
+        self.assertEqual(emitted[0], emitted[1])
+
+
+class InferenceServiceTests(unittest.TestCase):
+    def test_model_processes_score_and_recover_from_a_crash(self):
+        from app.core.inference_service import InferenceService, ServiceConfig, ServiceError
+
+        service = InferenceService(ServiceConfig(enabled=True, processes=((0, 1), (2, 3)), slot_mb=1, device="cpu"))
+        self.addCleanup(service.close)
+        cfg = ModelConfig(path="missing.pt", type="mock")
+        backends = {cam_id: service.backend(cam_id, cfg) for cam_id in range(4)}
+        batch = frames()
+        remote = BatchedInferenceTests.run_worker(self, BatchInferenceWorker(backends, (32, 32), 0.5), batch)
+        local = BatchedInferenceTests.run_worker(
+            self, BatchInferenceWorker({cam_id: mock_backend() for cam_id in range(4)}, (32, 32), 0.5), batch
+        )
+        np.testing.assert_allclose(remote, local, rtol=1e-6)
+
+        crashed = service._processes[1]
+        crashed._process.kill()
+        crashed._process.join()
+        rows = np.zeros((1, 3, 32, 32), dtype=np.float32)
+        with self.assertRaises(ServiceError):
+            backends[2].predict(rows)
+        self.assertEqual(backends[0].predict(rows)["scores"].shape, (1,))  # other process unaffected
+        deadline = time.monotonic() + 60.0
+        while not crashed.available and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(service.ready_mask(), 0xF)
+        np.testing.assert_allclose(backends[2].predict(rows)["scores"], mock_backend().predict(rows)["scores"])
+
+    def test_cameras_sharing_a_checkpoint_keep_every_process_busy(self):
+        from app.core.inference_service import InferenceService, ServiceConfig
+
+        service = InferenceService(ServiceConfig(enabled=True, processes=((0, 1), (2, 3)), slot_mb=1, device="cpu"))
+        self.addCleanup(service.close)
+        cfg = ModelConfig(path="missing.pt", type="mock")
+        backends = {cam_id: service.backend(cam_id, cfg) for cam_id in range(4)}
+        raw = service.backend(1, ModelConfig(path="missing.pt", type="mock", raw_input="uint8"))
+        self.assertNotEqual(raw.batch_key, backends[0].batch_key)
+        requests: dict[int, int] = {}
+        for process in service._processes:
+            submit = process.submit
+
+            def counted(kind, *args, process=process, submit=submit, **kwargs):
+                if kind == "predict":
+                    requests[process.index] = requests.get(process.index, 0) + 1
+                return submit(kind, *args, **kwargs)
+
+            process.submit = counted
+        worker = BatchInferenceWorker(backends, (32, 32), 0.5)
+        self.assertEqual([group.mode for group in worker._groups], ["serial"])
+        BatchedInferenceTests.run_worker(self, worker, frames())
+        self.assertEqual(requests, {0: 2, 1: 2})
+
+
+class RemoteInferenceTests(unittest.TestCase):
+    def setUp(self):
+        import threading
+
+        from app.core.remote import InferenceServer
+
+        root = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        torch.jit.script(TinyNet().eval()).save(str(root / "model.ts"))
+        self.local = InferenceBackend(ModelConfig(path=str(root / "model.ts"), type="torchscript"), device="cpu")
+        self.server = InferenceServer(("127.0.0.1", 0), root, device="cpu", workers=2)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.cfg = ModelConfig(
+            path="model.ts", type="remote", remote_type="torchscript", server=f"127.0.0.1:{self.server.port}"
+        )
+
+    def test_remote_backend_matches_local_and_pipelines_requests(self):
+        remote = InferenceBackend(self.cfg, device="cpu")
+        self.assertEqual(remote._mode, "remote")
+        batch = np.random.default_rng(0).random((3, 3, 16, 16), dtype=np.float32)
+        expected = self.local.predict_full(batch)
+        np.testing.assert_allclose(remote.predict(batch)["pred_score"], expected["pred_score"], rtol=1e-5)
+        np.testing.assert_allclose(remote.anomaly_map(batch), expected["anomaly_map"], rtol=1e-5)
+
+        pending = [remote.predict_async(batch[index:index + 1]) for index in range(3)]
+        scores = [float(wait()["pred_score"][0]) for wait in pending]
+        np.testing.assert_allclose(scores, expected["pred_score"], rtol=1e-5)
+        self.assertGreater(remote.warmup((16, 16), (1, 2)), 0.0)
+        self.assertEqual(len(self.server.models._models), 1)  # stations share one server-side model
+
+    def test_expired_requests_are_not_run(self):
+        from app.core.remote import KIND_PREDICT, STATUS_DEADLINE, RemoteError, connection_pool, encode_tensor
+
+        remote = InferenceBackend(replace(self.cfg, deadline_ms=1.0), device="cpu")
+        _backend, lock = self.server.models.get(remote._runner._handle)
+        rows = np.zeros((1, 3, 16, 16), dtype=np.float32)
+        with lock:
+            with self.assertRaises(RemoteError):
+                remote.predict(rows)
+            payload = struct.pack("<I", remote._runner._handle) + encode_tensor(rows)
+            future = connection_pool(self.cfg.server).connection().request(KIND_PREDICT, payload, deadline_ms=1.0)
+            time.sleep(0.05)
+        status, _reply = future.result(timeout=5.0)
+        self.assertEqual(status, STATUS_DEADLINE)
+        self.assertEqual(InferenceBackend(self.cfg, device="cpu").predict(rows)["pred_score"].shape, (1,))
+
+
+class ModelCacheTests(unittest.TestCase):
+    def test_cache_shares_reloads_and_evicts(self):
+        from app.core.model_cache import ModelCache
+
+        loads: list[str] = []
+
+        def load(cfg: ModelConfig, device: str) -> InferenceBackend:
+            loads.append(cfg.path)
+            backend = tiny_backend(cfg.path)
+            backend.cfg = cfg
+            return backend
+
+        size_mb = tiny_backend("x").memory_bytes / 1048576
+        cache = ModelCache(budget_mb=size_mb * 2.5)
+        with tempfile.TemporaryDirectory() as temporary:
+            paths = [Path(temporary) / f"cam{index}.pt" for index in range(3)]
+            for path in paths:
+                path.write_bytes(b"checkpoint")
+            first = cache.get(ModelConfig(path=str(paths[0])), "cpu", load)
+            self.assertIs(cache.get(ModelConfig(path=str(paths[0])), "cpu", load), first)
+            cache.get(ModelConfig(path=str(paths[1])), "cpu", load)
+            cache.get(ModelConfig(path=str(paths[2])), "cpu", load)
+            stats = cache.stats()
+            self.assertEqual((stats.hits, stats.misses, stats.evictions, stats.entries), (1, 3, 1, 2))
+            self.assertIsNot(cache.get(ModelConfig(path=str(paths[0])), "cpu", load), first)
+            cache.get(ModelConfig(path="missing.pt", type="mock"), "cpu", lambda cfg, device: mock_backend())
+            self.assertEqual(cache.stats().entries, 2)
+        self.assertEqual(loads, [str(paths[0]), str(paths[1]), str(paths[2]), str(paths[0])])
+
+    def test_cached_backend_warms_on_another_thread_while_it_scores(self):
+        import threading
+
+        backend = anomalib_backend("shared.pt")
+        rows = np.random.default_rng(5).random((2, 3, 16, 16), dtype=np.float32)
+        expected = backend.predict_full(rows)["pred_score"].numpy()
+        active, overlaps = [0], []
+
+        def enter(*_args):
+            active[0] += 1
+            overlaps.append(active[0])
+            time.sleep(0.001)
+
+        def leave(*_args):
+            active[0] -= 1
+
+        backend._runner.model.model.register_forward_pre_hook(enter)
+        backend._runner.model.model.register_forward_hook(leave)
+        loader = threading.Thread(target=backend.warmup, args=((16, 16), range(1, 9)))
+        loader.start()
+        scores = [backend.predict(rows)["pred_score"] for _ in range(20)]
+        loader.join()
+        self.assertEqual(max(overlaps), 1)
+        self.assertTrue(backend._score_only)
+        self.assertEqual(len(backend._warm_shapes), 8)
+        for score in scores:
+            np.testing.assert_allclose(score, expected, rtol=1e-5)
+
+
+@unittest.skipUnless(importlib.util.find_spec("onnxruntime") and importlib.util.find_spec("onnx"), "onnxruntime not installed")
+class OnnxBackendTests(unittest.TestCase):
+    def test_exported_scores_match_torch(self):
+        from tools.export_onnx import export_checkpoint
+
+        torch_backend = tiny_backend("cam1.pt")
+        batch = np.random.default_rng(2).random((3, 3, 16, 16), dtype=np.float32)
+        with tempfile.TemporaryDirectory() as temporary:
+            path = Path(temporary) / "model.onnx"
+            export_checkpoint(torch_backend, path, (16, 16), opset=17)
+            onnx_backend = InferenceBackend(ModelConfig(path=str(path), type="onnx", intra_op_threads=1), device="cpu")
+            self.assertEqual(onnx_backend._mode, "onnx")
+            with torch.no_grad():
+                expected = score_all(torch_backend, batch)
+            np.testing.assert_allclose(score_all(onnx_backend, batch), expected, rtol=1e-4, atol=1e-5)
+            np.testing.assert_allclose(
+                [float(score) for score in onnx_backend.predict(batch)["pred_score"]], expected, rtol=1e-4, atol=1e-5
+            )
+
+
+    def test_raw_input_export_folds_normalization_into_the_first_convolution(self):
+        from tools.export_onnx import export_checkpoint
+
+        torch_backend = tiny_backend("cam1.pt")
+        folded = fold_input_normalization(torch_backend.module, (16, 16))
+        self.assertIsInstance(folded.prepare, ToFloat)
+        self.assertEqual(folded.model.conv.in_channels, 1)
+        padded = TinyNet()
+        padded.conv.padding = (1, 1)
+        self.assertIsInstance(fold_input_normalization(padded, (16, 16)).prepare, NormalizeInput)
+
+        images = [image.image for image in frames(3, seed=6)]
+        batch = np.stack([to_chw_tensor(image, (16, 16)) for image in images])
+        raw = np.stack([to_raw_tensor(image, (16, 16)) for image in images])
+        with torch.no_grad():
+            expected = score_all(torch_backend, batch)
+        with tempfile.TemporaryDirectory() as temporary:
+            path = Path(temporary) / "model.onnx"
+            export_checkpoint(torch_backend, path, (16, 16), opset=17, raw_input="uint8")
+            cfg = ModelConfig(path=str(path), type="onnx", intra_op_threads=1, raw_input="uint8")
+            onnx_backend = InferenceBackend(cfg, device="cpu")
+            self.assertEqual(onnx_backend._input_dtype, np.uint8)
+            self.assertEqual(onnx_backend.dummy_batch(2, (16, 16)).shape, (2, 1, 16, 16))
+            np.testing.assert_allclose(score_all(onnx_backend, raw), expected, rtol=1e-4, atol=1e-4)
+
+        # Torch models loaded with raw_input normalize the raw rows on the device.
+        torch_backend.cfg = replace(torch_backend.cfg, raw_input="uint8")
+        torch_backend._normalize_input = NormalizeInput()
+        with torch.no_grad():
+            np.testing.assert_allclose(score_all(torch_backend, raw), expected, rtol=1e-4, atol=1e-4)
+
+
+@unittest.skipUnless(importlib.util.find_spec("openvino") and importlib.util.find_spec("onnx"), "openvino not installed")
+class OpenVinoBackendTests(unittest.TestCase):
+    def test_async_requests_score_each_camera(self):
+        from tools.export_onnx import export_checkpoint
+
+        torch_backends = [tiny_backend(f"cam{cam_id}.pt") for cam_id in range(4)]
+        batch = np.random.default_rng(3).random((4, 3, 16, 16), dtype=np.float32)
+        with tempfile.TemporaryDirectory() as temporary:
+            backends = []
+            for cam_id, torch_backend in enumerate(torch_backends):
+                path = Path(temporary) / f"cam{cam_id}.onnx"
+                export_checkpoint(torch_backend, path, (16, 16), opset=17)
+                backends.append(InferenceBackend(ModelConfig(path=str(path), type="openvino"), device="cpu"))
+            self.assertEqual({backend._mode for backend in backends}, {"openvino"})
+            group = CameraGroup(range(4), backends)
+            with torch.no_grad():
+                expected = [score_all(backend, batch[index:index + 1])[0] for index, backend in enumerate(torch_backends)]
+            np.testing.assert_allclose(group.predict_scores(batch), expected, rtol=1e-4, atol=1e-5)
+            np.testing.assert_allclose(score_all(backends[0], batch[:1]), expected[:1], rtol=1e-4, atol=1e-5)
+
+
+class QuantizationTests(unittest.TestCase):
+    def test_captures_are_split_per_recipe_and_over_time(self):
+        from app.core.captures import capture_path, capture_score, list_captures
+        from tools.quantize_int8 import split_captures
+
+        with tempfile.TemporaryDirectory() as temporary:
+            root = Path(temporary)
+            for index in range(8):
+                path = capture_path(root, 3, index, 1, 0.1, f"20260101_0000{index:02d}_000")
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.touch()
+            capture_path(root, 4, 0, 1, 0.1, "20260101_000000_000").parent.mkdir()
+            gated = capture_path(root, 3, 9, 1, 0.0, "20260101_000009_000", gated=True)
+            gated.touch()
+            self.assertIsNone(capture_score(gated))
+            paths = list_captures(root, 1, 3)
+            self.assertEqual(len(paths), 8)
+            self.assertEqual(list_captures(root, 1, 4), [])
+            calibration, holdout = split_captures(paths, 0.25)
+            self.assertEqual((len(calibration), len(holdout)), (6, 2))
+            self.assertFalse(set(calibration) & set(holdout))
+
+    def test_torch_int8_scores_stay_close_to_fp32(self):
+        from tools.quantize_int8 import drift_report, quantize_torch
+
+        reference = tiny_backend("cam1.pt")
+        rng = np.random.default_rng(4)
+        calibration = rng.random((16, 3, 16, 16), dtype=np.float32)
+        holdout = rng.random((4, 3, 16, 16), dtype=np.float32)
+        with tempfile.TemporaryDirectory() as temporary:
+            path = Path(temporary) / "model.int8.ts"
+            quantize_torch(reference.module, path, calibration)
+            quantized = InferenceBackend(ModelConfig(path=str(path)), device="cpu")
+            self.assertEqual(quantized._mode, "torchscript")
+            with torch.no_grad():
+                report = drift_report(score_all(reference, holdout), score_all(quantized, holdout), 0.5)
+        self.assertLess(report["max_abs"], 0.1)
+
+    @unittest.skipUnless(importlib.util.find_spec("onnxruntime") and importlib.util.find_spec("onnx"), "onnxruntime not installed")
+    def test_onnx_int8_scores_stay_close_to_fp32(self):
+        from tools.export_onnx import export_checkpoint
+        from tools.quantize_int8 import drift_report, quantize_onnx
+
+        rng = np.random.default_rng(5)
+        calibration = rng.random((16, 3, 16, 16), dtype=np.float32)
+        holdout = rng.random((4, 3, 16, 16), dtype=np.float32)
+        with tempfile.TemporaryDirectory() as temporary:
+            fp32_path = Path(temporary) / "model.onnx"
+            export_checkpoint(tiny_backend("cam1.pt"), fp32_path, (16, 16), opset=17)
+            int8_path = fp32_path.with_suffix(".int8.onnx")
+            quantize_onnx(fp32_path, int8_path, calibration)
+            reference = InferenceBackend(ModelConfig(path=str(fp32_path), type="onnx"), device="cpu")
+            quantized = InferenceBackend(ModelConfig(path=str(int8_path), type="onnx"), device="cpu")
+            report = drift_report(score_all(reference, holdout), score_all(quantized, holdout), 0.5)
+        self.assertLess(report["max_abs"], 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -18,10 +18,10 @@ from app.core.modbus.data_types import (
     words_to_uint32,
 )
 from app.core.modbus.protocol import ProtocolEngine, ProtocolEventType
-from app.core.modbus.register_map import PcStatusBits, ResultCode, VisionErrorCode
+from app.core.modbus.register_map import PcStatusBits, ResultCode, ShedReason, VisionErrorCode
 from app.core.modbus.state import ModbusSharedState, decode_plc_block
 from app.core.modbus.worker import ModbusWorker
-from app.core.recipes import RecipeNotFoundError, RecipeRepository, RecipeRevisionError
+from app.core.recipes import RecipeError, RecipeNotFoundError, RecipeRepository, RecipeRevisionError
 from app.core.results.inspection_result import InspectionResult
 
 
@@ -113,6 +113,19 @@ class StateTests(unittest.TestCase):
         self.assertTrue(registers[0] & PcStatusBits.ALL_MODELS_READY)
         self.assertEqual(registers[1:5], (12, 3, 2, 1))
 
+    def test_active_recipe_keeps_inspecting_during_a_changeover(self):
+        self.state.begin_recipe_change()
+        status = self.state.pc_snapshot().status_word
+        self.assertFalse(status & PcStatusBits.REQUESTED_RECIPE_LOADED)
+        self.assertTrue(status & PcStatusBits.INSPECTION_READY)
+        self.assertTrue(self.state.inspection_allowed(require_modbus=False))
+        self.assertTrue(self.state.recipe_serving())
+        self.assertEqual(self.state.active_recipe(), (12, 3))
+        self.state.abort_recipe_change()
+        self.assertFalse(self.state.recipe_serving())
+        self.state.set_recipe_loaded(13, 1, 0x10003)
+        self.assertTrue(self.state.recipe_serving())
+
     def test_result_pending_requires_matching_ack(self):
         self.state.queue_result(InspectionResult(1, 12, 3, ResultCode.OK, True, (0.1,) * 4, 0.1))
         snapshot = self.state.pc_snapshot()
@@ -138,6 +151,17 @@ class StateTests(unittest.TestCase):
         self.assertFalse(self.state.queue_result(InspectionResult(3, 0, 0, ResultCode.OK, True)))
         self.assertEqual(self.state.pc_snapshot().registers[18], VisionErrorCode.RESULT_QUEUE_FULL)
 
+    def test_shed_triggers_are_counted_by_reason(self):
+        self.state.record_shed(ShedReason.DROPPED_OLDEST)
+        self.state.record_shed(ShedReason.DEGRADED)
+        self.state.record_shed(ShedReason.CAMERAS_BYPASSED)
+        registers = self.state.pc_snapshot().registers
+        self.assertEqual(registers[21:23], (1, 0))
+        self.assertEqual(registers[28:30], (2, ShedReason.CAMERAS_BYPASSED))
+        self.assertEqual(self.state.shed_counts()[ShedReason.DEGRADED], 1)
+        self.state.reset_counters()
+        self.assertEqual(self.state.pc_snapshot().registers[28:30], (0, ShedReason.NONE))
+
     def test_modbus_disabled_mode(self):
         disabled = ModbusSharedState(enabled=False)
         disabled.set_inspection_ready(True)
@@ -202,6 +226,28 @@ class RecipeTests(unittest.TestCase):
             with self.assertRaises(RecipeRevisionError):
                 repository.load(0, 3)
 
+    def test_camera_overrides_of_input_size_and_threshold(self):
+        with tempfile.TemporaryDirectory() as temporary:
+            root = Path(temporary)
+            (root / "configs").mkdir()
+            (root / "configs" / "model.yaml").write_text("models:\n  cam1: {path: fake, type: mock}\n", encoding="utf-8")
+            thresholds = root / "configs" / "thresholds.yaml"
+            thresholds.write_text(
+                "ok_threshold: 0.5\ninput_size: [280, 280]\n"
+                "cameras:\n  cam2: {input_size: [448, 320], ok_threshold: 0.4}\n  '2': {ok_threshold: 0.6}\n",
+                encoding="utf-8",
+            )
+            recipe_path = root / "configs" / "recipes.yaml"
+            recipe_path.write_text("recipes:\n  default: {id: 0, revision: 0}\n", encoding="utf-8")
+            repository = RecipeRepository.from_yaml(recipe_path, root)
+            runtime = repository.load(0)
+            self.assertEqual(runtime.camera_input_sizes, {1: (448, 320)})
+            self.assertEqual(runtime.camera_thresholds, {1: 0.4, 2: 0.6})
+            self.assertEqual((runtime.camera_input_size(0), runtime.camera_threshold(0)), ((280, 280), 0.5))
+            thresholds.write_text("ok_threshold: 0.5\ncameras:\n  cam1: {input_size: [0, 280]}\n", encoding="utf-8")
+            with self.assertRaises(RecipeError):
+                repository.load(0)
+
     def test_recipe_loading_failure_is_detected(self):
         with tempfile.TemporaryDirectory() as temporary:
             root = Path(temporary)
@@ -0,0 +1,177 @@
+"""Export recipe Anomalib checkpoints to ONNX and verify score parity with PyTorch.
+
+Run from the project root after installing requirements plus onnx/onnxruntime:
+    python tools/export_onnx.py --recipe-id 0 --output-models configs/model_onnx.yaml
+
+Every Anomalib ``.pt`` checkpoint of the recipe's models file is exported next to
+the checkpoint with an ``.onnx`` suffix.  Scores from ONNX Runtime are compared
+with the PyTorch path on captured frames from ``logs/captures`` (random frames
+when no captures exist).  The output models file, which a recipe can reference
+through ``models_file``, is written only when every camera passes the check.
+
+With ``--raw-input uint8`` (or ``float16``) the exported graph takes 1xHxW
+Mono8 rows and does channel replication and normalization itself, folded into
+the first convolution where that is exact (see ``app.core.raw_input``).  Its
+scores on raw rows are checked against PyTorch on normalized rows of the same
+frames, and the models file marks the entries ``raw_input``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import inspect
+from pathlib import Path
+import sys
+
+import numpy as np
+import torch
+import yaml
+
+from app.core.captures import CAPTURE_DIR, list_captures, load_captures
+from app.core.corrections import compile_transform_plan
+from app.core.infer_worker import InferenceBackend, ModelConfig, ScoreHead, score_all
+from app.core.preprocessor import TransformPlan
+from app.core.raw_input import RAW_TORCH_DTYPES, fold_input_normalization
+from app.core.recipes import RecipeRepository, RecipeRuntime, camera_index
+
+
+def sample_frames(
+    capture_dir: Path,
+    cam_id: int,
+    count: int,
+    roi: tuple[int, int, int, int] | None,
+    recipe_id: int | None = None,
+    seed: int = 0,
+) -> list[np.ndarray]:
+    """Load up to ``count`` captured frames for one camera, preferring the recipe's own captures."""
+    paths = list_captures(capture_dir, cam_id, recipe_id) or list_captures(capture_dir, cam_id)
+    frames = load_captures(paths[:count])
+    if frames:
+        return frames
+    print(f"[export] cam {cam_id}: no captures in {capture_dir}; checking parity on random frames")
+    height, width = 480, 640
+    if roi is not None:
+        width, height = max(width, roi[0] + roi[2]), max(height, roi[1] + roi[3])
+    rng = np.random.default_rng(seed + cam_id)
+    return [rng.integers(0, 256, (height, width), dtype=np.uint8) for _ in range(count)]
+
+
+def export_checkpoint(
+    backend: InferenceBackend,
+    onnx_path: Path,
+    input_size: tuple[int, int],
+    opset: int,
+    raw_input: str = "",
+) -> None:
+    model = ScoreHead(backend.module).eval()
+    dummy = torch.zeros(1, 3, input_size[1], input_size[0], device=backend.device)
+    if raw_input:
+        model = fold_input_normalization(model, input_size)
+        dtype = RAW_TORCH_DTYPES[raw_input]
+        dummy = torch.zeros(1, 1, input_size[1], input_size[0], dtype=dtype, device=backend.device)
+    kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    torch.onnx.export(
+        model,
+        (dummy,),
+        str(onnx_path),
+        input_names=["image"],
+        output_names=["pred_score"],
+        dynamic_axes={"image": {0: "batch"}, "pred_score": {0: "batch"}},
+        opset_version=opset,
+        **kwargs,
+    )
+
+
+def input_plan(runtime: RecipeRuntime, raw_input: str) -> TransformPlan:
+    """Compile ``runtime``'s preprocessing as if every model took ``raw_input`` rows (``""``: normalized)."""
+    models = {key: {**model, "raw_input": raw_input} for key, model in runtime.models.items()}
+    return compile_transform_plan(dataclasses.replace(runtime, models=models))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Export recipe checkpoints to ONNX with a parity check")
+    parser.add_argument("--project-root", type=Path, default=Path("."))
+    parser.add_argument("--recipe-id", type=int, default=0)
+    parser.add_argument("--revision", type=int, default=None)
+    parser.add_argument("--captures", type=Path, default=CAPTURE_DIR)
+    parser.add_argument("--samples", type=int, default=8)
+    parser.add_argument("--atol", type=float, default=1e-3, help="Maximum absolute score difference")
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--intra-op-threads", type=int, default=0)
+    parser.add_argument("--inter-op-threads", type=int, default=0)
+    parser.add_argument(
+        "--raw-input",
+        choices=sorted(RAW_TORCH_DTYPES),
+        default="",
+        help="Export graphs taking 1xHxW Mono8 rows of this dtype, with normalization in the graph",
+    )
+    parser.add_argument("--output-models", type=Path, default=Path("configs") / "model_onnx.yaml")
+    args = parser.parse_args()
+
+    root = args.project_root.resolve()
+    runtime = RecipeRepository.from_yaml(root / "configs" / "recipes.yaml", root).load(args.recipe_id, args.revision)
+    captures = args.captures if args.captures.is_absolute() else root / args.captures
+    torch_plan = input_plan(runtime, "")
+    onnx_plan = input_plan(runtime, args.raw_input)
+    exported: dict[str, dict] = {}
+    passed = True
+    for key, raw in runtime.models.items():
+        path = Path(str(raw.get("path", "")))
+        if str(raw.get("type", "auto")).lower() not in {"auto", "anomalib"} or path.suffix.lower() not in {".pt", ".ckpt"}:
+            exported[key] = dict(raw)
+            continue
+        cam_id = camera_index(key)
+        torch_backend = InferenceBackend(ModelConfig(path=str(path), type="anomalib"), device="cpu")
+        if torch_backend._mode != "anomalib":
+            print(f"[export] {key}: checkpoint did not load: {path}")
+            passed = False
+            continue
+        onnx_path = path.with_suffix(".onnx")
+        pending_path = onnx_path.with_suffix(".onnx.tmp")
+        export_checkpoint(torch_backend, pending_path, runtime.camera_input_size(cam_id), args.opset, args.raw_input)
+        onnx_cfg = ModelConfig(
+            path=str(pending_path),
+            type="onnx",
+            intra_op_threads=args.intra_op_threads,
+            inter_op_threads=args.inter_op_threads,
+        )
+        onnx_backend = InferenceBackend(onnx_cfg, device="cpu")
+        roi = runtime.definition.camera_rois.get(cam_id)
+        frames = sample_frames(captures, cam_id, args.samples, roi, args.recipe_id)
+        batch = np.stack([torch_plan.apply(cam_id, frame) for frame in frames])
+        onnx_batch = np.stack([onnx_plan.apply(cam_id, frame) for frame in frames])
+        difference = float(np.max(np.abs(score_all(torch_backend, batch) - score_all(onnx_backend, onnx_batch))))
+        del onnx_backend
+        if difference > args.atol:
+            print(f"[export] {key}: FAILED parity, max |torch - onnx| = {difference:.6f} > {args.atol}")
+            pending_path.unlink(missing_ok=True)
+            passed = False
+            continue
+        pending_path.replace(onnx_path)
+        print(f"[export] {key}: {onnx_path} max |torch - onnx| = {difference:.6f}")
+        try:
+            model_path = str(onnx_path.relative_to(root).as_posix())
+        except ValueError:
+            model_path = str(onnx_path)
+        exported[key] = {
+            "path": model_path,
+            "type": "onnx",
+            "intra_op_threads": args.intra_op_threads,
+            "inter_op_threads": args.inter_op_threads,
+            "graph_optimization": "all",
+        }
+        if args.raw_input:
+            exported[key]["raw_input"] = args.raw_input
+
+    if not passed:
+        print("[export] Parity check failed; models file not written")
+        return 1
+    output = args.output_models if args.output_models.is_absolute() else root / args.output_models
+    output.write_text(yaml.safe_dump({"models": exported}, sort_keys=False), encoding="utf-8")
+    print(f"[export] Wrote {output}; reference it from a recipe's models_file")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
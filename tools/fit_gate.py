@@ -0,0 +1,74 @@
+"""Fit the first-stage cascade gates of a recipe on captured OK frames.
+
+Run from the project root after installing requirements:
+    python tools/fit_gate.py --recipe-id 0
+
+Each camera's captures for the recipe (``logs/captures/recipe<ID>``) are split
+by the score recorded in the file name: frames under the recipe's
+``ok_threshold`` fit the gate, the others are used to check it.  Frames a gate
+already cleared (``*_gate.png``) have no model score and are skipped.  Gates are
+written to the recipe's ``cascade.gate_dir`` as ``cam<N>.npz``; enable them with
+``cascade.enabled`` in the recipe's thresholds file.
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+import sys
+
+import numpy as np
+
+from app.core.captures import CAPTURE_DIR, capture_score, list_captures, load_captures
+from app.core.cascade import GateModel
+from app.core.corrections import compile_transform_plan
+from app.core.recipes import RecipeRepository, camera_index
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fit cascade gate models on OK captures")
+    parser.add_argument("--project-root", type=Path, default=Path("."))
+    parser.add_argument("--recipe-id", type=int, default=0)
+    parser.add_argument("--revision", type=int, default=None)
+    parser.add_argument("--captures", type=Path, default=CAPTURE_DIR)
+    parser.add_argument("--max-frames", type=int, default=500, help="Newest captures used per camera")
+    parser.add_argument("--grid", type=int, nargs=2, default=(16, 16), metavar=("W", "H"))
+    args = parser.parse_args()
+
+    root = args.project_root.resolve()
+    runtime = RecipeRepository.from_yaml(root / "configs" / "recipes.yaml", root).load(args.recipe_id, args.revision)
+    plan = compile_transform_plan(runtime)
+    captures = args.captures if args.captures.is_absolute() else root / args.captures
+    gate_dir = Path(runtime.cascade.gate_dir)
+    written = 0
+    for key in runtime.models:
+        cam_id = camera_index(key)
+        threshold = runtime.camera_threshold(cam_id)
+        paths = list_captures(captures, cam_id, args.recipe_id)[:args.max_frames]
+        scores = [capture_score(path) for path in paths]
+        ok_paths = [path for path, score in zip(paths, scores) if score is not None and score < threshold]
+        ng_paths = [path for path, score in zip(paths, scores) if score is not None and score >= threshold]
+        if len(ok_paths) < 2:
+            print(f"[gate] {key}: only {len(ok_paths)} OK captures in {captures / f'recipe{args.recipe_id}'}; skipped")
+            continue
+        ok_batch, ng_batch = (
+            [plan.apply(cam_id, image) for image in load_captures(group)]
+            for group in (ok_paths, ng_paths)
+        )
+        gate = GateModel.fit(np.stack(ok_batch), tuple(args.grid))
+        cleared_ng = sum(gate.score(chw) < runtime.cascade.clear_ok_below for chw in ng_batch)
+        cleared_ok = sum(gate.score(chw) < runtime.cascade.clear_ok_below for chw in ok_batch)
+        path = gate_dir / f"cam{cam_id + 1}.npz"
+        gate_dir.mkdir(parents=True, exist_ok=True)
+        gate.save(path)
+        written += 1
+        print(
+            f"[gate] {key}: {path} fitted on {len(ok_batch)} OK frames; at clear_ok_below "
+            f"{runtime.cascade.clear_ok_below} it clears {cleared_ok}/{len(ok_batch)} OK and "
+            f"{cleared_ng}/{len(ng_batch)} NG captures"
+        )
+    return 0 if written else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
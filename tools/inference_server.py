@@ -0,0 +1,62 @@
+"""Standalone inference server hosting recipe models for one or more stations.
+
+Run from the project root after installing requirements:
+    python tools/inference_server.py --port 5100 --recipe-id 0
+
+Stations point their models at it with ``type: remote`` entries (see
+configs/model.yaml).  Model paths are resolved against this server's
+``--project-root``; stations loading the same model share one backend.
+``--recipe-id`` loads and warms a recipe's models at startup instead of on the
+first station request.
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+import sys
+
+from app.core.infer_worker import ModelConfig
+from app.core.recipes import RecipeError, RecipeRepository, camera_index
+from app.core.remote import InferenceServer, remote_model_config
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serve recipe models over the remote inference protocol")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--project-root", type=Path, default=Path("."))
+    parser.add_argument("--device", default="cuda")
+    parser.add_argument("--workers", type=int, default=4, help="Requests executed concurrently")
+    parser.add_argument("--recipe-id", type=int, action="append", default=[], help="Preload a recipe's models")
+    args = parser.parse_args()
+
+    root = args.project_root.resolve()
+    server = InferenceServer((args.host, args.port), root, device=args.device, workers=args.workers)
+    if args.recipe_id:
+        repository = RecipeRepository.from_yaml(root / "configs" / "recipes.yaml", root)
+        for recipe_id in args.recipe_id:
+            try:
+                runtime = repository.load(recipe_id)
+            except RecipeError as exc:
+                print(f"[server] recipe {recipe_id}: {exc}")
+                return 1
+            for key, raw in runtime.models.items():
+                cfg = ModelConfig(**raw)
+                model = remote_model_config(cfg) if cfg.type.lower() == "remote" else raw
+                handle, mode = server.models.load(model)
+                backend, _lock = server.models.get(handle)
+                warm_ms = backend.warmup(runtime.camera_input_size(camera_index(key)))
+                print(f"[server] recipe {recipe_id} {key}: {model.get('path')} ({mode}), warmup {warm_ms:.0f} ms")
+    print(f"[server] listening on {args.host}:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
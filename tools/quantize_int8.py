@@ -0,0 +1,207 @@
+"""Build INT8 models calibrated on captured production frames and report score drift.
+
+Run from the project root after installing requirements (plus onnx/onnxruntime
+for the ONNX path):
+    python tools/quantize_int8.py --recipe-id 0 --format onnx --output-models configs/model_int8.yaml
+
+Each camera's captures for the recipe (``logs/captures/recipe<ID>``, written while
+``SAVE_TRAINING_IMAGES`` or "collect data" is on) are split into a calibration set
+and a held-out set.  ``--format onnx`` statically quantizes the recipe's FP32 ONNX
+model (see ``tools/export_onnx.py``); ``--format torch`` runs FX post-training
+quantization on the Anomalib checkpoint and saves TorchScript.  FP32 and INT8
+scores are compared on the held-out frames, and the output models file, which a
+recipe can reference through ``models_file``, is written only when every camera
+stays within ``--max-drift``.
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+import sys
+
+import numpy as np
+import torch
+import yaml
+
+from app.core.captures import CAPTURE_DIR, list_captures, load_captures
+from app.core.infer_worker import InferenceBackend, ModelConfig, ScoreHead, score_all
+from app.core.corrections import compile_transform_plan
+from app.core.raw_input import NormalizeInput
+from app.core.recipes import RecipeRepository, camera_index
+
+
+def split_captures(paths: list[Path], holdout_fraction: float) -> tuple[list[Path], list[Path]]:
+    """Spread the held-out frames evenly over time instead of taking only the newest."""
+    if len(paths) < 2:
+        raise ValueError("At least two captures are needed for calibration and evaluation")
+    step = max(2, round(1.0 / max(holdout_fraction, 1e-6)))
+    holdout = paths[::step]
+    calibration = [path for index, path in enumerate(paths) if index % step]
+    return calibration, holdout
+
+
+def quantize_onnx(
+    fp32_path: Path,
+    int8_path: Path,
+    calibration: np.ndarray,
+    method: str = "minmax",
+    per_channel: bool = True,
+) -> None:
+    from onnxruntime import InferenceSession
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        CalibrationMethod,
+        QuantFormat,
+        QuantType,
+        quantize_static,
+    )
+
+    input_name = InferenceSession(str(fp32_path), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class CaptureReader(CalibrationDataReader):
+        def __init__(self):
+            self._rows = iter(calibration)
+
+        def get_next(self):
+            row = next(self._rows, None)
+            return None if row is None else {input_name: row[np.newaxis]}
+
+    methods = {
+        "minmax": CalibrationMethod.MinMax,
+        "entropy": CalibrationMethod.Entropy,
+        "percentile": CalibrationMethod.Percentile,
+    }
+    quantize_static(
+        str(fp32_path),
+        str(int8_path),
+        CaptureReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=per_channel,
+        calibrate_method=methods[method],
+    )
+
+
+def quantize_torch(module: torch.nn.Module, int8_path: Path, calibration: np.ndarray) -> None:
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    torch.backends.quantized.engine = "x86"
+    example = (torch.from_numpy(calibration[:1]),)
+    prepared = prepare_fx(ScoreHead(module).cpu().eval(), get_default_qconfig_mapping("x86"), example)
+    with torch.no_grad():
+        for row in calibration:
+            prepared(torch.from_numpy(row[np.newaxis]))
+        quantized = convert_fx(prepared)
+        torch.jit.save(torch.jit.trace(quantized, example), str(int8_path))
+
+
+def drift_report(reference: np.ndarray, quantized: np.ndarray, ok_threshold: float) -> dict[str, float]:
+    difference = np.abs(reference - quantized)
+    flips = np.count_nonzero((reference < ok_threshold) != (quantized < ok_threshold))
+    return {
+        "max_abs": float(difference.max()),
+        "mean_abs": float(difference.mean()),
+        "decision_flips": int(flips),
+        "frames": int(len(reference)),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="INT8 post-training quantization from captured frames")
+    parser.add_argument("--project-root", type=Path, default=Path("."))
+    parser.add_argument("--recipe-id", type=int, default=0)
+    parser.add_argument("--revision", type=int, default=None)
+    parser.add_argument("--format", choices=("onnx", "torch"), default="onnx")
+    parser.add_argument("--captures", type=Path, default=CAPTURE_DIR)
+    parser.add_argument("--max-frames", type=int, default=300, help="Newest captures used per camera")
+    parser.add_argument("--holdout", type=float, default=0.25, help="Fraction kept out of calibration")
+    parser.add_argument("--calibration-method", choices=("minmax", "entropy", "percentile"), default="minmax")
+    parser.add_argument("--max-drift", type=float, default=0.02, help="Maximum absolute held-out score drift")
+    parser.add_argument("--output-models", type=Path, default=Path("configs") / "model_int8.yaml")
+    args = parser.parse_args()
+
+    root = args.project_root.resolve()
+    runtime = RecipeRepository.from_yaml(root / "configs" / "recipes.yaml", root).load(args.recipe_id, args.revision)
+    plan = compile_transform_plan(runtime)
+    captures = args.captures if args.captures.is_absolute() else root / args.captures
+    quantized_models: dict[str, dict] = {}
+    passed = True
+    for key, raw in runtime.models.items():
+        cam_id = camera_index(key)
+        path = Path(str(raw.get("path", "")))
+        threshold = runtime.camera_threshold(cam_id)
+        paths = list_captures(captures, cam_id, args.recipe_id)[:args.max_frames]
+        try:
+            calibration_paths, holdout_paths = split_captures(paths, args.holdout)
+        except ValueError as exc:
+            print(f"[quantize] {key}: {exc}; found {len(paths)} in {captures / f'recipe{args.recipe_id}'}")
+            passed = False
+            continue
+        calibration, holdout = (
+            np.stack([plan.apply(cam_id, image) for image in load_captures(group)])
+            for group in (calibration_paths, holdout_paths)
+        )
+
+        if args.format == "onnx":
+            if path.suffix.lower() != ".onnx":
+                print(f"[quantize] {key}: {path} is not ONNX; run tools/export_onnx.py first")
+                passed = False
+                continue
+            reference = InferenceBackend(ModelConfig(**{**raw, "type": "onnx"}), device="cpu")
+            int8_path = path.with_suffix(".int8.onnx")
+            quantize_onnx(path, int8_path, calibration, args.calibration_method)
+            entry = {**raw, "path": str(int8_path), "type": "onnx"}
+        else:
+            reference = InferenceBackend(ModelConfig(**raw), device="cpu")
+            if reference.module is None:
+                print(f"[quantize] {key}: {path} did not load as a torch model")
+                passed = False
+                continue
+            int8_path = path.with_suffix(".int8.ts")
+            module_calibration = calibration
+            if raw.get("raw_input"):
+                # Raw rows are normalized on the device before the module sees them.
+                with torch.no_grad():
+                    module_calibration = NormalizeInput()(torch.from_numpy(calibration)).numpy()
+            try:
+                quantize_torch(reference.module, int8_path, module_calibration)
+            except Exception as exc:
+                print(f"[quantize] {key}: FX quantization failed ({exc}); use --format onnx")
+                passed = False
+                continue
+            entry = {"path": str(int8_path), "type": "torchscript"}
+            if raw.get("raw_input"):
+                entry["raw_input"] = raw["raw_input"]
+
+        quantized = InferenceBackend(ModelConfig(**entry), device="cpu")
+        with torch.no_grad():
+            report = drift_report(score_all(reference, holdout), score_all(quantized, holdout), threshold)
+        print(
+            f"[quantize] {key}: {int8_path} calibrated on {len(calibration)} frames; held-out "
+            f"{report['frames']} frames max drift {report['max_abs']:.4f}, mean {report['mean_abs']:.4f}, "
+            f"{report['decision_flips']} OK/NG flips at threshold {threshold}"
+        )
+        if report["max_abs"] > args.max_drift:
+            print(f"[quantize] {key}: drift exceeds --max-drift {args.max_drift}")
+            passed = False
+            continue
+        try:
+            entry["path"] = int8_path.relative_to(root).as_posix()
+        except ValueError:
+            pass
+        quantized_models[key] = entry
+
+    if not passed:
+        print("[quantize] Quantization check failed; models file not written")
+        return 1
+    output = args.output_models if args.output_models.is_absolute() else root / args.output_models
+    output.write_text(yaml.safe_dump({"models": quantized_models}, sort_keys=False), encoding="utf-8")
+    print(f"[quantize] Wrote {output}; reference it from a recipe's models_file")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())